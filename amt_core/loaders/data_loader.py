@@ -1,12 +1,16 @@
 import logging
+from collections.abc import Iterable, Iterator, Sequence
 from enum import StrEnum
 from pathlib import Path
 
 import joblib
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 from pandas.io.parsers import TextFileReader
 
+from amt_core.tools.instrumentation_tool import InstrumentationTool
+
 
 class DataLoader:
     """
@@ -16,24 +20,81 @@ class DataLoader:
     class SupportedExtensions(StrEnum):
         CSV = ".csv"
         SAV = ".sav"
+        PARQUET = ".parquet"
+        FEATHER = ".feather"
+        ARROW = ".arrow"
+        NPY = ".npy"
+
+    # columns of strings with at most this many distinct values, and at most one per two rows, become categoricals
+    CATEGORY_MAX_UNIQUE = 1024
+    # the number of rows per chunk when inferring compact dtypes of a CSV file
+    INFERENCE_CHUNKSIZE = 100_000
 
     @staticmethod
-    def load(path: str) -> DataFrame | TextFileReader:
+    @InstrumentationTool.span("data.load")
+    def load(
+        path: str,
+        chunksize: int | None = None,
+        columns: Sequence[str] | None = None,
+        compact: bool = False,
+        dtypes: dict[str, str] | None = None,
+    ) -> DataFrame | Iterator[DataFrame]:
         """
-        Load a datafile from disk and return the instance.
+        Load a datafile from disk and return the instance. Parquet, Arrow and numpy files are memory mapped,
+        so the operating system only pages in what is used and can share the pages between processes.
         :param path: the path of the file, can be relative
+        :param chunksize: if given, a CSV file is not read at once but returned as an iterator of chunks of this many
+        rows
+        :param columns: if given, only these columns are loaded in this order, for example the feature_names_in_ of a
+        model.
+        The columns of a numpy file have no names, they are named after the given columns instead.
+        :param compact: if True, columns are downcast to the smallest dtype that holds all their values. A CSV file
+        is read twice for this, once to infer the dtypes and once to parse it with them.
+        :param dtypes: a mapping of column names to dtypes, these override the inferred dtypes
         :return: an instance of the data
         """
         resolved_data_path: Path = (Path.cwd() / path).resolve()
         if not resolved_data_path.is_file():
             raise FileNotFoundError(f"File not found at path {resolved_data_path} ")
+        if chunksize is not None and resolved_data_path.suffix != DataLoader.SupportedExtensions.CSV:
+            logging.warning(f"Data extension {resolved_data_path.suffix} can not be read in chunks")
+        columns = list(columns) if columns is not None else None
         try:
-            # TODO support more formats
             match resolved_data_path.suffix:
                 case DataLoader.SupportedExtensions.CSV:
-                    data = pd.read_csv(resolved_data_path)
+                    if compact:
+                        inference_chunks = pd.read_csv(
+                            resolved_data_path, chunksize=DataLoader.INFERENCE_CHUNKSIZE, usecols=columns
+                        )
+                        dtypes = DataLoader.infer_compact_dtypes(inference_chunks) | (dtypes or {})
+                    data = pd.read_csv(resolved_data_path, chunksize=chunksize, usecols=columns, dtype=dtypes)
+                    if compact and isinstance(data, DataFrame):
+                        logging.info(f"loaded compact data of {data.memory_usage(deep=True).sum()} bytes")
                 case DataLoader.SupportedExtensions.SAV:
                     data = joblib.load(resolved_data_path)
+                    if columns is not None and isinstance(data, DataFrame):
+                        data = data[columns]
+                case DataLoader.SupportedExtensions.PARQUET:
+                    DataLoader._require_pyarrow()
+                    data = pd.read_parquet(resolved_data_path, engine="pyarrow", columns=columns, memory_map=True)
+                case DataLoader.SupportedExtensions.FEATHER | DataLoader.SupportedExtensions.ARROW:
+                    DataLoader._require_pyarrow()
+                    from pyarrow import feather
+
+                    table = feather.read_table(resolved_data_path, columns=columns, memory_map=True)
+                    if columns is not None:
+                        # the columns of a feather file are read in the order of the file
+                        table = table.select(columns)
+                    # split_blocks avoids consolidating the columns into one block, which would copy them
+                    data = table.to_pandas(split_blocks=True)
+                case DataLoader.SupportedExtensions.NPY:
+                    array = np.load(resolved_data_path, mmap_mode="r")
+                    if columns is not None and (array.ndim != 2 or array.shape[1] != len(columns)):
+                        raise TypeError(
+                            f"Data of shape {array.shape} does not have the {len(columns)} columns {columns}"
+                        )
+                    # a 2d array is wrapped without a copy, the frame stays backed by the memory map
+                    data = DataFrame(array, columns=columns, copy=False)
                 case _:
                     raise TypeError(
                         f"Data extension {resolved_data_path.suffix} is not supported,"
@@ -42,8 +103,106 @@ class DataLoader:
             # check if the data type is supported
             if not issubclass(type(data), (DataFrame, TextFileReader)):
                 raise TypeError("Data type is not supported")
+            # usecols keeps the columns of a CSV file in the order of the file
+            if columns is not None and resolved_data_path.suffix == DataLoader.SupportedExtensions.CSV:
+                data = data[columns] if isinstance(data, DataFrame) else DataLoader._select(data, columns)
+            if isinstance(data, DataFrame) and resolved_data_path.suffix != DataLoader.SupportedExtensions.CSV:
+                if compact:
+                    data = DataLoader.compact(data, dtypes)
+                elif dtypes:
+                    data = data.astype(dtypes)
         except Exception as e:
             raise e
         else:
             logging.info(f"Data {resolved_data_path} loaded, it is of type {type(data)} ")
             return data
+
+    @staticmethod
+    def _select(reader: TextFileReader, columns: list[str]) -> Iterator[DataFrame]:
+        with reader:
+            for chunk in reader:
+                yield chunk[columns]
+
+    @staticmethod
+    def compact(data: DataFrame, dtypes: dict[str, str] | None = None) -> DataFrame:
+        """
+        Downcast the columns of a frame to the smallest dtypes that hold all their values.
+        :param data: the data to compact
+        :param dtypes: a mapping of column names to dtypes, these override the inferred dtypes
+        :return: the compacted data
+        """
+        bytes_before = data.memory_usage(deep=True).sum()
+        data = data.astype(DataLoader.infer_compact_dtypes([data]) | (dtypes or {}))
+        logging.info(f"compacted data from {bytes_before} to {data.memory_usage(deep=True).sum()} bytes")
+        return data
+
+    @staticmethod
+    def infer_compact_dtypes(chunks: Iterable[DataFrame]) -> dict[str, str]:
+        """
+        Infer the smallest dtype of every column that holds all its values, from one pass over the chunks of the data.
+        Integers get the smallest (unsigned) integer type that holds their range, floats become float32 if that does
+        not change any value and columns of strings with few distinct values become categoricals.
+        :param chunks: the chunks of the data
+        :return: a mapping of column names to dtypes
+        """
+        stats: dict[str, dict] = {}
+        rows = 0
+        bytes_before = 0
+        for chunk in chunks:
+            rows += len(chunk)
+            bytes_before += chunk.memory_usage(deep=True).sum()
+            for name, column in chunk.items():
+                column_stats = stats.setdefault(
+                    name, {"kind": "b", "min": None, "max": None, "float32": True, "uniques": set()}
+                )
+                kind = column.dtype.kind
+                # the widest kind over all chunks wins, a chunk with missing values for example turns integers into
+                # floats. Other kinds, like datetimes, are left as they are.
+                if kind not in "buifO" or column_stats["kind"] == "-":
+                    column_stats["kind"] = "-"
+                    continue
+                column_stats["kind"] = max(column_stats["kind"], kind, key="buifO".find)
+                if kind in "uif" and column.notna().any():
+                    minimum, maximum = column.min(), column.max()
+                    column_stats["min"] = minimum if column_stats["min"] is None else min(column_stats["min"], minimum)
+                    column_stats["max"] = maximum if column_stats["max"] is None else max(column_stats["max"], maximum)
+                if kind in "uif" and column_stats["float32"]:
+                    column_stats["float32"] = bool((column.astype(np.float32) == column)[column.notna()].all())
+                if kind == "O" and column_stats["uniques"] is not None:
+                    column_stats["uniques"].update(column.dropna().unique())
+                    if len(column_stats["uniques"]) > DataLoader.CATEGORY_MAX_UNIQUE:
+                        column_stats["uniques"] = None
+
+        dtypes = {}
+        for name, column_stats in stats.items():
+            match column_stats["kind"]:
+                case "u" | "i" if column_stats["min"] is not None:
+                    candidates = ["uint8", "uint16", "uint32"] if column_stats["min"] >= 0 else []
+                    candidates += ["int8", "int16", "int32", "int64"]
+                    candidates += ["uint64"] if column_stats["min"] >= 0 else []
+                    dtype = next(
+                        (
+                            dtype
+                            for dtype in candidates
+                            if np.iinfo(dtype).min <= column_stats["min"] and column_stats["max"] <= np.iinfo(dtype).max
+                        ),
+                        None,
+                    )
+                    # integers beyond every candidate keep their dtype
+                    if dtype is not None:
+                        dtypes[name] = dtype
+                case "f":
+                    dtypes[name] = "float32" if column_stats["float32"] else "float64"
+                case "O" if column_stats["uniques"] is not None and len(column_stats["uniques"]) * 2 <= rows:
+                    dtypes[name] = "category"
+        logging.info(f"inferred compact dtypes {dtypes} for {rows} rows of {bytes_before} bytes")
+        return dtypes
+
+    @staticmethod
+    def _require_pyarrow() -> None:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                "Loading Parquet and Arrow files requires pyarrow, install the arrow extra or pip install pyarrow"
+            ) from e
@@ -1,34 +1,63 @@
 import logging
+import threading
+import time
 from enum import StrEnum
 from pathlib import Path
 from typing import Type
 
 import joblib
+import numpy as np
 from sklearn.base import BaseEstimator
+from sklearn.tree._tree import Tree
+
+from amt_core.tools.instrumentation_tool import InstrumentationTool
 
 
 class ModelLoader:
     """
-    ModelLoader class offers methods to load supported models
+    ModelLoader class offers methods to load supported models. Loaded models are kept in a registry, so a
+    model is loaded at most once per process until its file changes, or until it is the least recently used of
+    more than MAX_MODELS models. Models from the registry are shared and must not be modified.
     """
 
     class SupportedExtensions(StrEnum):
         SAV = ".sav"
 
+    MAX_MODELS = 16
+    # maps the path of a model and whether it is memory mapped to the modification time of its file and the loaded
+    # model, in the order the models were last used
+    _registry: dict[tuple[Path, bool], tuple[int, BaseEstimator]] = {}
+    _registry_lock = threading.Lock()
+
     @staticmethod
-    def load(path: str) -> Type[BaseEstimator]:
+    @InstrumentationTool.span("model.load")
+    def load(path: str, mmap: bool = False) -> Type[BaseEstimator]:
         """
         Load a model from disk and return the instance.
         :param path: the path of the model, can be relative
+        :param mmap: if True, the numpy arrays in the model are memory mapped instead of read into memory, so
+        processes loading the same model share the pages. This only works for models saved uncompressed
+        with joblib.dump, other models are read into memory.
         :return: an instance of the model
         """
         resolved_model_path: Path = (Path.cwd() / path).resolve()
         if not resolved_model_path.is_file():
             raise FileNotFoundError(f"File not found at path {resolved_model_path} ")
+        mtime = resolved_model_path.stat().st_mtime_ns
+        key = (resolved_model_path, mmap)
+        with ModelLoader._registry_lock:
+            registered = ModelLoader._registry.pop(key, None)
+            if registered is not None and registered[0] == mtime:
+                ModelLoader._registry[key] = registered
+        if registered is not None and registered[0] == mtime:
+            logging.info(f"Model {resolved_model_path} taken from the registry")
+            return registered[1]
+
         try:
+            start = time.perf_counter()
             match resolved_model_path.suffix:
                 case ModelLoader.SupportedExtensions.SAV:
-                    model = joblib.load(resolved_model_path)
+                    model = joblib.load(resolved_model_path, mmap_mode="r" if mmap else None)
                 case _:
                     raise TypeError(
                         f"Model extension {resolved_model_path.suffix} is not supported,"
@@ -42,5 +71,61 @@ class ModelLoader:
         except Exception as e:
             raise e
         else:
-            logging.info(f"Model {resolved_model_path} loaded, it is of type {type(model)} ")
+            in_memory, memory_mapped = ModelLoader._array_bytes(model)
+            logging.info(
+                f"Model {resolved_model_path} loaded in {time.perf_counter() - start:.3f} seconds, it is of type"
+                f" {type(model)} with {in_memory} bytes of arrays in memory and {memory_mapped} bytes memory mapped"
+            )
+            with ModelLoader._registry_lock:
+                ModelLoader._registry[key] = (mtime, model)
+                while len(ModelLoader._registry) > ModelLoader.MAX_MODELS:
+                    evicted = next(iter(ModelLoader._registry))
+                    logging.info(f"Model {evicted[0]} evicted from the registry")
+                    del ModelLoader._registry[evicted]
             return model
+
+    @staticmethod
+    def unload(path: str) -> None:
+        """
+        Remove a model from the registry, it is loaded again on the next call to load.
+        :param path: the path of the model, can be relative
+        :return: None
+        """
+        resolved_model_path = (Path.cwd() / path).resolve()
+        with ModelLoader._registry_lock:
+            for mmap in (False, True):
+                ModelLoader._registry.pop((resolved_model_path, mmap), None)
+
+    @staticmethod
+    def _array_bytes(model) -> tuple[int, int]:
+        """
+        Count the bytes of the numpy arrays in a model, including those of nested estimators.
+        :param model: the model
+        :return: a tuple of the bytes in memory and the bytes memory mapped
+        """
+        in_memory, memory_mapped = 0, 0
+        # keep the visited values alive, so the id of a temporary value is not reused while counting
+        seen = {}
+        stack = [model]
+        while stack:
+            value = stack.pop()
+            if id(value) in seen:
+                continue
+            seen[id(value)] = value
+            if isinstance(value, np.memmap):
+                memory_mapped += value.nbytes
+            elif isinstance(value, np.ndarray):
+                if value.dtype == object:
+                    stack.extend(value.ravel())
+                else:
+                    in_memory += value.nbytes
+            elif isinstance(value, list | tuple | set):
+                stack.extend(value)
+            elif isinstance(value, dict):
+                stack.extend(value.values())
+            elif isinstance(value, BaseEstimator):
+                stack.extend(vars(value).values())
+            elif isinstance(value, Tree):
+                # the nodes and values of a fitted tree are only exposed through its state
+                stack.extend(value.__getstate__().values())
+        return in_memory, memory_mapped
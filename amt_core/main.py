@@ -2,6 +2,7 @@ import logging
 from pathlib import Path
 
 from amt_core.tools.arg_parser import ArgParser
+from amt_core.tools.instrumentation_tool import InstrumentationTool
 
 
 def setup_logger():
@@ -21,30 +22,78 @@ def setup_logger():
 def main():
     # Setup logging and get command line input
     setup_logger()
-    args = ArgParser().get_args()
+    with InstrumentationTool.span("args.parse"):
+        args = ArgParser().get_args()
     logging.info("AMT CLI started %s", args)
 
+    # with --spans every phase of the run is recorded in logs/spans.jsonl, with --profile the run is profiled as well
+    if args.spans or args.profile:
+        InstrumentationTool.enable()
+    if args.profile:
+        InstrumentationTool.start_profile()
+    try:
+        with InstrumentationTool.span(f"action.{args.action}"):
+            run_action(args)
+    finally:
+        if args.profile:
+            InstrumentationTool.stop_profile()
+
+
+def run_action(args):
     # Determine what action we need to execute
     match args.action:
         case ArgParser.Actions.SHAP:
-            from amt_core.loaders.data_loader import DataLoader
-            from amt_core.loaders.model_loader import ModelLoader
-            from amt_core.tools.shap_tool import ShapTool
-
-            model = ModelLoader.load(args.model)
-            data = DataLoader.load(args.data)
-            shap_tool = ShapTool(model, data)
-            shap_values = shap_tool.get_results()
-            shap_tool.save_results(shap_values, args.outputdir)
+            from amt_core.tools.shap_cache_tool import ShapCacheTool
+
+            # a cached result is saved before shap, scikit-learn and pandas are imported
+            lookup = ShapCacheTool.lookup(args)
+            if lookup[2] is not None:
+                ShapCacheTool.save_results(lookup[2], args.outputdir)
+            else:
+                from amt_core.tools.shap_tool import ShapTool
+
+                ShapTool.run_shap(args, lookup)
+        case ArgParser.Actions.BATCH:
+            from amt_core.tools.batch_tool import BatchTool
+
+            BatchTool.run_batch(args)
+        case ArgParser.Actions.SERVE:
+            from amt_core.tools.serve_tool import ServeTool
+
+            ServeTool.run_serve(args)
         case ArgParser.Actions.ASSESSMENT:
             from amt_core.tools.assessment_tool import QuestionnaireTool
 
             QuestionnaireTool.run_questionnaire(args)
+        case ArgParser.Actions.IMPORT:
+            from amt_core.tools.import_tool import ImportTool
+
+            ImportTool.run_import(args)
+        case ArgParser.Actions.BENCHMARK:
+            from amt_core.tools.benchmark_tool import BenchmarkTool
+
+            BenchmarkTool.run_benchmark(args)
+        case ArgParser.Actions.COMPARE:
+            from amt_core.tools.compare_tool import CompareTool
+
+            CompareTool.run_compare(args)
         case ArgParser.Actions.REPORT:
             from amt_core.tools.report_tool import ReportTool
 
-            report_tool = ReportTool(args.card)
-            report_tool.render()
+            if args.cards is not None:
+                ReportTool.build(args.cards, args.outputdir, args.workers, args.force)
+                reports = sorted(args.outputdir.glob("*.html"))
+            else:
+                report_tool = ReportTool(args.card)
+                report_tool.render()
+                reports = [Path(Path.cwd(), "ui", "output.html")]
+            if args.bundle is not None:
+                from amt_core.tools.bundle_tool import BundleTool
+
+                for report in reports:
+                    # every report of a folder gets its own bundle, the assets are relative to the templates
+                    bundle_dir = args.bundle if args.cards is None else Path(args.bundle, report.stem)
+                    BundleTool.run_bundle(report, bundle_dir, base_dir=Path(Path.cwd(), "ui"))
         case _:
             print(f"Unsupported action {args.action}")
 
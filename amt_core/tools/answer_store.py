@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+from amt_core.tools.instrumentation_tool import InstrumentationTool
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerStore:
+    """
+    The AnswerStore class keeps the answers to questionnaires in a SQLite database. Every answer is committed the
+    moment it is given, so an aborted or crashed session loses nothing, and answers are looked up by questionnaire
+    and question through the primary key instead of reading every answer file. The YAML files the answers are
+    imported from and exported to are recorded with their modification time and hash, so only YAML files that
+    changed since are imported again.
+    """
+
+    FILENAME = "answers.sqlite"
+
+    def __init__(self, database_path: Path) -> None:
+        """
+        :param database_path: Path to the database, it is created if it does not exist.
+        :return: None
+        """
+        self._database_path = Path(database_path)
+        self._connection = sqlite3.connect(self._database_path)
+        # the write ahead log keeps the database consistent when the process dies during a write, a full sync
+        # makes every committed answer survive a power loss as well
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        with self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                    questionnaire TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    answer TEXT NOT NULL,
+                    answered_at REAL NOT NULL,
+                    PRIMARY KEY (questionnaire, question)
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sources (
+                    path TEXT PRIMARY KEY,
+                    modified_ns INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL
+                )
+                """
+            )
+
+    def __enter__(self) -> "AnswerStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def put(self, questionnaire: str, question: str, answer: str | list[str], position: int = 0) -> None:
+        """
+        Store an answer, an earlier answer to the same question is replaced.
+        :param questionnaire: the name of the questionnaire
+        :param question: the question
+        :param answer: the answer, a string or a list of strings for questions with more than one choice
+        :param position: the position of the question in the questionnaire, answers are exported in this order
+        :return: None
+        """
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)",
+                (questionnaire, question, position, json.dumps(answer), time.time()),
+            )
+        logging.info(f"stored answer of {questionnaire} to {question}")
+
+    def get(self, questionnaire: str, question: str) -> str | list[str] | None:
+        """
+        Get the answer to a question.
+        :param questionnaire: the name of the questionnaire
+        :param question: the question
+        :return: the answer or None if the question is not answered
+        """
+        row = self._connection.execute(
+            "SELECT answer FROM answers WHERE questionnaire = ? AND question = ?", (questionnaire, question)
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def get_answers(self, questionnaire: str) -> dict[str, Any]:
+        """
+        Get the answers to a questionnaire.
+        :param questionnaire: the name of the questionnaire
+        :return: a dictionary with keys being the question and the value being the answer, in the order of the
+        questionnaire
+        """
+        rows = self._connection.execute(
+            "SELECT question, answer FROM answers WHERE questionnaire = ? ORDER BY position", (questionnaire,)
+        )
+        return {question: json.loads(answer) for question, answer in rows}
+
+    def questionnaires(self) -> list[str]:
+        """
+        :return: the names of the questionnaires with answers
+        """
+        return [row[0] for row in self._connection.execute("SELECT DISTINCT questionnaire FROM answers ORDER BY 1")]
+
+    def is_changed(self, source_path: Path) -> bool:
+        """
+        The hash of a file is only computed when its modification time differs from the recorded one.
+        :param source_path: the path of an answer YAML file
+        :return: True if the file was not imported or exported before or changed since
+        """
+        row = self._connection.execute(
+            "SELECT modified_ns, sha256 FROM sources WHERE path = ?", (str(Path(source_path).resolve()),)
+        ).fetchone()
+        if row is None:
+            return True
+        if row[0] == Path(source_path).stat().st_mtime_ns:
+            return False
+        return row[1] != AnswerStore._sha256(source_path)
+
+    def import_answers(self, q_and_a_sources: dict[str, dict[str, Any]], source_paths: list[Path] = ()) -> None:
+        """
+        Store the answers of earlier sessions in one transaction, for example those of answer YAML files.
+        :param q_and_a_sources: a dictionary mapping the name of a questionnaire to a dictionary with keys being
+        the question and the value being the answer
+        :param source_paths: the paths of the files the answers were read from, they are recorded so they are not
+        imported again until they change
+        :return: None
+        """
+        now = time.time()
+        with self._connection:
+            self._record_sources(source_paths)
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)",
+                (
+                    (questionnaire, question, position, json.dumps(answer), now)
+                    for questionnaire, answers in q_and_a_sources.items()
+                    for position, (question, answer) in enumerate(answers.items())
+                ),
+            )
+        logging.info(f"imported the answers of {len(q_and_a_sources)} questionnaires into {self._database_path}")
+
+    @InstrumentationTool.span("yaml.write")
+    def export(self, output_dir: Path, questionnaires: list[str] | None = None) -> list[Path]:
+        """
+        Write the answers of questionnaires to output_dir/<questionnaire name>.yaml, as a list containing dicts of
+        the form {"question": "q", "answer": "a"}.
+        :param output_dir: Path to the directory for the YAML files.
+        :param questionnaires: the names of the questionnaires to export, defaults to all questionnaires
+        :return: the paths of the YAML files
+        """
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        output_filepaths = []
+        for questionnaire in questionnaires if questionnaires is not None else self.questionnaires():
+            q_and_a_list = [
+                {"question": question, "answer": answer} for question, answer in self.get_answers(questionnaire).items()
+            ]
+            output_filepath = Path(output_dir, f"{questionnaire}.yaml")
+            with open(output_filepath, "w") as file:
+                yaml.safe_dump(q_and_a_list, file, sort_keys=False)
+            logging.info(f"exported answers of {questionnaire} to {output_filepath}")
+            output_filepaths.append(output_filepath)
+        # the exported files hold the stored answers already, they are imported again only when they are edited
+        with self._connection:
+            self._record_sources(output_filepaths)
+        return output_filepaths
+
+    def _record_sources(self, source_paths: list[Path]) -> None:
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO sources VALUES (?, ?, ?)",
+            (
+                (str(Path(path).resolve()), Path(path).stat().st_mtime_ns, AnswerStore._sha256(path))
+                for path in source_paths
+            ),
+        )
+
+    @staticmethod
+    def _sha256(path: Path) -> str:
+        with open(path, "rb") as file:
+            return hashlib.file_digest(file, "sha256").hexdigest()
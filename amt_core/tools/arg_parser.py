@@ -3,6 +3,8 @@ from argparse import Namespace
 from enum import StrEnum
 from pathlib import Path
 
+from amt_core.tools.options import BenchmarkOptions, ShapOptions
+
 
 class ArgParser:
     """
@@ -14,21 +16,31 @@ class ArgParser:
         SHAP = "shap"
         ASSESSMENT = "assessment"
         REPORT = "report"
+        BATCH = "batch"
+        SERVE = "serve"
+        IMPORT = "import"
+        BENCHMARK = "benchmark"
+        COMPARE = "compare"
 
         @classmethod
         def list(cls):
             return list(map(lambda c: c.value, cls))
 
     _start_parser = None
-    _user_namespace = argparse.Namespace()
+    _user_namespace = None
 
-    def __init__(self):
+    def __init__(self, args: list[str] | None = None):
+        """
+        :param args: the arguments to parse, defaults to the command line
+        """
+        self._args = args
+        self._user_namespace = argparse.Namespace()
         self._start_parser = argparse.ArgumentParser(description="CLI tool for AMT", conflict_handler="resolve")
         self._set_shared_cli_args()
         self._set_additional_cli_args()
 
     def get_args(self) -> Namespace:
-        return self._start_parser.parse_args()
+        return self._start_parser.parse_args(self._args)
 
     def _set_shared_cli_args(self) -> None:
         self._start_parser.add_argument(
@@ -46,8 +58,19 @@ class ArgParser:
             default=(Path.cwd() / "out").resolve(),
             help="the output folder containing answered assessments",
         )
+        self._start_parser.add_argument(
+            "--spans",
+            action="store_true",
+            help="record the phases of the run with their wall time, CPU time and peak RSS in logs/spans.jsonl",
+        )
+        self._start_parser.add_argument(
+            "--profile",
+            action="store_true",
+            help="profile the run with cProfile and tracemalloc, the dumps are saved to logs/ and a summary of the"
+            " phases of the run is printed at exit, implies --spans",
+        )
         # validate the first input before we continue
-        self._start_parser.parse_known_args(namespace=self._user_namespace)
+        self._start_parser.parse_known_args(self._args, namespace=self._user_namespace)
 
     def _set_assessment_cli_args(self) -> None:
         """
@@ -61,6 +84,11 @@ class ArgParser:
             default=(Path.cwd() / "assessments").resolve(),
             help="the input folder containing questionnaires",
         )
+        self._start_parser.add_argument(
+            "--export",
+            action="store_true",
+            help="write the stored answers to a YAML file per questionnaire in the outputdir and exit",
+        )
 
     def _set_shap_cli_args(self) -> None:
         """
@@ -68,14 +96,359 @@ class ArgParser:
         :return: None
         """
         self._start_parser.add_argument("--model", required=True, type=str, help="the path of the model to use")
+        self._start_parser.add_argument(
+            "--mmap-model",
+            action="store_true",
+            dest="mmap_model",
+            help="memory map the arrays of the model instead of reading them, for models saved uncompressed by joblib",
+        )
         self._start_parser.add_argument("--data", required=True, type=str, help="the path of the data to use")
+        self._start_parser.add_argument(
+            "--chunksize",
+            required=False,
+            type=int,
+            default=None,
+            help="stream the data in chunks of this many rows instead of loading it at once (CSV only)",
+        )
+        self._start_parser.add_argument(
+            "--compact",
+            action="store_true",
+            help="downcast the columns of the data to the smallest dtypes that hold their values to save memory",
+        )
+        self._start_parser.add_argument(
+            "--dtype",
+            required=False,
+            action="append",
+            type=ArgParser._column_dtype,
+            dest="dtypes",
+            metavar="COLUMN=DTYPE",
+            help="the dtype of a column of the data, can be given more than once",
+        )
+        self._start_parser.add_argument(
+            "--workers",
+            required=False,
+            type=int,
+            default=1,
+            help="the number of processes that compute the shap values",
+        )
+        self._start_parser.add_argument(
+            "--seed", required=False, type=int, default=0, help="the seed for sampling, results are reproducible"
+        )
+        self._add_explainer_cli_args()
+        self._start_parser.add_argument(
+            "--cachedir",
+            required=False,
+            type=Path,
+            default=(Path.cwd() / ".cache").resolve(),
+            help="the folder containing cached results",
+        )
+        self._start_parser.add_argument(
+            "--cache-size",
+            required=False,
+            type=int,
+            default=512,
+            dest="cache_size",
+            help="the maximum size of the cache in MB, least recently used results are evicted",
+        )
+        self._start_parser.add_argument(
+            "--no-cache", action="store_true", dest="no_cache", help="do not read or write cached results"
+        )
+        self._start_parser.add_argument(
+            "--refresh", action="store_true", help="recompute the results and replace them in the cache"
+        )
+        self._start_parser.add_argument(
+            "--time-budget",
+            required=False,
+            type=float,
+            default=None,
+            dest="time_budget",
+            help="explain a growing random sample of the rows for at most this many seconds, the results get the"
+            " error of every value",
+        )
+        self._start_parser.add_argument(
+            "--tolerance",
+            required=False,
+            type=float,
+            default=None,
+            help="explain a growing random sample of the rows until the ranking of the features is stable within"
+            " this fraction of the largest value, for example 0.05",
+        )
+        self._start_parser.add_argument(
+            "--no-attributions",
+            action="store_true",
+            dest="no_attributions",
+            help="only save the summary, not the SHAP values and base values of every row",
+        )
+        self._start_parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="only explain the rows appended to the data since the last incremental run in the outputdir, with"
+            " the same model and options",
+        )
+
+    def _add_explainer_cli_args(self) -> None:
+        """
+        Defines the input parameters for the SHAP explainer and the summary of its background data.
+        :return: None
+        """
+        self._start_parser.add_argument(
+            "--explainer",
+            required=False,
+            choices=ShapOptions.Explainers.list(),
+            default=ShapOptions.Explainers.AUTO,
+            type=str,
+            help="the type of explainer, auto selects the fastest explainer for the type of model",
+        )
+        self._start_parser.add_argument(
+            "--background-method",
+            required=False,
+            choices=ShapOptions.BackgroundMethods.list(),
+            default=ShapOptions.BackgroundMethods.FULL,
+            type=str,
+            dest="background_method",
+            help="how to summarize the data into the background of the explainer, full uses all data",
+        )
+        self._start_parser.add_argument(
+            "--background-size",
+            required=False,
+            type=int,
+            default=ShapOptions.DEFAULT_BACKGROUND_SIZE,
+            dest="background_size",
+            help="the number of rows (or centroids) in the summarized background",
+        )
 
     def _set_report_cli_args(self) -> None:
         """
         Defines the input parameters for a REPORT generation.
         :return: None
         """
-        self._start_parser.add_argument("--card", required=True, type=Path, help="the path of the system card to use")
+        cards = self._start_parser.add_mutually_exclusive_group(required=True)
+        cards.add_argument("--card", type=Path, help="the path of the system card to use")
+        cards.add_argument(
+            "--cards",
+            type=Path,
+            help="the path of a folder of system cards, renders the changed reports to the outputdir",
+        )
+        self._start_parser.add_argument(
+            "--workers", required=False, type=int, default=1, help="the number of processes that render reports"
+        )
+        self._start_parser.add_argument(
+            "--force", action="store_true", help="render all reports, also those that did not change"
+        )
+        self._start_parser.add_argument(
+            "--bundle",
+            required=False,
+            type=Path,
+            default=None,
+            help="the folder to package the report with the assets it uses into, for serving from a static host",
+        )
+
+    def _set_batch_cli_args(self) -> None:
+        """
+        Defines the input parameters for a batch of SHAP tests.
+        :return: None
+        """
+        self._start_parser.add_argument(
+            "--manifest",
+            required=True,
+            type=Path,
+            help="the path of a YAML or JSON manifest listing the model, data and options of every SHAP test",
+        )
+        self._start_parser.add_argument(
+            "--concurrency",
+            required=False,
+            type=int,
+            default=1,
+            help="the number of SHAP tests that run at the same time",
+        )
+
+    def _set_serve_cli_args(self) -> None:
+        """
+        Defines the input parameters for the SHAP explanation service.
+        :return: None
+        """
+        self._start_parser.add_argument(
+            "--host", required=False, type=str, default="127.0.0.1", help="the host to listen on"
+        )
+        self._start_parser.add_argument("--port", required=False, type=int, default=8000, help="the port to listen on")
+        self._start_parser.add_argument(
+            "--socket", required=False, type=Path, default=None, help="listen on this Unix socket instead of a port"
+        )
+        self._start_parser.add_argument(
+            "--concurrency",
+            required=False,
+            type=int,
+            default=1,
+            help="the number of explanation jobs that run at the same time",
+        )
+        self._start_parser.add_argument(
+            "--queue-size",
+            required=False,
+            type=int,
+            default=16,
+            dest="queue_size",
+            help="the number of jobs that can wait for a free slot, more jobs are rejected",
+        )
+        self._start_parser.add_argument(
+            "--max-models",
+            required=False,
+            type=int,
+            default=8,
+            dest="max_models",
+            help="the number of models kept warm, the least recently used model is evicted",
+        )
+        self._start_parser.add_argument(
+            "--allowed-dir",
+            required=False,
+            action="append",
+            type=Path,
+            dest="allowed_dirs",
+            help="a directory models and data may be loaded from, can be given more than once, defaults to the"
+            " working directory",
+        )
+
+    def _set_import_cli_args(self) -> None:
+        """
+        Defines the input parameters for a bulk import of answers.
+        :return: None
+        """
+        self._start_parser.add_argument(
+            "--answers",
+            required=True,
+            type=Path,
+            help="the path of a CSV, JSON or YAML file of answer sets, or of a folder of them",
+        )
+        self._set_assessment_cli_args()
+        self._start_parser.add_argument(
+            "--workers", required=False, type=int, default=1, help="the number of processes that validate answers"
+        )
+
+    def _set_benchmark_cli_args(self) -> None:
+        """
+        Defines the input parameters for the benchmarks.
+        :return: None
+        """
+        self._start_parser.add_argument(
+            "--rows", required=False, type=int, nargs="+", default=[1000, 10000], help="the rows of the datasets"
+        )
+        self._start_parser.add_argument(
+            "--features", required=False, type=int, nargs="+", default=[10, 50], help="the features of the datasets"
+        )
+        self._start_parser.add_argument(
+            "--models",
+            required=False,
+            nargs="+",
+            choices=BenchmarkOptions.Models.list(),
+            default=[BenchmarkOptions.Models.LINEAR, BenchmarkOptions.Models.FOREST],
+            help="the types of models fitted on every dataset",
+        )
+        self._start_parser.add_argument(
+            "--formats",
+            required=False,
+            nargs="+",
+            choices=BenchmarkOptions.Formats.list(),
+            default=BenchmarkOptions.Formats.list(),
+            help="the file formats the datasets are loaded from",
+        )
+        self._start_parser.add_argument(
+            "--card-sizes",
+            required=False,
+            type=int,
+            nargs="+",
+            default=[1, 10, 100],
+            dest="card_sizes",
+            help="the number of times the models and assessment questions of the system card are repeated",
+        )
+        self._start_parser.add_argument(
+            "--repeat", required=False, type=int, default=3, help="the number of times every benchmark is measured"
+        )
+        self._start_parser.add_argument(
+            "--workers",
+            required=False,
+            type=int,
+            default=1,
+            help="the number of processes that compute the shap values",
+        )
+        self._start_parser.add_argument(
+            "--seed", required=False, type=int, default=0, help="the seed of the data, the models and sampling"
+        )
+        self._add_explainer_cli_args()
+        # the time per row of the tree and permutation explainers grows with the size of the background, so explaining
+        # the data against all its rows takes time in proportion to the rows times the background rows
+        self._start_parser.set_defaults(background_method=ShapOptions.BackgroundMethods.RANDOM)
+        self._start_parser.add_argument(
+            "--history",
+            required=False,
+            type=Path,
+            default=(Path.cwd() / BenchmarkOptions.DEFAULT_HISTORY).resolve(),
+            help="the JSON lines file every run is appended to and compared with",
+        )
+        self._start_parser.add_argument(
+            "--threshold",
+            required=False,
+            type=float,
+            default=0.2,
+            help="the fraction the minimum time of a benchmark may grow since the previous run before it is reported as"
+            " a regression",
+        )
+        self._start_parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            dest="fail_on_regression",
+            help="exit with status 1 when a benchmark regressed",
+        )
+
+    def _set_compare_cli_args(self) -> None:
+        """
+        Defines the input parameters for comparing the feature importance of models.
+        :return: None
+        """
+        self._start_parser.add_argument(
+            "--model",
+            required=True,
+            type=str,
+            nargs="+",
+            help="the paths of the models to compare, the models are named after their files",
+        )
+        self._start_parser.add_argument(
+            "--mmap-model",
+            action="store_true",
+            dest="mmap_model",
+            help="memory map the arrays of the models instead of reading them, for models saved uncompressed by joblib",
+        )
+        self._start_parser.add_argument("--data", required=True, type=str, help="the path of the data to use")
+        self._start_parser.add_argument(
+            "--compact",
+            action="store_true",
+            help="downcast the columns of the data to the smallest dtypes that hold their values to save memory",
+        )
+        self._start_parser.add_argument(
+            "--dtype",
+            required=False,
+            action="append",
+            type=ArgParser._column_dtype,
+            dest="dtypes",
+            metavar="COLUMN=DTYPE",
+            help="the dtype of a column of the data, can be given more than once",
+        )
+        self._start_parser.add_argument(
+            "--concurrency",
+            required=False,
+            type=int,
+            default=1,
+            help="the number of models that are explained at the same time",
+        )
+        self._start_parser.add_argument(
+            "--workers",
+            required=False,
+            type=int,
+            default=1,
+            help="the number of processes that compute the shap values of a model",
+        )
+        self._start_parser.add_argument(
+            "--seed", required=False, type=int, default=0, help="the seed for sampling, results are reproducible"
+        )
+        self._add_explainer_cli_args()
 
     def _set_additional_cli_args(self) -> None:
         """
@@ -88,12 +461,34 @@ class ArgParser:
             self._set_shap_cli_args()
         elif self._user_namespace.action == ArgParser.Actions.REPORT:
             self._set_report_cli_args()
+        elif self._user_namespace.action == ArgParser.Actions.BATCH:
+            self._set_batch_cli_args()
+        elif self._user_namespace.action == ArgParser.Actions.SERVE:
+            self._set_serve_cli_args()
+        elif self._user_namespace.action == ArgParser.Actions.IMPORT:
+            self._set_import_cli_args()
+        elif self._user_namespace.action == ArgParser.Actions.BENCHMARK:
+            self._set_benchmark_cli_args()
+        elif self._user_namespace.action == ArgParser.Actions.COMPARE:
+            self._set_compare_cli_args()
+
+    @staticmethod
+    def _column_dtype(value: str) -> tuple[str, str]:
+        """
+        Parses a COLUMN=DTYPE command line value.
+        :param value: the command line value
+        :return: a tuple of the column and the dtype
+        """
+        column, separator, dtype = value.rpartition("=")
+        if not separator or not column or not dtype:
+            raise argparse.ArgumentTypeError(f"expected COLUMN=DTYPE, got {value}")
+        return column, dtype
 
     def print_user_args(self) -> None:
         """
         This function is mostly for debug purposes. It prints the current given arguments.
         :return: None
         """
-        args = self._start_parser.parse_args(namespace=self._user_namespace)
+        args = self._start_parser.parse_args(self._args, namespace=self._user_namespace)
         for key, val in vars(args).items():
             print(f"{key}: {val}")
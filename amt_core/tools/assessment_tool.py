@@ -2,12 +2,14 @@ import json
 import logging
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List
 
 import jsonschema
 import questionary
 import yaml
 
+from amt_core.tools.answer_store import AnswerStore
+
 logger = logging.getLogger(__name__)
 
 
@@ -32,60 +34,54 @@ class QuestionnaireTool:
 
         Path(output_dir).mkdir(parents=True, exist_ok=True)
 
-        print("=" * 50)
-        print("Welcome to AMT! We have a few questions for you.")
-        print("=" * 50)
-
-        questionnaires = QuestionnaireTool.load_questionnaires(question_dir, questionnaire_schema)
-        questionnaires_with_answers = QuestionnaireTool.load_filled_questionnaires(
-            question_dir, output_dir, answers_schema
-        )
-
-        user_aborted = False
-        for questionnaire in questionnaires:
-            output = {}
-            try:
-                # load answers from user
-                question_and_answers = None
-                if questionnaire.name in questionnaires_with_answers:
-                    question_and_answers = questionnaires_with_answers[questionnaire.name]
-
-                for question in questionnaire.questions:
-                    if question_and_answers is not None and question["name"] in question_and_answers:
-                        print(question["name"])
-
-                        if isinstance(question_and_answers[question["name"]], list):
-                            print("Previously given answer: " + ", ".join(question_and_answers[question["name"]]))
-                        else:
-                            print(f"Previously given answer: {question_and_answers[question["name"]]}")
-
-                        confirm = questionary.confirm(message="Keep this answer?").ask()
-                        if confirm:
-                            tmp = {question["name"]: question_and_answers[question["name"]]}
-                        else:
-                            tmp = questionary.unsafe_prompt(question)
-                    else:
+        with AnswerStore(Path(output_dir, AnswerStore.FILENAME)) as answer_store:
+            # answer files that are new or were edited since they were imported or exported are imported again
+            q_and_a_sources = QuestionnaireTool.load_filled_questionnaires(
+                question_dir, output_dir, answers_schema, answer_store.is_changed
+            )
+            answer_store.import_answers(
+                q_and_a_sources, [Path(output_dir, f"{questionnaire}.yaml") for questionnaire in q_and_a_sources]
+            )
+
+            if args.export:
+                output_filepaths = answer_store.export(output_dir)
+                print(f"Exported the answers of {len(output_filepaths)} questionnaires to {output_dir}")
+                return
+
+            print("=" * 50)
+            print("Welcome to AMT! We have a few questions for you.")
+            print("=" * 50)
+
+            questionnaires = QuestionnaireTool.load_questionnaires(question_dir, questionnaire_schema)
+
+            for questionnaire in questionnaires:
+                try:
+                    # load answers of earlier sessions
+                    question_and_answers = answer_store.get_answers(questionnaire.name)
+
+                    for position, question in enumerate(questionnaire.questions):
+                        if question["name"] in question_and_answers:
+                            print(question["name"])
+
+                            if isinstance(question_and_answers[question["name"]], list):
+                                print("Previously given answer: " + ", ".join(question_and_answers[question["name"]]))
+                            else:
+                                print(f"Previously given answer: {question_and_answers[question["name"]]}")
+
+                            confirm = questionary.confirm(message="Keep this answer?").ask()
+                            if confirm:
+                                continue
                         tmp = questionary.unsafe_prompt(question)
-                    output.update(tmp)
-            except KeyboardInterrupt:
-                logging.info("user aborted")
-                user_aborted = True
-
-            output_filepath = output_dir / f"{questionnaire.name}.yaml"
+                        # every answer is stored the moment it is given
+                        answer_store.put(questionnaire.name, question["name"], tmp[question["name"]], position)
+                except KeyboardInterrupt:
+                    logging.info("user aborted")
+                    print("\nYour answers are saved.\n")
+                    break
 
-            # Reformatted answers to a list containing dicts of the form {"question": "q", "answer": "a"}
-            # so that we can export it nicely to yaml.
-            q_and_a_list = [{"question": question, "answer": answer} for question, answer in output.items()]
+                print("\nYou have finished filling out this questionnaire.\n")
 
-            with open(output_filepath, "w") as file:
-                yaml.safe_dump(q_and_a_list, file, sort_keys=False)
-
-            logging.info(f"saved answers of {questionnaire.name} to {output_filepath}")
-
-            print("\nYou have finished filling out this questionnaire.\n")
-            # End if the user aborted
-            if user_aborted:
-                break
+            answer_store.export(output_dir)
 
     @staticmethod
     def load_questionnaires(
@@ -110,6 +106,10 @@ class QuestionnaireTool:
 
         with open(questionnaire_schema_path) as f:
             questionnaire_schema = json.load(f)
+        # compile the schema once instead of on every validation
+        validator_class = jsonschema.validators.validator_for(questionnaire_schema)
+        validator_class.check_schema(questionnaire_schema)
+        questionnaire_validator = validator_class(questionnaire_schema)
 
         questionnaires = []
         for questionnaire_filepath in question_dir.iterdir():
@@ -121,7 +121,7 @@ class QuestionnaireTool:
                 questionnaire = json.load(f)
 
             try:
-                jsonschema.validate(questionnaire, questionnaire_schema, cls=None)
+                questionnaire_validator.validate(questionnaire)
             except jsonschema.exceptions.ValidationError:
                 logging.exception(f"questionnaire {questionnaire_filepath} has invalid schema")
 
@@ -171,7 +171,10 @@ class QuestionnaireTool:
 
     @staticmethod
     def load_filled_questionnaires(
-        question_dir: Path, output_dir: Path, answers_schema_path: Path
+        question_dir: Path,
+        output_dir: Path,
+        answers_schema_path: Path,
+        is_changed: Callable[[Path], bool] | None = None,
     ) -> Dict[str, Dict[str, str]]:
         """
         Loads already (partially) filled in questionnaires from yaml files in the output_dir.
@@ -179,6 +182,7 @@ class QuestionnaireTool:
         :param answers_schema_path: Path to the schema for validating answer files
         :param question_dir: Path to a directory containing the questionnaires
         :param output_dir: Path to a directory containing question and answer yaml files.
+        :param is_changed: if given, only the yaml files for which it returns True are loaded
         :return: A dictionary mapping the name of a questionnaire to a dictionary with keys being
         the question and the value being the answer.
         :raises: TypeError: If output_dir is not a directory path.
@@ -190,19 +194,27 @@ class QuestionnaireTool:
 
         with open(answers_schema_path) as f:
             answers_schema = json.load(f)
+        validator_class = jsonschema.validators.validator_for(answers_schema)
+        validator_class.check_schema(answers_schema)
+        answers_validator = validator_class(answers_schema)
 
         q_and_a_sources = {}
         for q_and_a_filepath in output_dir.iterdir():
+            # the database of the answer store and its write ahead log and shared memory files
+            if q_and_a_filepath.name.startswith(AnswerStore.FILENAME):
+                continue
             if q_and_a_filepath.suffix != ".yaml":
                 logging.warning(f"ignoring unexpected file format '{q_and_a_filepath.suffix}'")
                 continue
+            if is_changed is not None and not is_changed(q_and_a_filepath):
+                continue
 
             with open(q_and_a_filepath) as f:
                 q_and_a_yaml = yaml.safe_load(f)
 
             # make sure we only parse files from the answers_schema
             try:
-                jsonschema.validate(q_and_a_yaml, answers_schema, cls=None)
+                answers_validator.validate(q_and_a_yaml)
                 q_and_a_sources[q_and_a_filepath.stem] = {}
                 for q_and_a in q_and_a_yaml:
                     q_and_a_sources[q_and_a_filepath.stem][q_and_a["question"]] = q_and_a["answer"]
@@ -0,0 +1,202 @@
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import yaml
+
+logger = logging.getLogger(__name__)
+
+
+class AttributionStore:
+    """
+    The AttributionStore class writes the SHAP values and base values of every row as numpy (.npy) files, next to
+    the YAML summary of the shap action. Rows are appended shard by shard, so the matrix never has to fit in memory,
+    and the files can be read with memory mapping:
+
+        values, base_values, feature_names = AttributionStore.load("out/shap.yaml")
+
+    The values have the shape (rows, features) or (rows, features, outputs) for models with more than one output,
+    like the class probabilities of a classifier, and the base values (rows,) or (rows, outputs).
+    """
+
+    VALUES_FILENAME = "shap_values.npy"
+    BASE_VALUES_FILENAME = "base_values.npy"
+    DTYPE = np.dtype("<f4")
+    # the size of the header of the files, it is fixed so the number of rows can be written in place when the
+    # files are closed, and a multiple of 64 bytes so the data stays aligned for memory mapping
+    HEADER_SIZE = 128
+
+    def __init__(self, output_dir: Path, feature_names: list[str], append: bool = False) -> None:
+        """
+        :param output_dir: Path to the directory for the files, an earlier version of the files is replaced when
+        the store is closed.
+        :param feature_names: the names of the features of the values
+        :param append: if True, rows are appended to the files in the directory instead. The files are changed in
+        place, until the store is closed their headers keep the earlier number of rows, so the rows appended by an
+        aborted store are ignored and cut off by the next store.
+        :return: None
+        :raises: ValueError: If the files to append to are missing or were not written by an AttributionStore.
+        """
+        self._output_dir = Path(output_dir)
+        self._output_dir.mkdir(parents=True, exist_ok=True)
+        self._feature_names = list(feature_names)
+        self._rows = 0
+        # maps the name of a file to the path it is written to and the shape of a row
+        self._files: dict[str, tuple[Path, tuple[int, ...]]] = {}
+        self._index: dict[str, Any] | None = None
+        self._append = append
+        if append:
+            self._open_for_append()
+
+    def __enter__(self) -> "AttributionStore":
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, values: np.ndarray, base_values: np.ndarray) -> None:
+        """
+        Append the values and base values of rows.
+        :param values: the SHAP values of the rows
+        :param base_values: the base values of the rows, a single base value is repeated for every row
+        :return: None
+        """
+        values = np.asarray(values, dtype=AttributionStore.DTYPE)
+        base_values = np.asarray(base_values, dtype=AttributionStore.DTYPE)
+        if base_values.ndim == 0:
+            base_values = np.full(len(values), base_values, dtype=AttributionStore.DTYPE)
+        self._write(AttributionStore.VALUES_FILENAME, values)
+        self._write(AttributionStore.BASE_VALUES_FILENAME, base_values)
+        self._rows += len(values)
+
+    def close(self) -> dict[str, Any]:
+        """
+        Write the number of rows to the files and replace earlier versions of them.
+        :return: the index of the files for the YAML summary
+        """
+        if self._index is not None:
+            return self._index
+        if not self._files:
+            # nothing was explained, write empty files
+            self._write(
+                AttributionStore.VALUES_FILENAME, np.empty((0, len(self._feature_names)), AttributionStore.DTYPE)
+            )
+            self._write(AttributionStore.BASE_VALUES_FILENAME, np.empty(0, AttributionStore.DTYPE))
+        shapes = {}
+        for filename, (path, row_shape) in self._files.items():
+            shapes[filename] = [self._rows, *row_shape]
+            with open(path, "r+b") as f:
+                f.write(AttributionStore._header(shapes[filename]))
+            if not self._append:
+                os.replace(path, Path(self._output_dir, filename))
+        self._index = {
+            "values": AttributionStore.VALUES_FILENAME,
+            "base_values": AttributionStore.BASE_VALUES_FILENAME,
+            "dtype": AttributionStore.DTYPE.name,
+            "shape": shapes[AttributionStore.VALUES_FILENAME],
+            "base_values_shape": shapes[AttributionStore.BASE_VALUES_FILENAME],
+            "feature_names": self._feature_names,
+        }
+        logging.info(f"saved the attributions of {self._rows} rows to {self._output_dir}")
+        return self._index
+
+    def abort(self) -> None:
+        """
+        Remove the files written so far, earlier versions of the files are kept. The rows appended to files are
+        cut off again.
+        :return: None
+        """
+        if self._append:
+            self._open_for_append()
+        else:
+            for tmp_path, _ in self._files.values():
+                tmp_path.unlink(missing_ok=True)
+        self._files = {}
+
+    @staticmethod
+    def rows(output_dir: Path) -> int | None:
+        """
+        :param output_dir: Path to the directory of the files.
+        :return: the number of rows in the files, None if they are missing or do not have the same number of rows
+        """
+        try:
+            rows = {
+                np.load(Path(output_dir, filename), mmap_mode="r").shape[0]
+                for filename in (AttributionStore.VALUES_FILENAME, AttributionStore.BASE_VALUES_FILENAME)
+            }
+        except (OSError, ValueError):
+            return None
+        return rows.pop() if len(rows) == 1 else None
+
+    @staticmethod
+    def load(summary_path: Path, mmap: bool = True) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        """
+        Load the attributions indexed by a YAML summary of the shap action.
+        :param summary_path: Path to the YAML summary.
+        :param mmap: if True, the files are memory mapped instead of read into memory
+        :return: a tuple of the SHAP values, the base values and the names of the features
+        :raises: KeyError: If the summary does not index attributions.
+        """
+        with open(summary_path) as f:
+            index = yaml.safe_load(f)["attributions"]
+        mmap_mode = "r" if mmap else None
+        values = np.load(Path(Path(summary_path).parent, index["values"]), mmap_mode=mmap_mode)
+        base_values = np.load(Path(Path(summary_path).parent, index["base_values"]), mmap_mode=mmap_mode)
+        return values, base_values, index["feature_names"]
+
+    def _open_for_append(self) -> None:
+        """
+        Cut the files in the directory off after the rows in their headers and continue writing after them.
+        :return: None
+        :raises: ValueError: If the files are missing or were not written by an AttributionStore.
+        """
+        rows = AttributionStore.rows(self._output_dir)
+        if rows is None:
+            raise ValueError(f"{self._output_dir} does not have attributions with the same number of rows")
+        for filename in (AttributionStore.VALUES_FILENAME, AttributionStore.BASE_VALUES_FILENAME):
+            path = Path(self._output_dir, filename)
+            array = np.load(path, mmap_mode="r")
+            if array.dtype != AttributionStore.DTYPE or array.offset != AttributionStore.HEADER_SIZE:
+                raise ValueError(f"{path} was not written by an AttributionStore")
+            with open(path, "r+b") as f:
+                f.truncate(AttributionStore.HEADER_SIZE + array.nbytes)
+            self._files[filename] = (path, array.shape[1:])
+        self._rows = rows
+
+    def _write(self, filename: str, rows: np.ndarray) -> None:
+        if filename not in self._files:
+            tmp_path = Path(self._output_dir, f".{filename}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                # the header is written again with the number of rows when the store is closed
+                f.write(AttributionStore._header([0, *rows.shape[1:]]))
+            self._files[filename] = (tmp_path, rows.shape[1:])
+        path, row_shape = self._files[filename]
+        if rows.shape[1:] != row_shape:
+            raise ValueError(f"rows of shape {rows.shape[1:]} can not be appended to rows of shape {row_shape}")
+        with open(path, "ab") as f:
+            f.write(np.ascontiguousarray(rows).tobytes())
+
+    @staticmethod
+    def _header(shape: list[int]) -> bytes:
+        """
+        :param shape: the shape of the array
+        :return: the header of a version 1.0 .npy file of HEADER_SIZE bytes
+        """
+        header = repr(
+            {
+                "descr": np.lib.format.dtype_to_descr(AttributionStore.DTYPE),
+                "fortran_order": False,
+                "shape": tuple(shape),
+            }
+        )
+        magic = np.lib.format.magic(1, 0)
+        header_length = AttributionStore.HEADER_SIZE - len(magic) - 2
+        if len(header) >= header_length:
+            raise ValueError(f"the header of an array of shape {shape} does not fit in {header_length} bytes")
+        return magic + struct.pack("<H", header_length) + (header.ljust(header_length - 1) + "\n").encode("latin1")
@@ -0,0 +1,157 @@
+import logging
+import time
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+from amt_core.tools.arg_parser import ArgParser
+from amt_core.tools.instrumentation_tool import InstrumentationTool
+from amt_core.tools.shap_tool import ShapTool
+
+logger = logging.getLogger(__name__)
+
+
+class BatchTool:
+    """
+    The BatchTool class provides methods for running the SHAP tests of many models in one process, so the
+    libraries are imported only once.
+    """
+
+    SUMMARY_FILENAME = "batch_summary.yaml"
+    # the options of an entry that are paths, relative paths are relative to the manifest
+    PATH_OPTIONS = ("model", "data", "outputdir", "cachedir")
+
+    @staticmethod
+    def run_batch(args) -> None:
+        """
+        Runs the SHAP test of every entry in the manifest and writes a summary of the outcome of every
+        entry to the output directory. A failing or invalid entry does not stop the batch, neither does a
+        crashed worker process.
+
+        The manifest is a YAML or JSON list of entries, or a mapping with the list under "entries". Every
+        entry has a model and data and optionally an outputdir and any other option of the shap action,
+        named like its command line argument with underscores, for example background_method. Relative paths
+        in an entry are relative to the directory of the manifest.
+        :param args: the command line arguments
+        :return: None
+        :raises: TypeError: If the manifest does not contain a list of entries.
+        """
+        entries = BatchTool.load_manifest(args.manifest)
+        manifest_dir = Path(args.manifest).parent
+        logging.info(f"running {len(entries)} entries of {args.manifest} with concurrency {args.concurrency}")
+
+        jobs = [(index, entry, manifest_dir, args.outputdir) for index, entry in enumerate(entries)]
+        if args.concurrency > 1:
+            # the processes of the pool live for the whole batch, so every process imports the libraries once
+            with ProcessPoolExecutor(
+                max_workers=args.concurrency, **InstrumentationTool.worker_initializer()
+            ) as executor:
+                futures = [executor.submit(_run_entry, *job) for job in jobs]
+                summary = []
+                for job, future in zip(jobs, futures):
+                    try:
+                        summary.append(future.result())
+                    except BrokenProcessPool as e:
+                        # a worker died, for example out of memory, the entries it and the pool did not finish fail
+                        logging.error(f"entry {job[0]} of {args.manifest} did not finish: {e}")
+                        summary.append(
+                            _entry_summary(*job[:2])
+                            | {"status": "failure", "error": f"BrokenProcessPool: {e}", "seconds": 0.0}
+                        )
+        else:
+            summary = [_run_entry(*job) for job in jobs]
+
+        Path(args.outputdir).mkdir(parents=True, exist_ok=True)
+        summary_filepath = Path(args.outputdir, BatchTool.SUMMARY_FILENAME)
+        with open(summary_filepath, "w") as file:
+            yaml.safe_dump(summary, file, sort_keys=False)
+        failures = sum(entry["status"] == "failure" for entry in summary)
+        logging.info(f"saved batch summary to {summary_filepath}, {failures} of {len(summary)} entries failed")
+        print(f"{len(summary) - failures} of {len(summary)} entries succeeded, see {summary_filepath}")
+
+    @staticmethod
+    def load_manifest(manifest_path: Path) -> list[Any]:
+        """
+        Loads the entries of a manifest, the entries are validated when they run.
+        :param manifest_path: Path to the YAML or JSON manifest.
+        :return: the entries
+        :raises: TypeError: If the manifest does not contain a list of entries.
+        """
+        with open(manifest_path) as f:
+            # YAML is a superset of JSON, so this loads both
+            manifest = yaml.safe_load(f)
+        if isinstance(manifest, dict):
+            manifest = manifest.get("entries")
+        if not isinstance(manifest, list):
+            raise TypeError(f"manifest {manifest_path} must contain a list of entries")
+        return manifest
+
+    @staticmethod
+    def entry_args(index: int, entry: Any, manifest_dir: Path, output_dir: Path) -> Namespace:
+        """
+        Converts an entry of a manifest to the arguments of the shap action, options that are not in the entry
+        get their default value. The paths of an entry are resolved against the directory of the manifest. An
+        entry without an outputdir is written to a subdirectory of output_dir named after its model.
+        :param index: the index of the entry in the manifest
+        :param entry: the entry
+        :param manifest_dir: the directory of the manifest
+        :param output_dir: the default output directory
+        :return: the arguments of the entry
+        :raises: TypeError: If the entry is invalid.
+        """
+        if not isinstance(entry, dict) or "model" not in entry or "data" not in entry:
+            raise TypeError(f"entry {index} must be a mapping with a model and data")
+        entry_args = ArgParser(
+            [f"--action={ArgParser.Actions.SHAP}", f"--model={entry['model']}", f"--data={entry['data']}"]
+        ).get_args()
+        unknown = set(entry) - set(vars(entry_args))
+        if unknown:
+            raise TypeError(f"entry {index} has unknown options {sorted(unknown)}")
+        vars(entry_args).update(entry)
+        for option in BatchTool.PATH_OPTIONS:
+            if option in entry:
+                path = Path(manifest_dir, entry[option])
+                setattr(entry_args, option, path if isinstance(getattr(entry_args, option), Path) else str(path))
+        if "outputdir" not in entry:
+            entry_args.outputdir = Path(output_dir, f"{index}_{Path(entry['model']).stem}")
+        return entry_args
+
+
+def _entry_summary(index: int, entry: Any) -> dict[str, Any]:
+    """
+    The fields of the summary of an entry that identify it, as far as the entry has them.
+    :param index: the index of the entry in the manifest
+    :param entry: the entry
+    :return: the summary of the entry without its outcome
+    """
+    entry = entry if isinstance(entry, dict) else {}
+    return {"entry": index, "model": entry.get("model"), "data": entry.get("data")}
+
+
+def _run_entry(index: int, entry: Any, manifest_dir: Path, output_dir: Path) -> dict[str, Any]:
+    """
+    Validates and runs the SHAP test of one entry of a batch.
+    :param index: the index of the entry in the manifest
+    :param entry: the entry
+    :param manifest_dir: the directory of the manifest
+    :param output_dir: the default output directory
+    :return: the summary of the entry
+    """
+    start = time.perf_counter()
+    summary = _entry_summary(index, entry)
+    try:
+        entry_args = BatchTool.entry_args(index, entry, manifest_dir, output_dir)
+        summary["outputdir"] = str(entry_args.outputdir)
+        ShapTool.run_shap(entry_args)
+    except (Exception, SystemExit) as e:
+        # argparse exits on an invalid value of the model or data
+        logging.exception(f"entry {index} with model {summary['model']} and data {summary['data']} failed")
+        summary.update({"status": "failure", "error": f"{type(e).__name__}: {e}"})
+    else:
+        summary["status"] = "success"
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    return summary
@@ -0,0 +1,402 @@
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from importlib import metadata
+from pathlib import Path
+from typing import Any
+
+import joblib
+import numpy as np
+import yaml
+from pandas import DataFrame
+from sklearn.datasets import make_classification
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.neural_network import MLPClassifier
+
+from amt_core.loaders.data_loader import DataLoader
+from amt_core.loaders.model_loader import ModelLoader
+from amt_core.tools.instrumentation_tool import InstrumentationTool
+from amt_core.tools.options import BenchmarkOptions
+from amt_core.tools.report_tool import ReportTool
+from amt_core.tools.shap_tool import ShapTool
+
+logger = logging.getLogger(__name__)
+
+
+class BenchmarkTool:
+    """
+    The BenchmarkTool class measures the loaders, the SHAP tool and the report tool on synthetic data, models and
+    system cards, over a grid of rows, features, model types and card sizes. Every run is appended as a JSON line to
+    a history file together with the versions of the libraries and the platform, and is compared with the previous
+    run in the history, so a regression between versions shows up before an upgrade is rolled out.
+    """
+
+    Models = BenchmarkOptions.Models
+    Formats = BenchmarkOptions.Formats
+
+    DEFAULT_HISTORY = BenchmarkOptions.DEFAULT_HISTORY
+    # the libraries whose versions are recorded with every run
+    PACKAGES = ("numpy", "pandas", "pyarrow", "scikit-learn", "shap", "jinja2", "pyyaml")
+    # models are fitted on at most this many rows, the benchmarks measure explaining and loading, not fitting
+    FIT_ROWS = 5000
+    # the system card the synthetic cards are grown from, its models and assessment questions are repeated
+    BASE_CARD = Path("cards", "system_card.yaml")
+
+    @staticmethod
+    def run_benchmark(args) -> None:
+        """
+        Runs the benchmarks of the grid given on the command line, appends the run to the history and prints
+        the results next to those of the previous run.
+        :param args: the command line arguments
+        :return: None
+        :raises: SystemExit: If --fail-on-regression is given and a benchmark regressed.
+        """
+        with tempfile.TemporaryDirectory(prefix="amt-benchmark-") as workdir:
+            results = BenchmarkTool.benchmark_loaders_and_shap(args, Path(workdir))
+            results += BenchmarkTool.benchmark_reports(args, Path(workdir))
+
+        history_path = Path(args.history)
+        previous = BenchmarkTool.load_history(history_path)
+        run = {
+            "run": InstrumentationTool.run_id(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": BenchmarkTool._commit(),
+            "versions": BenchmarkTool.versions(),
+            "platform": {
+                "python": platform.python_version(),
+                "system": platform.system(),
+                "machine": platform.machine(),
+                "processor": platform.processor(),
+            },
+            "repeat": args.repeat,
+            "results": results,
+        }
+        history_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(history_path, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        logging.info(f"appended benchmark run {run['run']} with {len(results)} results to {history_path}")
+
+        regressions = BenchmarkTool.compare(results, previous[-1]["results"] if previous else [], args.threshold)
+        print(BenchmarkTool.table(results, previous[-1] if previous else None, args.threshold))
+        print(f"Saved {len(results)} results to {history_path}, {len(regressions)} regressed")
+        if regressions and args.fail_on_regression:
+            raise SystemExit(1)
+
+    @staticmethod
+    def available_formats(formats: list[str]) -> list[str]:
+        """
+        Leave out the formats of which the library is not installed, with a warning.
+        :param formats: the formats to benchmark
+        :return: the formats that can be written and loaded
+        """
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            return formats
+        skipped = [data_format for data_format in formats if data_format == BenchmarkTool.Formats.PARQUET]
+        if skipped:
+            logging.warning(f"pyarrow is not installed, skipping the formats {skipped}")
+            print(f"Skipping the formats {skipped}, install the arrow extra to benchmark them")
+        return [data_format for data_format in formats if data_format not in skipped]
+
+    @staticmethod
+    def benchmark_loaders_and_shap(args, workdir: Path) -> list[dict[str, Any]]:
+        """
+        Generates a dataset for every combination of rows and features and a model of every type fitted on it,
+        and measures DataLoader.load for every format, ModelLoader.load, ShapTool.get_results and
+        ShapTool.save_results.
+        :param args: the command line arguments
+        :param workdir: Path to the directory for the synthetic files.
+        :return: the results
+        """
+        results = []
+        formats = BenchmarkTool.available_formats(args.formats)
+        for rows in args.rows:
+            for features in args.features:
+                data = BenchmarkTool.make_data(rows, features, args.seed)
+                for data_format in formats:
+                    data_path = BenchmarkTool.write_data(data, Path(workdir, f"data_{rows}x{features}{data_format}"))
+                    params = {"rows": rows, "features": features, "format": data_format}
+                    results.append(
+                        BenchmarkTool.measure("data.load", params, args.repeat, DataLoader.load, data_path)[0]
+                    )
+
+                features_data = data.drop(columns="label")
+                for model_type in args.models:
+                    model = BenchmarkTool.make_model(model_type, data, args.seed)
+                    model_path = Path(workdir, f"model_{model_type}_{rows}x{features}.sav")
+                    joblib.dump(model, model_path)
+                    params = {"rows": rows, "features": features, "model": str(model_type)}
+                    results.append(BenchmarkTool.measure("model.load", params, args.repeat, _load_model, model_path)[0])
+
+                    result, shap_results = BenchmarkTool.measure(
+                        "shap.get_results",
+                        params | {"explainer": args.explainer, "workers": args.workers},
+                        args.repeat,
+                        _get_results,
+                        model,
+                        features_data,
+                        args,
+                    )
+                    results.append(result)
+                    output_dir = Path(workdir, f"shap_{model_type}_{rows}x{features}")
+                    results.append(
+                        BenchmarkTool.measure(
+                            "shap.save_results", params, args.repeat, ShapTool.save_results, shap_results, output_dir
+                        )[0]
+                    )
+        return results
+
+    @staticmethod
+    def benchmark_reports(args, workdir: Path) -> list[dict[str, Any]]:
+        """
+        Grows a system card for every card size and measures loading it with ReportTool and ReportTool.render.
+        :param args: the command line arguments
+        :param workdir: Path to the directory for the synthetic cards and reports.
+        :return: the results
+        """
+        results = []
+        base_card = ReportTool(Path(Path.cwd(), BenchmarkTool.BASE_CARD)).data
+        for size in args.card_sizes:
+            card_path = BenchmarkTool.write_card(base_card, size, Path(workdir, f"card_{size}.yaml"))
+            params = {"card_size": size}
+            result, report_tool = BenchmarkTool.measure("report.load", params, args.repeat, ReportTool, card_path)
+            results.append(result)
+            output_path = Path(workdir, f"report_{size}.html")
+            result = BenchmarkTool.measure("report.render", params, args.repeat, report_tool.render, output_path)[0]
+            result["output_bytes"] = output_path.stat().st_size
+            results.append(result)
+        return results
+
+    @staticmethod
+    def measure(
+        name: str, params: dict[str, Any], repeat: int, function: Callable[..., Any], *args: Any
+    ) -> tuple[dict[str, Any], Any]:
+        """
+        Calls a function a number of times and measures the wall and CPU time of every call.
+        :param name: the name of the benchmark
+        :param params: the parameters of the benchmark, together with the name they identify it in the history
+        :param repeat: the number of calls
+        :param function: the function to measure
+        :param args: the arguments of the function
+        :return: a tuple of the result, with the minimum, median and maximum wall time and the median CPU time in
+        seconds, and the return value of the last call
+        """
+        wall, cpu = [], []
+        value = None
+        for _ in range(repeat):
+            start_wall, start_cpu = time.perf_counter(), time.process_time()
+            value = function(*args)
+            wall.append(time.perf_counter() - start_wall)
+            cpu.append(time.process_time() - start_cpu)
+        result = {
+            "name": name,
+            "params": params,
+            "min_s": round(min(wall), 6),
+            "median_s": round(statistics.median(wall), 6),
+            "max_s": round(max(wall), 6),
+            "cpu_median_s": round(statistics.median(cpu), 6),
+        }
+        logging.info(f"benchmark {name} {params}: median {result['median_s']:.4f} seconds of {repeat} calls")
+        return result, value
+
+    @staticmethod
+    def make_data(rows: int, features: int, seed: int) -> DataFrame:
+        """
+        Generates a classification dataset with a label column.
+        :param rows: the number of rows
+        :param features: the number of features, about half of them are informative
+        :param seed: the seed of the generator
+        :return: the dataset
+        """
+        x, y = make_classification(
+            n_samples=rows,
+            n_features=features,
+            n_informative=max(2, features // 2),
+            n_redundant=min(features // 4, features - max(2, features // 2)),
+            random_state=seed,
+        )
+        data = DataFrame(x, columns=[f"feature_{i}" for i in range(features)])
+        data["label"] = y
+        return data
+
+    @staticmethod
+    def write_data(data: DataFrame, path: Path) -> Path:
+        """
+        Writes a dataset in the format of the suffix of its path.
+        :param data: the dataset
+        :param path: Path to the file.
+        :return: the path
+        """
+        match path.suffix:
+            case BenchmarkTool.Formats.CSV:
+                data.to_csv(path, index=False)
+            case BenchmarkTool.Formats.PARQUET:
+                data.to_parquet(path, index=False)
+            case BenchmarkTool.Formats.NPY:
+                np.save(path, data.to_numpy())
+            case _:
+                raise TypeError(
+                    f"Format {path.suffix} is not supported, supported formats are {BenchmarkTool.Formats.list()}"
+                )
+        return path
+
+    @staticmethod
+    def make_model(model_type: Models, data: DataFrame, seed: int):
+        """
+        Fits a model of a type on at most FIT_ROWS rows of a dataset.
+        :param model_type: the type of the model
+        :param data: the dataset with a label column
+        :param seed: the seed of the model
+        :return: the fitted model
+        """
+        match model_type:
+            case BenchmarkTool.Models.LINEAR:
+                model = LogisticRegression(max_iter=1000)
+            case BenchmarkTool.Models.FOREST:
+                model = RandomForestClassifier(n_estimators=10, max_depth=6, random_state=seed)
+            case BenchmarkTool.Models.BOOSTING:
+                model = HistGradientBoostingClassifier(max_iter=20, max_depth=6, random_state=seed)
+            case BenchmarkTool.Models.MLP:
+                model = MLPClassifier(hidden_layer_sizes=(32,), max_iter=200, random_state=seed)
+            case _:
+                raise TypeError(f"Model {model_type} is not supported, supported types are {BenchmarkTool.Models}")
+        sample = data.iloc[: BenchmarkTool.FIT_ROWS]
+        return model.fit(sample.drop(columns="label"), sample["label"])
+
+    @staticmethod
+    def write_card(base_card: dict[str, Any], size: int, path: Path) -> Path:
+        """
+        Writes a system card with the models and the questions of the assessments of a card repeated size times.
+        :param base_card: the data of the card as loaded by ReportTool
+        :param size: the number of repetitions
+        :param path: Path to the card.
+        :return: the path
+        """
+        card = dict(base_card)
+        # ReportTool renames model-index, the card has the name of the system card format
+        models = [
+            {key: value for key, value in model.items() if key != "model_index"} | {"model-index": model["model_index"]}
+            for model in base_card["models"]
+        ]
+        card["models"] = models * size
+        card["assessments"] = [
+            assessment | {"contents": assessment["contents"] * size} for assessment in base_card["assessments"]
+        ]
+        with open(path, "w") as f:
+            yaml.safe_dump(card, f, sort_keys=False, allow_unicode=True)
+        return path
+
+    @staticmethod
+    def load_history(history_path: Path) -> list[dict[str, Any]]:
+        """
+        :param history_path: Path to the history.
+        :return: the runs in the history, oldest first
+        """
+        if not history_path.is_file():
+            return []
+        with open(history_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    @staticmethod
+    def compare(
+        results: list[dict[str, Any]], previous_results: list[dict[str, Any]], threshold: float
+    ) -> list[tuple[dict[str, Any], float]]:
+        """
+        Compares the minimum wall times of results with those of the same benchmarks of a previous run. The minimum
+        is the least disturbed by other work on the machine.
+        :param results: the results
+        :param previous_results: the results of the previous run
+        :param threshold: the fraction a minimum may grow before it is a regression
+        :return: the regressed results and their ratio to the previous minimum
+        """
+        previous = {BenchmarkTool._key(result): result for result in previous_results}
+        regressions = []
+        for result in results:
+            ratio = BenchmarkTool._ratio(result, previous.get(BenchmarkTool._key(result)))
+            if ratio is not None and ratio > 1 + threshold:
+                regressions.append((result, ratio))
+        return regressions
+
+    @staticmethod
+    def table(results: list[dict[str, Any]], previous_run: dict[str, Any] | None, threshold: float) -> str:
+        """
+        :param results: the results
+        :param previous_run: the previous run in the history, None if there is none
+        :param threshold: the fraction a minimum may grow before it is a regression
+        :return: a table of the results with their change since the previous run
+        """
+        previous = {BenchmarkTool._key(result): result for result in (previous_run or {}).get("results", [])}
+        lines = [f"{'benchmark':<20} {'params':<64} {'min s':>10} {'median s':>10} {'change':>8}"]
+        for result in results:
+            ratio = BenchmarkTool._ratio(result, previous.get(BenchmarkTool._key(result)))
+            change = "" if ratio is None else f"{ratio - 1:+.0%}"
+            if ratio is not None and ratio > 1 + threshold:
+                change += " !"
+            params = ", ".join(f"{key}={value}" for key, value in result["params"].items())
+            lines.append(
+                f"{result['name']:<20} {params:<64} {result['min_s']:>10.4f} {result['median_s']:>10.4f} {change:>8}"
+            )
+        if previous_run is not None:
+            lines.append(f"compared with run {previous_run['run']} of {previous_run['timestamp']}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def versions() -> dict[str, str | None]:
+        """
+        :return: the installed versions of the libraries in PACKAGES, None for those that are not installed
+        """
+        versions = {}
+        for package in BenchmarkTool.PACKAGES:
+            try:
+                versions[package] = metadata.version(package)
+            except metadata.PackageNotFoundError:
+                versions[package] = None
+        return versions
+
+    @staticmethod
+    def _commit() -> str | None:
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def _key(result: dict[str, Any]) -> str:
+        return json.dumps([result["name"], result["params"]], sort_keys=True)
+
+    @staticmethod
+    def _ratio(result: dict[str, Any], previous: dict[str, Any] | None) -> float | None:
+        if previous is None or previous["min_s"] <= 0:
+            return None
+        return result["min_s"] / previous["min_s"]
+
+
+def _load_model(path: Path):
+    # the registry would hand out the model of the previous call
+    ModelLoader.unload(path)
+    return ModelLoader.load(path)
+
+
+def _get_results(model, data: DataFrame, args) -> dict[str, Any]:
+    shap_tool = ShapTool(
+        model,
+        data,
+        args.background_method,
+        args.background_size,
+        seed=args.seed,
+        workers=args.workers,
+        explainer=args.explainer,
+    )
+    return shap_tool.get_results()
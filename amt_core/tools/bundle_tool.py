@@ -0,0 +1,526 @@
+import gzip
+import hashlib
+import json
+import logging
+import re
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import quote, unquote, urlparse
+
+from amt_core.tools.instrumentation_tool import InstrumentationTool
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# a CSS rule is its prelude with a block of declarations, a list of nested rules or None for statements like @import
+CssRule = tuple[str, "str | list[CssRule] | None"]
+
+
+class BundleTool:
+    """
+    The BundleTool class packages a rendered report into a folder that can be served from a static host. Only the
+    assets the report uses are bundled: the stylesheets are tree shaken against the classes, ids and elements in
+    the report and its classic and module scripts and minified, small SVG files are inlined and the other files
+    are fingerprinted, so they can be cached forever. Every text file gets precompressed gzip and, if brotli is
+    installed, brotli variants.
+    """
+
+    # SVG files up to this size are inlined as data URIs
+    INLINE_SVG_MAX_SIZE = 4 * 1024
+    # stylesheets up to this size are inlined completely, about what fits in the first round trip of a connection
+    INLINE_CSS_MAX_SIZE = 14 * 1024
+    # the part of the body that is rendered first, the CSS it uses is inlined as critical CSS
+    CRITICAL_HTML_SIZE = 14 * 1024
+    COMPRESSED_SUFFIXES = (".html", ".css", ".js", ".mjs", ".svg", ".json", ".wasm")
+    ENTRY_FILENAME = "index.html"
+    MANIFEST_FILENAME = "bundle.json"
+    # at-rules of which the block contains rules, the blocks of other at-rules are kept as they are
+    NESTED_AT_RULES = ("@media", "@supports", "@document", "@-moz-document", "@layer", "@container")
+
+    _TAG_PATTERN = re.compile(r"<(link|script|img)\b([^>]*)>(?:\s*</script>)?", re.IGNORECASE)
+    _ATTRIBUTE_PATTERN = re.compile(r"""([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?""")
+    _URL_PATTERN = re.compile(r"""url\(\s*(?:"([^"]*)"|'([^']*)'|([^)\s]*))\s*\)""")
+    _WORD_PATTERN = re.compile(r"[A-Za-z_][\w-]*")
+    _FINGERPRINT_PATTERN = re.compile(r"\.[0-9a-f]{8}$")
+    _MODULE_URL_PATTERN = re.compile(r"""new URL\(\s*(["'])(\.{1,2}/[^"']*)\1\s*,\s*import\.meta\.url\s*\)""")
+
+    def __init__(self, output_dir: Path) -> None:
+        """
+        :param output_dir: Path to the folder for the bundle.
+        :return: None
+        """
+        self._output_dir = Path(output_dir)
+        # maps the path of a bundled asset to its URL in the bundle
+        self._asset_urls: dict[Path, str] = {}
+        self._files: list[Path] = []
+        # the words of the bundled module scripts, classes and ids they set are only found in the scripts
+        self._module_words: set[str] = set()
+
+    @staticmethod
+    def run_bundle(html_path: Path, output_dir: Path, base_dir: Path | None = None) -> Path:
+        """
+        Packages a rendered report with the assets it uses into output_dir.
+        :param html_path: Path to the rendered report.
+        :param output_dir: Path to the folder for the bundle.
+        :param base_dir: Path to the folder the relative URLs of the report are resolved against, defaults to
+        the folder of the report.
+        :return: the path of the entry file of the bundle
+        """
+        return BundleTool(output_dir).bundle(html_path, base_dir)
+
+    @InstrumentationTool.span("report.bundle")
+    def bundle(self, html_path: Path, base_dir: Path | None = None) -> Path:
+        """
+        Packages a rendered report with the assets it uses, files of an earlier bundle in the same folder that
+        are no longer used are removed.
+        :param html_path: Path to the rendered report.
+        :param base_dir: Path to the folder the relative URLs of the report are resolved against, defaults to
+        the folder of the report.
+        :return: the path of the entry file of the bundle
+        """
+        html_path = Path(html_path).resolve()
+        base_dir = Path(base_dir).resolve() if base_dir is not None else html_path.parent
+        self._output_dir.mkdir(parents=True, exist_ok=True)
+        if brotli is None:
+            logging.warning("brotli is not installed, the bundle only gets gzip variants")
+        with open(html_path) as f:
+            html = f.read()
+
+        used = _SelectorCollector.collect(html)
+        body_start = max(html.find("<body"), 0)
+        critical = _SelectorCollector.collect(html[: body_start + BundleTool.CRITICAL_HTML_SIZE])
+
+        stylesheets, scripts = [], []
+
+        def replace_tag(match: re.Match) -> str:
+            tag = match.group(1).lower()
+            attributes = {
+                name.lower(): next((value for value in values if value), "")
+                for name, *values in BundleTool._ATTRIBUTE_PATTERN.findall(match.group(2))
+            }
+            url = attributes.get("src" if tag in ("script", "img") else "href")
+            path = BundleTool._local_path(url, base_dir)
+            if path is None:
+                return match.group(0)
+            rel = attributes.get("rel", "").lower()
+            if tag == "link" and rel == "stylesheet":
+                stylesheets.append(path)
+                # the first stylesheet is replaced by the bundled CSS, the others are removed
+                return "<!--amt-bundle-css-->" if len(stylesheets) == 1 else ""
+            if tag == "link" and rel in ("preload", "prefetch", "modulepreload"):
+                # hints for the unbundled assets only cost requests on a slow connection
+                return ""
+            if tag == "script" and attributes.get("type") != "module":
+                scripts.append(path)
+                return "<!--amt-bundle-js-->" if len(scripts) == 1 else ""
+            if tag == "script":
+                return match.group(0).replace(url, self._module_url(path))
+            return match.group(0).replace(url, self._asset_url(path))
+
+        html = BundleTool._TAG_PATTERN.sub(replace_tag, html)
+
+        # classes and ids that scripts set are only found in the scripts
+        for script in scripts:
+            with open(script) as f:
+                used["words"].update(BundleTool._WORD_PATTERN.findall(f.read()))
+        used["words"].update(self._module_words)
+
+        css_tag = ""
+        if stylesheets:
+            rules = []
+            for stylesheet in stylesheets:
+                rules += BundleTool.parse_css(BundleTool._read_css(stylesheet))
+            bundled_css = self._serialize(BundleTool.shake(rules, used))
+            if len(bundled_css) <= BundleTool.INLINE_CSS_MAX_SIZE:
+                css_tag = f"<style>{bundled_css}</style>"
+            else:
+                css_path = self._write_fingerprinted("bundle.css", bundled_css.encode())
+                critical_css = self._serialize(BundleTool.shake(rules, critical))
+                # the complete stylesheet loads without blocking the first render, it repeats the critical rules so
+                # the cascade ends up as in the original stylesheets
+                css_tag = (
+                    f"<style>{critical_css}</style>"
+                    f'<link rel="stylesheet" href="{css_path}" media="print" onload="this.media=\'all\'">'
+                    f'<noscript><link rel="stylesheet" href="{css_path}"></noscript>'
+                )
+        html = html.replace("<!--amt-bundle-css-->", css_tag, 1)
+
+        js_tag = ""
+        if scripts:
+            bundled_js = ";\n".join(script.read_text() for script in scripts)
+            js_tag = f'<script src="{self._write_fingerprinted("bundle.js", bundled_js.encode())}"></script>'
+        html = html.replace("<!--amt-bundle-js-->", js_tag, 1)
+
+        entry_path = self._write(BundleTool.ENTRY_FILENAME, html.encode())
+        self._finish()
+        logging.info(
+            f"bundled {html_path} to {entry_path} with {len(stylesheets)} stylesheets and {len(scripts)} scripts"
+        )
+        print(f"Bundled report to {entry_path}")
+        return entry_path
+
+    @staticmethod
+    def parse_css(css: str) -> list[CssRule]:
+        """
+        Parse a stylesheet without comments into its rules.
+        :param css: the stylesheet
+        :return: the rules
+        """
+        rules, _ = BundleTool._parse_rules(css, 0)
+        return rules
+
+    @staticmethod
+    def shake(rules: list[CssRule], used: dict[str, set[str]]) -> list[CssRule]:
+        """
+        Remove the rules of which no selector matches the used classes, ids and elements, and the fonts and
+        animations that the remaining rules do not use.
+        :param rules: the rules of the stylesheets
+        :param used: the classes, ids, elements and script words that are used
+        :return: the used rules
+        """
+        rules = BundleTool._shake_selectors(rules, used)
+        declarations = " ".join(BundleTool._declarations(rules))
+        return BundleTool._shake_at_rules(rules, set(BundleTool._WORD_PATTERN.findall(declarations)))
+
+    @staticmethod
+    def minify_css(prelude: str, block: str | None) -> str:
+        """
+        Minify the prelude and declarations of a rule, strings are left as they are.
+        :param prelude: the selectors or at-rule of the rule
+        :param block: the declarations of the rule or None for a statement
+        :return: the minified prelude and the minified declarations
+        """
+        prelude = " ".join(prelude.split())
+        if not prelude.startswith("@"):
+            prelude = re.sub(r"\s*([,>~+])\s*", r"\1", prelude)
+        if block is None:
+            return f"{prelude};"
+        # split on strings, the odd parts are the strings
+        parts = re.split(r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')""", block)
+        for index in range(0, len(parts), 2):
+            part = " ".join(parts[index].split())
+            parts[index] = re.sub(r"\s*([:;,{}!])\s*", r"\1", part).replace(";}", "}")
+        return f"{prelude}{{{''.join(parts).strip(';')}}}"
+
+    def _serialize(self, rules: list[CssRule]) -> str:
+        css = []
+        for prelude, block in rules:
+            if isinstance(block, list):
+                css.append(f"{' '.join(prelude.split())}{{{self._serialize(block)}}}")
+            else:
+                css.append(BundleTool.minify_css(prelude, block))
+        return BundleTool._URL_PATTERN.sub(self._bundle_css_url, "".join(css))
+
+    def _bundle_css_url(self, match: re.Match) -> str:
+        url = next((value for value in match.groups() if value), "")
+        if not url.startswith("file:"):
+            return match.group(0)
+        parsed = urlparse(url)
+        path = Path(unquote(parsed.path))
+        if not path.is_file():
+            logging.warning(f"asset {path} used by the stylesheets does not exist")
+            return match.group(0)
+        fragment = f"#{parsed.fragment}" if parsed.fragment else ""
+        return f'url("{self._asset_url(path, inline=not fragment)}{fragment}")'
+
+    def _asset_url(self, path: Path, inline: bool = True) -> str:
+        """
+        Get the URL of an asset in the bundle, small SVG files are inlined as data URIs and other files are
+        copied to the assets folder of the bundle with a fingerprint in their name.
+        :param path: the path of the asset
+        :param inline: if False, the asset is never inlined
+        :return: the URL of the asset
+        """
+        if path not in self._asset_urls:
+            content = path.read_bytes()
+            if inline and path.suffix == ".svg" and len(content) <= BundleTool.INLINE_SVG_MAX_SIZE:
+                svg = " ".join(content.decode().split())
+                self._asset_urls[path] = "data:image/svg+xml," + quote(svg, safe=" =:/;,'()-._~!*@$&+")
+            else:
+                stem = BundleTool._FINGERPRINT_PATTERN.sub("", path.stem)
+                self._asset_urls[path] = self._write_fingerprinted(f"assets/{stem}{path.suffix}", content)
+        return self._asset_urls[path]
+
+    def _module_url(self, path: Path) -> str:
+        """
+        Get the URL of a module script in the bundle. The files and folders the module refers to with
+        new URL("<relative path>", import.meta.url), like its workers and vendored libraries, are bundled with it.
+        :param path: the path of the module script
+        :return: the URL of the module script
+        """
+        if path not in self._asset_urls:
+
+            def bundle_reference(match: re.Match) -> str:
+                reference = (path.parent / match.group(2)).resolve()
+                if reference.is_dir():
+                    # the files of a vendored library refer to each other by name, so they keep their names
+                    url = f"assets/{reference.name}"
+                    for file in sorted(reference.rglob("*")):
+                        if file.is_file():
+                            self._write(f"{url}/{file.relative_to(reference)}", file.read_bytes())
+                elif reference.suffix in (".js", ".mjs"):
+                    url = self._module_url(reference)
+                elif reference.is_file():
+                    url = self._asset_url(reference, inline=False)
+                else:
+                    logging.warning(f"asset {reference} used by {path} does not exist")
+                    return match.group(0)
+                # the module itself is in the assets folder of the bundle
+                relative_url = Path(url).relative_to("assets").as_posix() + ("/" if reference.is_dir() else "")
+                return f'new URL("./{relative_url}", import.meta.url)'
+
+            with open(path) as f:
+                source = f.read()
+            self._module_words.update(BundleTool._WORD_PATTERN.findall(source))
+            source = BundleTool._MODULE_URL_PATTERN.sub(bundle_reference, source)
+            stem = BundleTool._FINGERPRINT_PATTERN.sub("", path.stem)
+            self._asset_urls[path] = self._write_fingerprinted(f"assets/{stem}{path.suffix}", source.encode())
+        return self._asset_urls[path]
+
+    def _write_fingerprinted(self, name: str, content: bytes) -> str:
+        path = Path(name)
+        fingerprint = hashlib.sha256(content).hexdigest()[:8]
+        name = str(path.with_name(f"{path.stem}.{fingerprint}{path.suffix}"))
+        self._write(name, content)
+        return name
+
+    def _write(self, name: str, content: bytes) -> Path:
+        path = Path(self._output_dir, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        self._files.append(path)
+        if path.suffix in BundleTool.COMPRESSED_SUFFIXES:
+            for suffix, compressed in BundleTool._compress(content).items():
+                # a variant that is not smaller than the file is of no use to the host
+                if len(compressed) < len(content):
+                    compressed_path = path.with_name(path.name + suffix)
+                    compressed_path.write_bytes(compressed)
+                    self._files.append(compressed_path)
+        return path
+
+    def _finish(self) -> None:
+        """
+        Write the manifest of the bundle and remove the files of an earlier bundle that are no longer used.
+        :return: None
+        """
+        manifest_path = Path(self._output_dir, BundleTool.MANIFEST_FILENAME)
+        files = sorted(str(path.relative_to(self._output_dir)) for path in self._files)
+        if manifest_path.is_file():
+            with open(manifest_path) as f:
+                for name in set(json.load(f).get("files", [])) - set(files):
+                    Path(self._output_dir, name).unlink(missing_ok=True)
+        sizes = {name: Path(self._output_dir, name).stat().st_size for name in files}
+        with open(manifest_path, "w") as f:
+            json.dump({"files": files, "sizes": sizes}, f, indent=2)
+        logging.info(f"bundle {self._output_dir} has {len(files)} files of {sum(sizes.values())} bytes")
+
+    @staticmethod
+    def _compress(content: bytes) -> dict[str, bytes]:
+        variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(content, quality=11)
+        return variants
+
+    @staticmethod
+    def _local_path(url: str | None, base_dir: Path) -> Path | None:
+        """
+        Resolve the URL of an asset to a file, URLs of other hosts, absolute URLs and missing files are not local.
+        :param url: the URL
+        :param base_dir: Path to the folder relative URLs are resolved against
+        :return: the path of the file or None if the URL is not local
+        """
+        if not url or re.match(r"^(?:[a-z][\w+.-]*:|//|/|#)", url, re.IGNORECASE):
+            return None
+        path = (base_dir / unquote(url.split("#")[0].split("?")[0])).resolve()
+        if not path.is_file():
+            logging.warning(f"asset {path} used by the report does not exist")
+            return None
+        return path
+
+    @staticmethod
+    def _read_css(path: Path) -> str:
+        """
+        Read a stylesheet without comments and with the relative URLs in it resolved to file URIs, so the rules
+        of stylesheets in different folders can be combined.
+        :param path: the path of the stylesheet
+        :return: the stylesheet
+        """
+        with open(path) as f:
+            css = f.read()
+        css = re.sub(
+            r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|/\*.*?\*/""", lambda m: m.group(1) or "", css, flags=re.S
+        )
+
+        def resolve(match: re.Match) -> str:
+            url = next((value for value in match.groups() if value), "")
+            local_path = BundleTool._local_path(url, path.parent)
+            if local_path is None:
+                return match.group(0)
+            fragment = url.partition("#")[2]
+            return f'url("{local_path.as_uri()}{"#" + fragment if fragment else ""}")'
+
+        return BundleTool._URL_PATTERN.sub(resolve, css)
+
+    @staticmethod
+    def _parse_rules(css: str, index: int) -> tuple[list[CssRule], int]:
+        rules = []
+        start = index
+        while index < len(css):
+            character = css[index]
+            if character in "\"'":
+                index = BundleTool._string_end(css, index)
+                continue
+            if character == ";":
+                if css[start:index].strip():
+                    rules.append((css[start:index].strip(), None))
+            elif character == "{":
+                prelude = css[start:index].strip()
+                if prelude.lower().startswith(BundleTool.NESTED_AT_RULES):
+                    block, index = BundleTool._parse_rules(css, index + 1)
+                    rules.append((prelude, block))
+                    start = index
+                    continue
+                end = BundleTool._block_end(css, index + 1)
+                rules.append((prelude, css[index + 1 : end]))
+                index = end
+            elif character == "}":
+                return rules, index + 1
+            index += 1
+            if character in ";{}":
+                start = index
+        return rules, index
+
+    @staticmethod
+    def _string_end(css: str, index: int) -> int:
+        quote_character = css[index]
+        index += 1
+        while index < len(css) and css[index] != quote_character:
+            index += 2 if css[index] == "\\" else 1
+        return index + 1
+
+    @staticmethod
+    def _block_end(css: str, index: int) -> int:
+        depth = 1
+        while index < len(css):
+            if css[index] in "\"'":
+                index = BundleTool._string_end(css, index)
+                continue
+            if css[index] == "{":
+                depth += 1
+            elif css[index] == "}":
+                depth -= 1
+                if depth == 0:
+                    return index
+            index += 1
+        return index
+
+    @staticmethod
+    def _shake_selectors(rules: list[CssRule], used: dict[str, set[str]]) -> list[CssRule]:
+        shaken = []
+        for prelude, block in rules:
+            if isinstance(block, list):
+                block = BundleTool._shake_selectors(block, used)
+                if block:
+                    shaken.append((prelude, block))
+            elif prelude.startswith("@"):
+                # the charset of a bundled stylesheet is the charset of the report
+                if not prelude.lower().startswith("@charset"):
+                    shaken.append((prelude, block))
+            else:
+                selectors = [selector for selector in prelude.split(",") if BundleTool._matches(selector, used)]
+                if selectors:
+                    shaken.append((",".join(selectors), block))
+        return shaken
+
+    @staticmethod
+    def _shake_at_rules(rules: list[CssRule], words: set[str]) -> list[CssRule]:
+        shaken = []
+        for prelude, block in rules:
+            name = prelude.split()[0].lower() if prelude.startswith("@") else ""
+            if isinstance(block, list):
+                block = BundleTool._shake_at_rules(block, words)
+                if not block:
+                    continue
+            elif name == "@font-face":
+                family = re.search(r"font-family\s*:\s*([^;]+)", block or "")
+                if family and not set(BundleTool._WORD_PATTERN.findall(family.group(1))) <= words:
+                    continue
+            elif name.endswith("keyframes") and prelude.split()[-1].strip("\"'") not in words:
+                continue
+            shaken.append((prelude, block))
+        return shaken
+
+    @staticmethod
+    def _declarations(rules: list[CssRule]):
+        for prelude, block in rules:
+            if isinstance(block, list):
+                yield from BundleTool._declarations(block)
+            elif block is not None and not prelude.startswith("@"):
+                yield block
+
+    @staticmethod
+    def _matches(selector: str, used: dict[str, set[str]]) -> bool:
+        """
+        Check if a selector can match the report, which is the case if all its classes, ids and elements are
+        used. Attributes and pseudo-classes are ignored, so a selector is rather kept than removed.
+        :param selector: the selector
+        :param used: the classes, ids, elements and script words that are used
+        :return: True if the selector can match
+        """
+        selector = re.sub(r"\[[^\]]*\]", "", selector)
+        while re.search(r"\([^()]*\)", selector):
+            selector = re.sub(r"\([^()]*\)", "", selector)
+        selector = re.sub(r"::?[\w-]+", "", selector)
+        for prefix, name in re.findall(r"([.#]?)((?:[\w-]|\\.)+)", selector):
+            name = re.sub(r"\\(.)", r"\1", name)
+            match prefix:
+                case ".":
+                    found = name in used["classes"] or name in used["words"]
+                case "#":
+                    found = name in used["ids"] or name in used["words"]
+                case _:
+                    found = name.isdigit() or name.lower() in used["tags"] or name in used["words"]
+            if not found:
+                return False
+        return True
+
+
+class _SelectorCollector(HTMLParser):
+    """
+    Collects the elements, classes and ids of a report and the words in its scripts and event handlers.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.used: dict[str, set[str]] = {"tags": set(), "classes": set(), "ids": set(), "words": set()}
+        self._in_script = False
+
+    @staticmethod
+    def collect(html: str) -> dict[str, set[str]]:
+        collector = _SelectorCollector()
+        collector.feed(html)
+        return collector.used
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self.used["tags"].add(tag)
+        self._in_script = tag == "script"
+        for name, value in attrs:
+            if value is None:
+                continue
+            if name == "class":
+                self.used["classes"].update(value.split())
+            elif name == "id":
+                self.used["ids"].add(value)
+            elif name.startswith("on"):
+                self.used["words"].update(BundleTool._WORD_PATTERN.findall(value))
+
+    def handle_endtag(self, tag: str) -> None:
+        self._in_script = False
+
+    def handle_data(self, data: str) -> None:
+        if self._in_script:
+            self.used["words"].update(BundleTool._WORD_PATTERN.findall(data))
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class CacheTool:
+    """
+    The CacheTool class provides a content addressed cache for results on disk. Entries are keyed on a
+    fingerprint of the input files and the configuration, the least recently used entries are evicted
+    when the cache grows beyond its maximum size.
+    """
+
+    DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+    _BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, cache_dir: Path, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        """
+        :param cache_dir: Path to the directory containing the cache entries.
+        :param max_size: the maximum size of the cache in bytes.
+        :return: None
+        """
+        self._cache_dir = Path(cache_dir)
+        self._max_size = max_size
+
+    @staticmethod
+    def fingerprint(paths: list[str | Path], config: dict[str, Any]) -> str:
+        """
+        Create a key from the content of the given files and the configuration.
+        :param paths: the paths of the input files, can be relative
+        :param config: the configuration that influences the result, must be JSON serializable
+        :return: the key
+        """
+        digest = hashlib.sha256()
+        for path in paths:
+            with open((Path.cwd() / path).resolve(), "rb") as f:
+                while block := f.read(CacheTool._BLOCK_SIZE):
+                    digest.update(block)
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """
+        Get a cached result.
+        :param key: the key of the result
+        :return: the result or None if it is not in the cache
+        """
+        entry_path = self._entry_path(key)
+        if not entry_path.is_file():
+            logging.info(f"cache miss for {key}")
+            return None
+        with open(entry_path) as f:
+            result = json.load(f)
+        # touch the entry so eviction removes the least recently used entries first
+        os.utime(entry_path)
+        logging.info(f"cache hit for {key}")
+        return result
+
+    def put(self, key: str, result: dict[str, Any]) -> None:
+        """
+        Store a result in the cache and evict old entries if the cache is too large.
+        :param key: the key of the result
+        :param result: the result, must be JSON serializable
+        :return: None
+        """
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        entry_path = self._entry_path(key)
+        # write to a temporary file first so a concurrent reader never sees a partial entry
+        tmp_path = entry_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        tmp_path.replace(entry_path)
+        logging.info(f"cached result {key}")
+        self._evict()
+
+    def _entry_path(self, key: str) -> Path:
+        return self._cache_dir / f"{key}.json"
+
+    def _evict(self) -> None:
+        entries = [(entry, entry.stat()) for entry in self._cache_dir.glob("*.json")]
+        entries.sort(key=lambda e: e[1].st_mtime)
+        size = sum(stat.st_size for _, stat in entries)
+        for entry, stat in entries:
+            if size <= self._max_size:
+                break
+            entry.unlink(missing_ok=True)
+            size -= stat.st_size
+            logging.info(f"evicted {entry} from the cache")
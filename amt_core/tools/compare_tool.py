@@ -0,0 +1,210 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+import yaml
+from pandas import DataFrame
+
+from amt_core.loaders.data_loader import DataLoader
+from amt_core.loaders.model_loader import ModelLoader
+from amt_core.tools.instrumentation_tool import InstrumentationTool
+from amt_core.tools.shap_tool import ShapTool
+
+logger = logging.getLogger(__name__)
+
+
+class CompareTool:
+    """
+    The CompareTool class provides methods for comparing the feature importance of many models on the same data.
+    The data is loaded and summarized into a background once, and every model is explained against it, so the
+    cost of a comparison is mostly the cost of the explainers.
+    """
+
+    FILENAME = "comparison.yaml"
+
+    @staticmethod
+    def run_compare(args) -> None:
+        """
+        Explains every model on the data and writes one table of the mean absolute SHAP value of every feature
+        per model to the output directory. The table can be included in the tables of the measurements of a model
+        card, the report renders it next to the bar plots of the shap action. A failing model does not stop
+        the comparison, its values are empty.
+
+        The background is summarized from the data once and shared by all models, except for the stratified
+        method which stratifies on the predictions of every model.
+        :param args: the command line arguments
+        :return: None
+        :raises: TypeError: If a model name is given more than once.
+        """
+        start = time.perf_counter()
+        names = CompareTool.model_names(args.model)
+        # only the features of the models are loaded, a model without feature names uses all columns of the data
+        feature_names = []
+        models = {}
+        failed = {}
+        for model_path in args.model:
+            try:
+                models[model_path] = ModelLoader.load(model_path, mmap=args.mmap_model)
+            except Exception as e:
+                logger.exception(f"loading model {model_path} failed")
+                failed[model_path] = {"status": "failure", "error": f"{type(e).__name__}: {e}", "seconds": 0.0}
+                continue
+            model_features = getattr(models[model_path], "feature_names_in_", None)
+            if model_features is None:
+                feature_names = None
+            elif feature_names is not None:
+                feature_names += [feature for feature in model_features if feature not in feature_names]
+        dtypes = dict(args.dtypes) if args.dtypes else None
+        try:
+            data = DataLoader.load(args.data, None, feature_names, compact=args.compact, dtypes=dtypes)
+        except (KeyError, ValueError):
+            if feature_names is None:
+                raise
+            # the models that use the missing features fail when they are explained, the others are compared
+            logger.warning(f"{args.data} misses features of the models, all its columns are loaded")
+            data = DataLoader.load(args.data, None, None, compact=args.compact, dtypes=dtypes)
+
+        background = None
+        if args.background_method != ShapTool.BackgroundMethods.STRATIFIED:
+            background = ShapTool(
+                None, data, args.background_method, args.background_size, seed=args.seed
+            ).get_background(data)
+        options = {
+            "mmap_model": args.mmap_model,
+            "background_method": args.background_method,
+            "background_size": args.background_size,
+            "seed": args.seed,
+            "workers": args.workers,
+            "explainer": args.explainer,
+        }
+        logger.info(f"comparing {len(models)} models on {args.data} with concurrency {args.concurrency}")
+
+        if args.concurrency > 1 and len(models) > 1:
+            # the data and the background are sent to every process once, not with every model, and every model
+            # is loaded by the process that explains it
+            with ProcessPoolExecutor(
+                max_workers=args.concurrency,
+                **InstrumentationTool.worker_initializer(_init_worker, (data, background, options)),
+            ) as executor:
+                explained = dict(zip(models, executor.map(_explain_model, models)))
+        else:
+            _init_worker(data, background, options)
+            explained = {model_path: _explain_model(model_path, model) for model_path, model in models.items()}
+        explained |= failed
+
+        comparison = CompareTool.comparison_table(
+            names, args.model, [explained[model_path] for model_path in args.model], list(data.columns)
+        )
+        comparison["data"] = str(args.data)
+        comparison["background"] = {
+            "method": str(args.background_method),
+            "size": None if background is None else len(background),
+            "shared": background is not None,
+        }
+        Path(args.outputdir).mkdir(parents=True, exist_ok=True)
+        filepath = Path(args.outputdir, CompareTool.FILENAME)
+        with InstrumentationTool.span("yaml.write"), open(filepath, "w") as file:
+            yaml.safe_dump(comparison, file, sort_keys=False)
+        failures = sum(model["status"] == "failure" for model in comparison["models"])
+        logger.info(
+            f"compared {len(names)} models in {time.perf_counter() - start:.3f} seconds, {failures} failed,"
+            f" saved comparison to {filepath}"
+        )
+        print(f"Compared {len(names) - failures} of {len(names)} models, see {filepath}")
+
+    @staticmethod
+    def model_names(model_paths: list[str]) -> list[str]:
+        """
+        Name the models after their files, models with files of the same name are named after their parent
+        directory as well.
+        :param model_paths: the paths of the models
+        :return: the name of every model
+        :raises: TypeError: If a model is given more than once.
+        """
+        if len(set(map(str, model_paths))) != len(model_paths):
+            raise TypeError(f"every model can be compared once, got {model_paths}")
+        stems = [Path(path).stem for path in model_paths]
+        return [
+            stem if stems.count(stem) == 1 else f"{Path(path).parent.name}/{stem}"
+            for path, stem in zip(model_paths, stems)
+        ]
+
+    @staticmethod
+    def comparison_table(
+        names: list[str], model_paths: list[str], explained: list[dict[str, Any]], features: list[str]
+    ) -> dict[str, Any]:
+        """
+        Combine the results of the models into one table with a row per feature and a column per model.
+        :param names: the names of the models
+        :param model_paths: the paths of the models
+        :param explained: the outcome of every model, with its results if it succeeded
+        :param features: the features of the data, in the order of the rows of the table
+        :return: the table, the importances of a feature that a model does not use are None
+        """
+        models = []
+        importances = []
+        for name, model_path, outcome in zip(names, model_paths, explained):
+            model = {"name": name, "model": str(model_path)} | {
+                key: value for key, value in outcome.items() if key != "results"
+            }
+            models.append(model)
+            importances.append({result["name"]: result["value"] for result in outcome.get("results", [])})
+        return {
+            "type": "SHAP",
+            "name": "Mean Absolute Shap Values per Model",
+            "models": models,
+            "results": [
+                {"name": feature, "importances": [values.get(feature) for values in importances]}
+                for feature in features
+            ],
+        }
+
+
+# the data, the shared background and the options of a comparison, set once by _init_worker when a process starts
+_worker_data: DataFrame | None = None
+_worker_background: DataFrame | None = None
+_worker_options: dict[str, Any] = {}
+
+
+def _init_worker(data: DataFrame, background: DataFrame | None, options: dict[str, Any]) -> None:
+    global _worker_data, _worker_background, _worker_options
+    _worker_data = data
+    _worker_background = background
+    _worker_options = options
+
+
+def _explain_model(model_path: str, model=None) -> dict[str, Any]:
+    """
+    Explains one model of a comparison on the data of the process.
+    :param model_path: the path of the model
+    :param model: the model if it was loaded already, otherwise it is loaded from model_path
+    :return: the outcome of the model, with its results if it succeeded
+    """
+    start = time.perf_counter()
+    outcome = {}
+    try:
+        if model is None:
+            model = ModelLoader.load(model_path, mmap=_worker_options["mmap_model"])
+        features = list(getattr(model, "feature_names_in_", _worker_data.columns))
+        shap_tool = ShapTool(
+            model,
+            _worker_data[features],
+            _worker_options["background_method"],
+            _worker_options["background_size"],
+            seed=_worker_options["seed"],
+            workers=_worker_options["workers"],
+            explainer=_worker_options["explainer"],
+            model_path=model_path,
+        )
+        if _worker_background is not None:
+            shap_tool.background = _worker_background[features]
+        results = shap_tool.get_results()
+    except Exception as e:
+        logger.exception(f"explaining model {model_path} failed")
+        outcome.update({"status": "failure", "error": f"{type(e).__name__}: {e}"})
+    else:
+        outcome.update({"status": "success", "explainer": results["explainer"], "results": results["results"]})
+    outcome["seconds"] = round(time.perf_counter() - start, 3)
+    return outcome
@@ -0,0 +1,270 @@
+import csv
+import json
+import logging
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from enum import StrEnum
+from pathlib import Path
+from typing import Any
+
+import jsonschema
+import yaml
+
+from amt_core.tools.answer_store import AnswerStore
+from amt_core.tools.instrumentation_tool import InstrumentationTool
+
+logger = logging.getLogger(__name__)
+
+
+class ImportTool:
+    """
+    The ImportTool class provides methods for importing the answers of many systems to questionnaires without
+    the interactive questionnaire, for example answers migrated from another system.
+
+    An answer set holds the answers of one system to one questionnaire. JSON and YAML files contain a list of
+    answer sets of the form {"system": "s", "questionnaire": "q", "answers": [{"question": "q", "answer": "a"}]},
+    where the answers follow schemas/answers.json. CSV files have the columns system, questionnaire, question and
+    answer, with one answer per row; the choices of an answer to a CHOICEMULTIPLE question are separated by
+    MULTIPLE_SEPARATOR.
+    """
+
+    class SupportedExtensions(StrEnum):
+        CSV = ".csv"
+        JSON = ".json"
+        YAML = ".yaml"
+        YML = ".yml"
+
+        @classmethod
+        def list(cls):
+            return list(map(lambda c: c.value, cls))
+
+    MULTIPLE_SEPARATOR = "|"
+    ERRORS_FILENAME = "import_errors.yaml"
+    # the number of answer sets sent to a worker at a time
+    CHUNKSIZE = 64
+
+    @staticmethod
+    def run_import(args) -> None:
+        """
+        Validates the answer sets of the given files and stores the valid ones in the answer store of their
+        system, <outputdir>/<system>/answers.sqlite, and as a YAML file per questionnaire next to it. The errors
+        of all invalid answer sets are written to one report in the outputdir.
+        :param args: the command line arguments
+        :return: None
+        """
+        start = time.perf_counter()
+        answer_sets = ImportTool.load_answer_sets(args.answers)
+        questions_schema = Path.cwd() / "schemas/questions.json"
+        answers_schema = Path.cwd() / "schemas/answers.json"
+        logging.info(f"validating {len(answer_sets)} answer sets with {args.workers} worker(s)")
+
+        with InstrumentationTool.span("import.validate", answer_sets=len(answer_sets), workers=args.workers):
+            if args.workers > 1:
+                # every worker loads the questionnaires and compiles the schemas once
+                with ProcessPoolExecutor(
+                    max_workers=args.workers,
+                    **InstrumentationTool.worker_initializer(
+                        _init_worker, (args.inputdir, questions_schema, answers_schema)
+                    ),
+                ) as executor:
+                    validated = list(executor.map(_validate, answer_sets, chunksize=ImportTool.CHUNKSIZE))
+            else:
+                _init_worker(args.inputdir, questions_schema, answers_schema)
+                validated = [_validate(answer_set) for answer_set in answer_sets]
+
+        valid = defaultdict(dict)
+        report = []
+        for answer_set, (answer_set_errors, answers) in zip(answer_sets, validated):
+            if answer_set_errors:
+                report.append(
+                    {
+                        "source": answer_set["source"],
+                        "system": answer_set.get("system"),
+                        "questionnaire": answer_set.get("questionnaire"),
+                        "errors": answer_set_errors,
+                    }
+                )
+            else:
+                valid[answer_set["system"]][answer_set["questionnaire"]] = {
+                    answer["question"]: answer["answer"] for answer in answers
+                }
+
+        # the answers of a system are written in one transaction
+        for system, q_and_a_sources in valid.items():
+            system_dir = Path(args.outputdir, system)
+            system_dir.mkdir(parents=True, exist_ok=True)
+            with AnswerStore(Path(system_dir, AnswerStore.FILENAME)) as answer_store:
+                answer_store.import_answers(q_and_a_sources)
+                answer_store.export(system_dir, list(q_and_a_sources))
+
+        Path(args.outputdir).mkdir(parents=True, exist_ok=True)
+        errors_filepath = Path(args.outputdir, ImportTool.ERRORS_FILENAME)
+        with open(errors_filepath, "w") as file:
+            yaml.safe_dump(report, file, sort_keys=False, allow_unicode=True)
+        logging.info(
+            f"imported {len(answer_sets) - len(report)} of {len(answer_sets)} answer sets for {len(valid)} systems"
+            f" in {time.perf_counter() - start:.3f} seconds, saved errors to {errors_filepath}"
+        )
+        print(
+            f"Imported {len(answer_sets) - len(report)} of {len(answer_sets)} answer sets for {len(valid)} systems"
+            f" to {args.outputdir}, {len(report)} answer sets have errors, see {errors_filepath}"
+        )
+
+    @staticmethod
+    def load_answer_sets(path: Path) -> list[dict[str, Any]]:
+        """
+        Loads the answer sets of a file, or of every supported file in a directory. Every answer set gets the
+        source it was read from, for the error report.
+        :param path: Path to a CSV, JSON or YAML file or to a directory of them.
+        :return: the answer sets
+        :raises: TypeError: If a file is not supported or does not contain a list of answer sets.
+        """
+        path = Path(path)
+        if path.is_dir():
+            answer_sets = []
+            for filepath in sorted(path.iterdir()):
+                if filepath.suffix in ImportTool.SupportedExtensions.list():
+                    answer_sets += ImportTool.load_answer_sets(filepath)
+                else:
+                    logging.warning(f"ignoring unexpected file format '{filepath.suffix}'")
+            return answer_sets
+
+        match path.suffix:
+            case ImportTool.SupportedExtensions.CSV:
+                return ImportTool._load_csv(path)
+            case ImportTool.SupportedExtensions.JSON:
+                with open(path) as f:
+                    answer_sets = json.load(f)
+            case ImportTool.SupportedExtensions.YAML | ImportTool.SupportedExtensions.YML:
+                with open(path) as f:
+                    answer_sets = yaml.load(f, Loader=yaml.CSafeLoader if yaml.__with_libyaml__ else yaml.SafeLoader)
+            case _:
+                raise TypeError(
+                    f"Answers extension {path.suffix} is not supported,"
+                    f" supported types are {ImportTool.SupportedExtensions.list()}"
+                )
+        if not isinstance(answer_sets, list):
+            raise TypeError(f"{path} must contain a list of answer sets")
+        # an answer set that is not a mapping is kept as its answers, so the validation reports it
+        return [
+            {**answer_set, "source": f"{path}[{index}]"}
+            if isinstance(answer_set, dict)
+            else {"source": f"{path}[{index}]", "answers": answer_set}
+            for index, answer_set in enumerate(answer_sets)
+        ]
+
+    @staticmethod
+    def _load_csv(path: Path) -> list[dict[str, Any]]:
+        answer_sets: dict[tuple[str, str], dict[str, Any]] = {}
+        with open(path, newline="") as f:
+            reader = csv.DictReader(f)
+            missing = {"system", "questionnaire", "question", "answer"} - set(reader.fieldnames or [])
+            if missing:
+                raise TypeError(f"{path} misses the columns {sorted(missing)}")
+            for row in reader:
+                key = (row["system"], row["questionnaire"])
+                if key not in answer_sets:
+                    answer_sets[key] = {
+                        "system": row["system"],
+                        "questionnaire": row["questionnaire"],
+                        "answers": [],
+                        "source": f"{path}:{reader.line_num}",
+                    }
+                answer_sets[key]["answers"].append({"question": row["question"], "answer": row["answer"]})
+        return list(answer_sets.values())
+
+
+# the questionnaires and compiled validators of a worker process, set once by _init_worker when the process starts
+_worker_questionnaires: dict[str, dict[str, dict[str, Any]]] = {}
+_worker_answers_validator = None
+
+
+def _init_worker(question_dir: Path, questions_schema_path: Path, answers_schema_path: Path) -> None:
+    """
+    Loads the questionnaires and compiles the schemas and the validation regexes of the questions once.
+    :param question_dir: Path to a directory containing the questionnaires as json files.
+    :param questions_schema_path: Path to the schema of questionnaires.
+    :param answers_schema_path: Path to the schema of answers.
+    :return: None
+    """
+    global _worker_questionnaires, _worker_answers_validator
+    _worker_answers_validator = _compile_schema(answers_schema_path)
+    questions_validator = _compile_schema(questions_schema_path)
+
+    _worker_questionnaires = {}
+    for questionnaire_filepath in sorted(Path(question_dir).glob("*.json")):
+        with open(questionnaire_filepath) as f:
+            questionnaire = json.load(f)
+        if not questions_validator.is_valid(questionnaire):
+            logging.error(f"questionnaire {questionnaire_filepath} has invalid schema, its answers are rejected")
+            continue
+        questions = {}
+        for group in questionnaire["groups"]:
+            for question in group["questions"]:
+                question = dict(question)
+                if "validation" in question:
+                    question["validation"] = re.compile(question["validation"])
+                questions[question["question"]] = question
+        _worker_questionnaires[questionnaire_filepath.stem] = questions
+
+
+def _compile_schema(schema_path: Path):
+    with open(schema_path) as f:
+        schema = json.load(f)
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+def _validate(answer_set: dict[str, Any]) -> tuple[list[str], list[dict[str, Any]]]:
+    """
+    Validates an answer set against the answers schema and the questions of its questionnaire.
+    :param answer_set: the answer set
+    :return: a tuple of the errors, empty if the answer set is valid, and the answers with the choices of
+    CHOICEMULTIPLE questions as a list
+    """
+    answers = answer_set.get("answers")
+    errors = [f"{error.json_path}: {error.message}" for error in _worker_answers_validator.iter_errors(answers)]
+    system = answer_set.get("system")
+    if not isinstance(system, str) or not system or Path(system).name != system or system.startswith("."):
+        errors.append(f"system {system!r} must be a name that can be used as a directory name")
+    questions = _worker_questionnaires.get(answer_set.get("questionnaire"))
+    if questions is None:
+        errors.append(f"questionnaire {answer_set.get('questionnaire')!r} does not exist or has an invalid schema")
+    if errors:
+        return errors, answers
+
+    answers = [dict(answer) for answer in answers]
+    seen = set()
+    for index, answer in enumerate(answers):
+        question = questions.get(answer["question"])
+        value = answer["answer"]
+        if question is None:
+            errors.append(f"answers[{index}]: question {answer['question']!r} is not in the questionnaire")
+            continue
+        if answer["question"] in seen:
+            errors.append(f"answers[{index}]: question {answer['question']!r} is answered more than once")
+        seen.add(answer["question"])
+
+        match question["type"]:
+            case "CHOICEMULTIPLE":
+                if isinstance(value, str):
+                    # answers from CSV files are a string with the choices separated
+                    value = answer["answer"] = value.split(ImportTool.MULTIPLE_SEPARATOR) if value else []
+                invalid = [choice for choice in value if choice not in question.get("options", [])]
+                if invalid:
+                    errors.append(f"answers[{index}]: {invalid} are not options of {answer['question']!r}")
+            case "CHOICESINGLE":
+                if value not in question.get("options", []):
+                    errors.append(f"answers[{index}]: {value!r} is not an option of {answer['question']!r}")
+            case _:
+                if not isinstance(value, str):
+                    errors.append(f"answers[{index}]: the answer to {answer['question']!r} must be a string")
+                elif "validation" in question and not question["validation"].search(value):
+                    errors.append(
+                        f"answers[{index}]: {value!r} does not match {question['validation'].pattern!r}"
+                        f" of {answer['question']!r}"
+                    )
+    return errors, answers
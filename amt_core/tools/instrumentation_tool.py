@@ -0,0 +1,235 @@
+import cProfile
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, spans are recorded without the peak RSS there
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentationTool:
+    """
+    The InstrumentationTool class provides spans that measure the phases of a run. Once enabled, every span records
+    its wall time, CPU time and the peak RSS of the process, and is appended as a JSON line to logs/spans.jsonl.
+    Spans cost next to nothing while spans are not recorded. A span is used as a context manager or as a decorator:
+
+        with InstrumentationTool.span("data.load", path=path):
+            ...
+
+    With start_profile and stop_profile a run is profiled with cProfile and tracemalloc as well, and a summary
+    table of its spans is printed.
+    """
+
+    SPANS_FILENAME = "spans.jsonl"
+    # the number of lines of the tracemalloc dump
+    TRACEMALLOC_TOP = 50
+
+    _lock = threading.Lock()
+    # the names of the open spans of every thread, the last one is the parent of a new span
+    _open_spans = threading.local()
+    # maps the name of a span to its count, wall time, CPU time and highest peak RSS in this process
+    _summary: dict[str, list[float]] = {}
+    _profiler: cProfile.Profile | None = None
+    # the file the spans are appended to, None while spans are not recorded
+    _spans_file = None
+    # identifies the spans of one run, worker processes get it from worker_initializer
+    _run_id: str | None = None
+
+    @staticmethod
+    def enable(run_id: str | None = None) -> None:
+        """
+        Record the spans of this process in logs/spans.jsonl. The file is opened once, every span is one write of
+        a line.
+        :param run_id: the id of the run the spans belong to, defaults to the id of this run
+        :return: None
+        """
+        spans_path = Path(Path.cwd(), "logs", InstrumentationTool.SPANS_FILENAME)
+        with InstrumentationTool._lock:
+            if InstrumentationTool._spans_file is not None:
+                return
+            try:
+                spans_path.parent.mkdir(parents=True, exist_ok=True)
+                # line buffered in append mode, so processes writing spans at the same time do not interleave
+                # their lines
+                InstrumentationTool._spans_file = open(spans_path, "a", buffering=1)  # noqa: SIM115
+            except OSError:
+                logging.exception(f"could not open {spans_path}, spans are not recorded")
+                return
+            if run_id is not None:
+                InstrumentationTool._run_id = run_id
+
+    @staticmethod
+    def disable() -> None:
+        """
+        Stop recording the spans of this process.
+        :return: None
+        """
+        with InstrumentationTool._lock:
+            if InstrumentationTool._spans_file is not None:
+                InstrumentationTool._spans_file.close()
+                InstrumentationTool._spans_file = None
+
+    @staticmethod
+    def run_id() -> str:
+        """
+        :return: the id of this run, it is created on first use
+        """
+        if InstrumentationTool._run_id is None:
+            InstrumentationTool._run_id = uuid.uuid4().hex[:12]
+        return InstrumentationTool._run_id
+
+    @staticmethod
+    def worker_initializer(initializer: Callable | None = None, initargs: tuple = ()) -> dict[str, Any]:
+        """
+        The initializer of a process pool whose processes record their spans under this run, when this process
+        records spans:
+
+            ProcessPoolExecutor(max_workers=4, **InstrumentationTool.worker_initializer(_init_worker, (data,)))
+
+        :param initializer: the initializer of the processes of the pool, if any
+        :param initargs: the arguments of initializer
+        :return: the initializer and initargs arguments of the ProcessPoolExecutor
+        """
+        run_id = InstrumentationTool.run_id() if InstrumentationTool._spans_file is not None else None
+        return {"initializer": _init_worker, "initargs": (run_id, initializer, initargs)}
+
+    @staticmethod
+    @contextmanager
+    def span(name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+        """
+        Measure a phase of a run.
+        :param name: the name of the phase, for example "model.load"
+        :param attributes: attributes of the span, they must be JSON serializable
+        :return: the record of the span, attributes added to it while the span is open are recorded as well
+        """
+        if InstrumentationTool._spans_file is None:
+            yield {"name": name, **attributes}
+            return
+        if not hasattr(InstrumentationTool._open_spans, "stack"):
+            InstrumentationTool._open_spans.stack = []
+        stack = InstrumentationTool._open_spans.stack
+        record = {"name": name, "parent": stack[-1] if stack else None, **attributes}
+        stack.append(name)
+        start = time.time()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        start_rss = InstrumentationTool.peak_rss()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            stack.pop()
+            peak_rss = InstrumentationTool.peak_rss()
+            record.update(
+                start=start,
+                wall_s=round(time.perf_counter() - start_wall, 6),
+                cpu_s=round(time.process_time() - start_cpu, 6),
+                peak_rss_bytes=peak_rss,
+                # the growth of the peak RSS during the span, the memory this phase needed beyond earlier phases
+                peak_rss_growth_bytes=peak_rss - start_rss if peak_rss is not None else None,
+                run=InstrumentationTool.run_id(),
+                pid=os.getpid(),
+            )
+            InstrumentationTool._emit(record)
+
+    @staticmethod
+    def peak_rss() -> int | None:
+        """
+        :return: the peak resident set size of this process in bytes, None if it can not be measured
+        """
+        if resource is None:
+            return None
+        # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    @staticmethod
+    def start_profile() -> None:
+        """
+        Start profiling the run with cProfile and tracemalloc.
+        :return: None
+        """
+        tracemalloc.start()
+        InstrumentationTool._profiler = cProfile.Profile()
+        InstrumentationTool._profiler.enable()
+
+    @staticmethod
+    def stop_profile() -> None:
+        """
+        Stop profiling, write the cProfile and tracemalloc dumps to logs/ and print a summary table of the spans.
+        :return: None
+        """
+        profiler = InstrumentationTool._profiler
+        if profiler is None:
+            return
+        profiler.disable()
+        InstrumentationTool._profiler = None
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        log_directory = Path(Path.cwd(), "logs")
+        log_directory.mkdir(parents=True, exist_ok=True)
+        prefix = f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        profile_path = Path(log_directory, f"{prefix}.prof")
+        # the dump can be read with pstats or tools like snakeviz
+        profiler.dump_stats(profile_path)
+        tracemalloc_path = Path(log_directory, f"{prefix}.tracemalloc.txt")
+        with open(tracemalloc_path, "w") as f:
+            f.write(f"traced memory: {current} bytes, peak {peak} bytes\n")
+            for statistic in snapshot.statistics("lineno")[: InstrumentationTool.TRACEMALLOC_TOP]:
+                f.write(f"{statistic}\n")
+        logging.info(f"saved profile to {profile_path} and {tracemalloc_path}")
+
+        print(InstrumentationTool.summary())
+        print(f"Profile saved to {profile_path}, allocations to {tracemalloc_path}")
+
+    @staticmethod
+    def summary() -> str:
+        """
+        :return: a table of the spans of this process, with the count, wall time, CPU time and peak RSS per name
+        """
+        lines = [f"{'phase':<32} {'count':>6} {'wall s':>10} {'cpu s':>10} {'peak RSS MB':>12}"]
+        with InstrumentationTool._lock:
+            for name, (count, wall, cpu, peak_rss) in sorted(InstrumentationTool._summary.items()):
+                lines.append(f"{name:<32} {count:>6} {wall:>10.3f} {cpu:>10.3f} {peak_rss / 2**20:>12.1f}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _emit(record: dict[str, Any]) -> None:
+        line = json.dumps(record, default=str) + "\n"
+        with InstrumentationTool._lock:
+            summary = InstrumentationTool._summary.setdefault(record["name"], [0, 0.0, 0.0, 0])
+            summary[0] += 1
+            summary[1] += record["wall_s"]
+            summary[2] += record["cpu_s"]
+            summary[3] = max(summary[3], record["peak_rss_bytes"] or 0)
+            if InstrumentationTool._spans_file is None:
+                return
+            try:
+                InstrumentationTool._spans_file.write(line)
+            except OSError:
+                logging.exception(f"could not write span {record['name']}")
+
+
+def _init_worker(run_id: str | None, initializer: Callable | None, initargs: tuple) -> None:
+    # a forked process inherits the spans file of its parent, it records its spans in a file of its own or not at all
+    InstrumentationTool.disable()
+    if run_id is not None:
+        InstrumentationTool.enable(run_id)
+    if initializer is not None:
+        initializer(*initargs)
@@ -0,0 +1,58 @@
+from enum import StrEnum
+from pathlib import Path
+
+
+class ShapOptions:
+    """
+    The options of the SHAP explainers on the command line. They are kept apart from the ShapTool, so the command
+    line is parsed without importing shap, scikit-learn and pandas.
+    """
+
+    class BackgroundMethods(StrEnum):
+        FULL = "full"
+        RANDOM = "random"
+        STRATIFIED = "stratified"
+        KMEANS = "kmeans"
+
+        @classmethod
+        def list(cls):
+            return list(map(lambda c: c.value, cls))
+
+    class Explainers(StrEnum):
+        AUTO = "auto"
+        LINEAR = "linear"
+        TREE = "tree"
+        PERMUTATION = "permutation"
+
+        @classmethod
+        def list(cls):
+            return list(map(lambda c: c.value, cls))
+
+    DEFAULT_BACKGROUND_SIZE = 100
+
+
+class BenchmarkOptions:
+    """
+    The options of the benchmarks on the command line, kept apart from the BenchmarkTool for the same reason.
+    """
+
+    class Models(StrEnum):
+        LINEAR = "linear"
+        FOREST = "forest"
+        BOOSTING = "boosting"
+        MLP = "mlp"
+
+        @classmethod
+        def list(cls):
+            return list(map(lambda c: c.value, cls))
+
+    class Formats(StrEnum):
+        CSV = ".csv"
+        PARQUET = ".parquet"
+        NPY = ".npy"
+
+        @classmethod
+        def list(cls):
+            return list(map(lambda c: c.value, cls))
+
+    DEFAULT_HISTORY = Path("benchmarks", "history.jsonl")
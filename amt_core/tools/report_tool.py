@@ -1,12 +1,20 @@
+import functools
+import hashlib
+import json
 import logging
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any
 
 import jinja2
 import yaml
 import yaml_include
 
+from amt_core.tools.instrumentation_tool import InstrumentationTool
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,6 +23,22 @@ class ReportTool:
     The ReportTool class provides methods for generating a report from a system card.
     """
 
+    # use the C implementation of the YAML parser when PyYAML was built with libyaml
+    _BaseLoader = yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader
+
+    # maps the path of an included YAML file to its modification time, the hash of its content, the parsed content
+    # and the modification times of the files it includes, directly or through other included files
+    _include_cache: dict[str, tuple[int, str, Any, dict[str, int]]] = {}
+    _include_cache_lock = threading.Lock()
+    # the files included while an included file of this thread is parsed, one list per file being parsed
+    _include_stack = threading.local()
+
+    # the report template and the base template it extends
+    TEMPLATES = ("ui/reference.html", "ui/template.html")
+    _environment: jinja2.Environment | None = None
+    BUILD_STATE_FILENAME = ".report_build.json"
+
+    @InstrumentationTool.span("report.load")
     def __init__(self, system_card: Path) -> None:
         """
         Loads a syste card for rendering.
@@ -24,39 +48,205 @@ class ReportTool:
         system_card = system_card.resolve()
 
         # Add constructer so we can use the "!include" directive in yaml to load
-        # other yaml files directly into to the system_card.
+        # other yaml files directly into to the system_card. The constructor is added to a
+        # loader class of this card only, so the global yaml loaders are left untouched.
         base_dir = os.path.dirname(system_card)
-        yaml.add_constructor("!include", yaml_include.Constructor(base_dir=base_dir))
+        card_loader = type("CardLoader", (ReportTool._BaseLoader,), {})
+
+        # the files a report depends on, to decide if it has to be rendered again
+        self.dependencies: list[Path] = [system_card] + [
+            Path(Path.cwd(), template) for template in ReportTool.TEMPLATES
+        ]
+
+        def load_include(path: str, file, loader_type) -> Any:
+            parsed, includes = ReportTool._load_include(path, file, loader_type)
+            # the files included by a cached file are not loaded again, so they are recorded from the cache
+            self.dependencies += [Path(path)] + [Path(include) for include in includes]
+            return parsed
+
+        yaml.add_constructor(
+            "!include",
+            yaml_include.Constructor(base_dir=base_dir, custom_loader=load_include),
+            Loader=card_loader,
+        )
 
         with open(system_card) as f:
-            data = yaml.full_load(f)
+            data = yaml.load(f, Loader=card_loader)
 
         # Normalise model-index to model_index to avoid conflics resulting from usage of "-".
-        for model in data["models"]:
-            model["model_index"] = model.pop("model-index")
+        # Included models are shared through the include cache, so they are copied instead of changed.
+        data["models"] = [
+            {key: value for key, value in model.items() if key != "model-index"} | {"model_index": model["model-index"]}
+            for model in data["models"]
+        ]
 
         self.data = data
 
-    def render(self) -> None:
+    @staticmethod
+    def _load_include(path: str, file, loader_type) -> tuple[Any, list[str]]:
+        """
+        Parses an included YAML file, or takes it from the include cache if its modification time or
+        the hash of its content did not change and none of the files it includes changed. Cached content
+        is shared and must not be changed.
+        :param path: the path of the included file
+        :param file: the opened included file
+        :param loader_type: the YAML loader class
+        :return: a tuple of the parsed content and the paths of the files it includes
+        """
+        mtime = os.stat(path).st_mtime_ns
+        with ReportTool._include_cache_lock:
+            cached = ReportTool._include_cache.get(path)
+        if cached is not None and ReportTool._includes_changed(cached[3]):
+            cached = None
+        if cached is not None and cached[0] == mtime:
+            parsed, includes = cached[2], cached[3]
+        else:
+            content = file.read()
+            digest = hashlib.sha256(content if isinstance(content, bytes) else content.encode()).hexdigest()
+            if cached is not None and cached[1] == digest:
+                parsed, includes = cached[2], cached[3]
+            else:
+                logging.debug(f"parsing included file {path}")
+                if not hasattr(ReportTool._include_stack, "frames"):
+                    ReportTool._include_stack.frames = []
+                ReportTool._include_stack.frames.append({})
+                try:
+                    parsed = yaml.load(content, Loader=loader_type)
+                finally:
+                    includes = ReportTool._include_stack.frames.pop()
+            with ReportTool._include_cache_lock:
+                ReportTool._include_cache[path] = (mtime, digest, parsed, includes)
+        # the file and the files it includes are included by the file being parsed, if any
+        frames = getattr(ReportTool._include_stack, "frames", None)
+        if frames:
+            frames[-1].update(includes)
+            frames[-1][path] = mtime
+        return parsed, list(includes)
+
+    @staticmethod
+    def _includes_changed(includes: dict[str, int]) -> bool:
+        try:
+            return any(os.stat(path).st_mtime_ns != mtime for path, mtime in includes.items())
+        except FileNotFoundError:
+            return True
+
+    @InstrumentationTool.span("report.render")
+    def render(self, output_path: Path | None = None) -> None:
+        """
+        Emits a HTML report based on the system card which can be rendered.
+        :param output_path: Path to the HTML report, defaults to ui/output.html
+        :return: None
+        """
+
+        # ui/reference.html extends ui/template.html, so the report is rendered in one pass and written
+        # to the file while it is generated, without holding the whole report in memory.
+        reference_template = ReportTool._get_environment().get_template(ReportTool.TEMPLATES[0])
+
+        if output_path is None:
+            output_path = Path(Path.cwd(), "ui", "output.html")
+        with open(output_path, "w") as f:
+            f.writelines(reference_template.generate(self.data))
+
+    @staticmethod
+    def _get_environment() -> jinja2.Environment:
         """
-        Emits a HTML report ui/output.html based on the system card which can be rendered.
+        Get the Jinja2 environment of this process. Templates are compiled once per process and the
+        compiled templates are cached on disk, so later runs do not compile them again.
+        :return: the environment
+        """
+        if ReportTool._environment is None:
+            # Create an environment so we can use custom filters in our Jinja2 template,
+            # for example to transform timestamps to ISO 8601 datetimes.
+            bytecode_cache_dir = Path(Path.cwd(), ".cache", "jinja")
+            bytecode_cache_dir.mkdir(parents=True, exist_ok=True)
+            templateLoader = jinja2.FileSystemLoader(searchpath="./")
+            env = jinja2.Environment(
+                loader=templateLoader, bytecode_cache=jinja2.FileSystemBytecodeCache(str(bytecode_cache_dir))
+            )
+            env.filters["timestamp_to_iso8601"] = ReportTool._timestamp_to_iso8601
+            ReportTool._environment = env
+        return ReportTool._environment
+
+    @staticmethod
+    def build(cards_dir: Path, output_dir: Path, workers: int = 1, force: bool = False) -> None:
+        """
+        Renders a report for every system card in a directory to output_dir/<card name>.html. The files every
+        report depends on (the card, its included files and the templates) are recorded with the hash of
+        their content, so a later build only renders the reports of which a dependency changed.
+        :param cards_dir: Path to a directory containing system card YAML files.
+        :param output_dir: Path to the directory for the reports.
+        :param workers: the number of processes that render reports.
+        :param force: if True, all reports are rendered.
         :return: None
+        :raises: TypeError: If cards_dir is not a directory path.
+        :raises: Exception: The error of the first card that failed, after the other cards are rendered.
         """
+        if not cards_dir.is_dir():
+            logging.error(f"got invalid argument: {cards_dir} must be a directory")
+            raise TypeError(f"{cards_dir} must be a directory")
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+        state_path = Path(output_dir, ReportTool.BUILD_STATE_FILENAME)
+        state = {}
+        if state_path.is_file() and not force:
+            with open(state_path) as f:
+                state = json.load(f)
+
+        cards = sorted(path.resolve() for path in cards_dir.iterdir() if path.suffix in (".yaml", ".yml"))
+        outdated = []
+        for card in cards:
+            output_path = Path(output_dir, card.stem).with_suffix(".html")
+            dependencies = state.get(str(card), {}).get("dependencies")
+            if not output_path.is_file() or dependencies is None or ReportTool._changed(dependencies):
+                outdated.append((card, output_path))
+        logging.info(f"rendering {len(outdated)} of {len(cards)} reports from {cards_dir}")
 
-        # Create an environment so we can use custom filters in our Jinja2 template,
-        # for example to transform timestamps to ISO 8601 datetimes.
-        templateLoader = jinja2.FileSystemLoader(searchpath="./")
-        env = jinja2.Environment(loader=templateLoader)
-        env.filters["timestamp_to_iso8601"] = ReportTool._timestamp_to_iso8601
+        failures = []
 
-        reference_template = env.get_template("ui/reference.html")
-        reference_html_output = reference_template.render(self.data)
+        def record(card: Path, output_path: Path, render) -> None:
+            try:
+                dependencies = render()
+            except Exception as e:
+                logging.exception(f"rendering {card} failed")
+                failures.append(e)
+                # render it again on the next build
+                state.pop(str(card), None)
+            else:
+                state[str(card)] = {"output": str(output_path), "dependencies": dependencies}
 
-        template_template = env.get_template("ui/template.html")
-        template_html_output = template_template.render(content=reference_html_output)
+        if workers > 1 and len(outdated) > 1:
+            with ProcessPoolExecutor(max_workers=workers, **InstrumentationTool.worker_initializer()) as executor:
+                futures = [
+                    (card, output_path, executor.submit(_render_card, card, output_path))
+                    for card, output_path in outdated
+                ]
+                for card, output_path, future in futures:
+                    record(card, output_path, future.result)
+        else:
+            for card, output_path in outdated:
+                record(card, output_path, functools.partial(_render_card, card, output_path))
 
-        with open(Path(Path.cwd(), "ui", "output.html"), "w") as f:
-            f.write(template_html_output)
+        # forget cards that were removed from the directory, the state is saved before a failure is raised
+        state = {card: entry for card, entry in state.items() if Path(card) in cards}
+        with open(state_path, "w") as f:
+            json.dump(state, f, indent=2)
+        print(
+            f"Rendered {len(outdated) - len(failures)} of {len(cards)} reports to {output_dir}, {len(failures)} failed"
+        )
+        if failures:
+            raise failures[0]
+
+    @staticmethod
+    def _file_hash(path: Path | str) -> str | None:
+        try:
+            with open(path, "rb") as f:
+                return hashlib.file_digest(f, "sha256").hexdigest()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _changed(dependencies: dict[str, str]) -> bool:
+        return any(ReportTool._file_hash(path) != digest for path, digest in dependencies.items())
 
     @staticmethod
     def _timestamp_to_iso8601(timestamp: str) -> str:
@@ -71,3 +261,16 @@ class ReportTool:
         # isoformat() emits a +00:00 to designate UTC instead of "Z" as specified in ISO 8601.
         current_datetime = current_datetime.replace("+00:00", "Z")
         return current_datetime
+
+
+def _render_card(card: Path, output_path: Path) -> dict[str, str]:
+    """
+    Renders the report of one system card.
+    :param card: Path to the system card YAML file.
+    :param output_path: Path to the HTML report.
+    :return: the hash of the content of every file the report depends on
+    """
+    report_tool = ReportTool(card)
+    report_tool.render(output_path)
+    logging.info(f"rendered {card} to {output_path}")
+    return {str(path): ReportTool._file_hash(path) for path in dict.fromkeys(report_tool.dependencies)}
@@ -0,0 +1,248 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Any
+
+from pandas import DataFrame
+
+from amt_core.loaders.data_loader import DataLoader
+from amt_core.loaders.model_loader import ModelLoader
+from amt_core.tools.shap_tool import ShapTool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmModel:
+    model_path: Path
+    shap_tool: ShapTool
+    # explainers are not safe to use from more than one thread at a time
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ServeTool:
+    """
+    The ServeTool class provides a local HTTP service for SHAP explanations. Models, their background and
+    explainers are kept warm between requests, the least recently used models are evicted when more than
+    max_models are warm.
+
+    POST /explain takes a JSON object with the path of a model, the path of the data to explain or its
+    rows as a list of records, and optionally the path of the background data (defaults to the data)
+    and the options background_method, background_size, seed and explainer. It returns the results as
+    they are written by the shap action. GET /health returns the warm models and the number of jobs.
+    Rows need the path of the background or the data. Only files in the allowed directories are loaded.
+    """
+
+    def __init__(
+        self, concurrency: int = 1, queue_size: int = 16, max_models: int = 8, allowed_dirs: list[Path] | None = None
+    ) -> None:
+        """
+        :param concurrency: the number of jobs that run at the same time
+        :param queue_size: the number of jobs that can wait for a free slot, more jobs are rejected
+        :param max_models: the number of models that are kept warm
+        :param allowed_dirs: the directories models and data may be loaded from, defaults to the working directory
+        :return: None
+        """
+        self._allowed_dirs = [Path(path).resolve() for path in (allowed_dirs or [Path.cwd()])]
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="amt-job")
+        self._slots = threading.BoundedSemaphore(concurrency + queue_size)
+        self._max_models = max_models
+        self._warm_models: OrderedDict[tuple, WarmModel] = OrderedDict()
+        self._lock = threading.Lock()
+        self._jobs = 0
+
+    @staticmethod
+    def run_serve(args) -> None:
+        """
+        Serves SHAP explanations on a TCP port or a Unix socket until interrupted.
+        :param args: the command line arguments
+        :return: None
+        :raises: FileExistsError: If the path of the socket is taken by a file that is not a socket.
+        """
+        serve_tool = ServeTool(args.concurrency, args.queue_size, args.max_models, args.allowed_dirs)
+        handler = type("Handler", (_RequestHandler,), {"serve_tool": serve_tool})
+        if args.socket is not None:
+            if Path(args.socket).is_socket():
+                # left behind by an earlier service
+                Path(args.socket).unlink()
+            elif Path(args.socket).exists():
+                raise FileExistsError(f"{args.socket} exists and is not a socket")
+            server = _ThreadingUnixHTTPServer(str(args.socket), handler)
+            address = args.socket
+        else:
+            server = ThreadingHTTPServer((args.host, args.port), handler)
+            address = f"http://{args.host}:{args.port}"
+        logging.info(f"serving SHAP explanations on {address}")
+        print(f"Serving SHAP explanations on {address}, press CTRL+C to stop")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("user stopped the service")
+        finally:
+            server.server_close()
+            serve_tool.shutdown()
+
+    def submit(self, request: dict[str, Any]) -> dict[str, Any] | None:
+        """
+        Queue an explanation job and wait for its results.
+        :param request: the explanation request
+        :return: the results or None if the queue is full
+        """
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            with self._lock:
+                self._jobs += 1
+            return self._executor.submit(self.explain, request).result()
+        finally:
+            with self._lock:
+                self._jobs -= 1
+            self._slots.release()
+
+    def explain(self, request: dict[str, Any]) -> dict[str, Any]:
+        """
+        Explain the data of a request with a warm model.
+        :param request: the explanation request
+        :return: the results
+        :raises: KeyError: If the request misses a model or data.
+        :raises: TypeError: If the request has rows but no background or data.
+        :raises: PermissionError: If a path of the request is not in the allowed directories.
+        """
+        if "rows" in request and "data" not in request and "background" not in request:
+            # against themselves the values of a single row are all zero
+            raise TypeError("rows are explained against a background, give the path of the background or the data")
+
+        warm_model = self._get_warm_model(request)
+        if "rows" in request:
+            data = DataFrame.from_records(request["rows"], columns=warm_model.shap_tool.feature_names)
+        else:
+            data = DataLoader.load(str(self.resolve(request["data"])), columns=warm_model.shap_tool.feature_names)
+        with warm_model.lock:
+            return warm_model.shap_tool.get_results(data)
+
+    def resolve(self, path: str) -> Path:
+        """
+        Resolve a path of a request.
+        :param path: the path, can be relative to the working directory
+        :return: the resolved path
+        :raises: PermissionError: If the path is not in the allowed directories.
+        """
+        if not isinstance(path, str):
+            raise TypeError(f"paths must be strings, got {path!r}")
+        resolved_path = (Path.cwd() / path).resolve()
+        if not any(resolved_path.is_relative_to(allowed_dir) for allowed_dir in self._allowed_dirs):
+            raise PermissionError(f"{path} is not in the allowed directories")
+        return resolved_path
+
+    @staticmethod
+    def _options(request: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "background_method": request.get("background_method", ShapTool.BackgroundMethods.FULL),
+            "background_size": request.get("background_size", ShapTool.DEFAULT_BACKGROUND_SIZE),
+            "seed": request.get("seed", 0),
+            "explainer": request.get("explainer", ShapTool.Explainers.AUTO),
+        }
+
+    def health(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "status": "ok",
+                "jobs": self._jobs,
+                "models": [str(warm_model.model_path) for warm_model in self._warm_models.values()],
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+    def _get_warm_model(self, request: dict[str, Any]) -> WarmModel:
+        """
+        Get the warm model of a request, or load it and evict the least recently used model.
+        :param request: the explanation request
+        :return: the warm model
+        """
+        model_path = self.resolve(request["model"])
+        background_path = self.resolve(request["background"] if "background" in request else request["data"])
+        options = ServeTool._options(request)
+        key = (
+            model_path,
+            model_path.stat().st_mtime_ns,
+            background_path,
+            background_path.stat().st_mtime_ns,
+            *options.values(),
+        )
+        with self._lock:
+            if key in self._warm_models:
+                self._warm_models.move_to_end(key)
+                return self._warm_models[key]
+
+        # load outside the lock, so jobs for warm models are not blocked by a cold start
+        model = ModelLoader.load(str(model_path))
+        background = DataLoader.load(str(background_path), columns=getattr(model, "feature_names_in_", None))
+        warm_model = WarmModel(model_path, ShapTool(model, background, **options))
+        with self._lock:
+            warm_model = self._warm_models.setdefault(key, warm_model)
+            self._warm_models.move_to_end(key)
+            while len(self._warm_models) > self._max_models:
+                _, evicted = self._warm_models.popitem(last=False)
+                if all(other.model_path != evicted.model_path for other in self._warm_models.values()):
+                    ModelLoader.unload(str(evicted.model_path))
+                logging.info(f"evicted model {evicted.model_path}")
+        return warm_model
+
+
+class _ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    serve_tool: ServeTool
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self._send(HTTPStatus.OK, self.serve_tool.health())
+        else:
+            self._send(HTTPStatus.NOT_FOUND, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self) -> None:
+        if self.path != "/explain":
+            self._send(HTTPStatus.NOT_FOUND, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            results = self.serve_tool.submit(request)
+        except PermissionError as e:
+            logging.warning(f"rejected explanation request: {e}")
+            self._send(HTTPStatus.FORBIDDEN, {"error": f"{type(e).__name__}: {e}"})
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError, FileNotFoundError) as e:
+            logging.exception("invalid explanation request")
+            self._send(HTTPStatus.BAD_REQUEST, {"error": f"{type(e).__name__}: {e}"})
+        except Exception as e:
+            logging.exception("explanation request failed")
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"})
+        else:
+            if results is None:
+                self._send(HTTPStatus.SERVICE_UNAVAILABLE, {"error": "too many jobs, try again later"})
+            else:
+                self._send(HTTPStatus.OK, results)
+
+    def _send(self, status: HTTPStatus, body: dict[str, Any]) -> None:
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def address_string(self) -> str:
+        # the client address of a Unix socket is not a (host, port) tuple
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logging.info(f"{self.address_string()} {format % args}")
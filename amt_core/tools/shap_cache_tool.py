@@ -0,0 +1,91 @@
+import logging
+from importlib import metadata
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+from amt_core.tools.cache_tool import CacheTool
+from amt_core.tools.instrumentation_tool import InstrumentationTool
+
+logger = logging.getLogger(__name__)
+
+
+class ShapCacheTool:
+    """
+    The ShapCacheTool class finds and saves the results of the shap action. It does not import shap, scikit-learn
+    or pandas, so a cached result is saved before the libraries needed to compute it are imported.
+    """
+
+    # bump when the layout of the results changes, so results cached by an older version are not used
+    RESULTS_VERSION = 4
+
+    @staticmethod
+    def versions() -> dict[str, str]:
+        """
+        :return: the versions of the libraries the results depend on, read without importing them
+        """
+        return {"shap": metadata.version("shap"), "sklearn": metadata.version("scikit-learn")}
+
+    @staticmethod
+    def lookup(args) -> tuple[CacheTool | None, str | None, dict[str, Any] | None]:
+        """
+        Find the results of the shap action for the command line arguments in the cache. The results are keyed on
+        the fingerprint of the model, the data and the configuration. Results with attributions are only found
+        when the attributions they index are in the output directory. Incremental runs and results under a time
+        budget, which depend on the speed of the machine, are not cached.
+        :param args: the command line arguments
+        :return: a tuple of the cache and the key of the results, None if the results are not cached, and the
+        results, None unless they were found
+        """
+        if args.no_cache or args.incremental or args.time_budget is not None:
+            return None, None, None
+        cache = CacheTool(args.cachedir, args.cache_size * 1024 * 1024)
+        config = {
+            "results_version": ShapCacheTool.RESULTS_VERSION,
+            **ShapCacheTool.versions(),
+            "explainer": args.explainer,
+            "background_method": args.background_method,
+            "background_size": args.background_size,
+            "seed": args.seed,
+            "chunksize": args.chunksize,
+            "compact": args.compact,
+            "dtypes": args.dtypes,
+            "attributions": not args.no_attributions,
+            "tolerance": args.tolerance,
+        }
+        key = CacheTool.fingerprint([args.model, args.data], config)
+        if args.refresh:
+            return cache, key, None
+        results = cache.get(key)
+        # the cache only holds the summary, the attributions it indexes must be in the output directory
+        if results is not None and "attributions" in results and not ShapCacheTool.has_attributions(key, args):
+            logger.info(f"the attributions of cached results {key} are not in {args.outputdir}")
+            results = None
+        return cache, key, results
+
+    @staticmethod
+    def has_attributions(key: str, args) -> bool:
+        """
+        :param key: the fingerprint of the results
+        :param args: the command line arguments
+        :return: True if the output directory has the summary and the attributions of the results
+        """
+        summary_path = Path(args.outputdir, "shap.yaml")
+        if not summary_path.is_file():
+            return False
+        with open(summary_path) as f:
+            attributions = (yaml.safe_load(f) or {}).get("attributions") or {}
+        return attributions.get("fingerprint") == key and all(
+            Path(args.outputdir, attributions[name]).is_file() for name in ("values", "base_values")
+        )
+
+    @staticmethod
+    @InstrumentationTool.span("yaml.write")
+    def save_results(shap_data: dict, output_dir) -> None:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        file_basename = "shap"
+        output_filepath = Path(output_dir, file_basename).with_suffix(".yaml")
+        with open(output_filepath, "w") as file:
+            yaml.safe_dump(shap_data, file, sort_keys=False)
+        logging.info(f"saved shap results to {output_filepath}")
@@ -1,11 +1,43 @@
+import functools
+import hashlib
+import itertools
+import json
 import logging
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 from typing import Any
 
+import joblib
+import numpy as np
+import pandas as pd
 import shap
-import yaml
 from pandas import DataFrame
-from pandas.io.parsers import TextFileReader
+from sklearn.cluster import KMeans
+from sklearn.ensemble import (
+    ExtraTreesClassifier,
+    ExtraTreesRegressor,
+    GradientBoostingClassifier,
+    GradientBoostingRegressor,
+    HistGradientBoostingClassifier,
+    HistGradientBoostingRegressor,
+    RandomForestClassifier,
+    RandomForestRegressor,
+)
+from sklearn.tree import BaseDecisionTree
+
+from amt_core.loaders.data_loader import DataLoader
+from amt_core.loaders.model_loader import ModelLoader
+from amt_core.tools.attribution_store import AttributionStore
+from amt_core.tools.cache_tool import CacheTool
+from amt_core.tools.instrumentation_tool import InstrumentationTool
+from amt_core.tools.options import ShapOptions
+from amt_core.tools.shap_cache_tool import ShapCacheTool
 
 logger = logging.getLogger(__name__)
 
@@ -15,51 +47,808 @@ class ShapTool:
     The ShapTool class specifies methods for use of the SHAP library
     """
 
+    BackgroundMethods = ShapOptions.BackgroundMethods
+    Explainers = ShapOptions.Explainers
+
+    TREE_MODELS = (
+        BaseDecisionTree,
+        RandomForestClassifier,
+        RandomForestRegressor,
+        ExtraTreesClassifier,
+        ExtraTreesRegressor,
+        GradientBoostingClassifier,
+        GradientBoostingRegressor,
+        HistGradientBoostingClassifier,
+        HistGradientBoostingRegressor,
+    )
+
+    DEFAULT_BACKGROUND_SIZE = ShapOptions.DEFAULT_BACKGROUND_SIZE
+    # the quantiles continuous predictions are binned into by the stratified background method
+    STRATIFIED_BINS = 10
+    RESULTS_VERSION = ShapCacheTool.RESULTS_VERSION
+    # a chunk is split in at least SHARDS_PER_CHUNK shards of at most SHARD_SIZE rows, so small data is spread over
+    # the workers as well. The shards only depend on the data, not on the number of workers
+    SHARD_SIZE = 1000
+    SHARDS_PER_CHUNK = 16
+    # the sufficient statistics and the background of incremental runs, next to the results
+    STATE_FILENAME = "shap_state.json"
+    BACKGROUND_FILENAME = "shap_background.sav"
+    # the rows explained in the first round of an approximation, every later round explains twice as many rows
+    APPROXIMATE_FIRST_ROUND = 2
+    # the rows needed before the confidence intervals of an approximation are trusted to stop it
+    APPROXIMATE_MIN_ROWS = 64
+    # the permutations per row of the permutation explainer in an approximation, the noise they add to the
+    # values of a row is part of the spread between rows the confidence intervals are computed from
+    APPROXIMATE_PERMUTATIONS = 5
+    # the confidence level of the intervals of an approximation and its z-score
+    CONFIDENCE = 0.95
+    CONFIDENCE_Z = 1.959964
+
     _model = None
-    _data: DataFrame | TextFileReader
+    _data: DataFrame | Iterable[DataFrame]
     _labels = None
     _results = {"results": [0]}
 
-    def __init__(self, model, data: DataFrame | TextFileReader):
+    def __init__(
+        self,
+        model,
+        data: DataFrame | Iterable[DataFrame],
+        background_method: BackgroundMethods = BackgroundMethods.FULL,
+        background_size: int = DEFAULT_BACKGROUND_SIZE,
+        seed: int = 0,
+        workers: int = 1,
+        explainer: Explainers = Explainers.AUTO,
+        model_path: str | None = None,
+    ):
+        """
+        :param model_path: the path the model was loaded from, if given the worker processes load the model with
+        memory mapping instead of getting a copy of it, so they share the pages of its arrays
+        """
         self._model = model
+        self._model_path = model_path
         self._data = data
-        self._labels = self._data.columns
+        self._labels = self._data.columns if isinstance(self._data, DataFrame) else None
+        self._background_method = ShapTool.BackgroundMethods(background_method)
+        self._background_size = background_size
+        self._seed = seed
+        self._workers = workers
+        self._explainer = ShapTool.Explainers(explainer)
+        # the background and the explainer are built on first use and reused by later calls to get_results
+        self._background: DataFrame | None = None
+        self._explainer_instance = None
+        # the sufficient statistics of the rows explained by the last call to get_results
+        self.statistics: dict[str, Any] | None = None
+
+    @property
+    def background(self) -> DataFrame | None:
+        """
+        The background of the explainer, None until it is summarized from the data. It can be set to explain
+        data against the background of an earlier run.
+        """
+        return self._background
+
+    @background.setter
+    def background(self, background: DataFrame) -> None:
+        self._background = background
+        self._explainer_instance = None
+
+    @property
+    def feature_names(self) -> list[str] | None:
+        """
+        The names of the features of the data, None if the data is streamed.
+        """
+        return None if self._labels is None else list(self._labels)
+
+    @staticmethod
+    def run_shap(args, lookup: tuple[CacheTool | None, str | None, dict[str, Any] | None] | None = None) -> None:
+        """
+        Explain the model on the data given on the command line and save the results to the output
+        directory, with the attributions of every row unless --no-attributions is given. With --time-budget or
+        --tolerance a sample of the rows is explained instead, see get_approximate_results. Results are cached
+        on the fingerprint of the model, the data and the configuration, so an unchanged model and dataset
+        are not explained again, see ShapCacheTool.lookup. With --incremental only the rows appended since the
+        last run are explained, see run_incremental.
+        :param args: the command line arguments
+        :param lookup: the outcome of ShapCacheTool.lookup for the arguments, if the cache was searched already
+        :return: None
+        :raises: TypeError: If --incremental is combined with --time-budget or --tolerance.
+        """
+        approximate = args.time_budget is not None or args.tolerance is not None
+        if args.incremental:
+            if approximate:
+                raise TypeError("--incremental explains every row, it can not be combined with an approximation")
+            ShapTool.run_incremental(args)
+            return
+        cache, key, shap_values = ShapCacheTool.lookup(args) if lookup is None else lookup
+
+        if shap_values is None:
+            model = ModelLoader.load(args.model, mmap=args.mmap_model)
+            # only load the features the model was fitted on, when the model knows them
+            data = DataLoader.load(
+                args.data,
+                args.chunksize,
+                getattr(model, "feature_names_in_", None),
+                compact=args.compact,
+                dtypes=dict(args.dtypes) if args.dtypes else None,
+            )
+            shap_tool = ShapTool(
+                model,
+                data,
+                args.background_method,
+                args.background_size,
+                seed=args.seed,
+                workers=args.workers,
+                explainer=args.explainer,
+                model_path=args.model,
+            )
+            if approximate:
+                # the attributions of a sample of the rows are not written, the summary is the result
+                shap_values = shap_tool.get_approximate_results(args.time_budget, args.tolerance)
+            else:
+                shap_values = shap_tool.get_results(attributions_dir=None if args.no_attributions else args.outputdir)
+            if cache is not None:
+                if "attributions" in shap_values:
+                    shap_values["attributions"]["fingerprint"] = key
+                cache.put(key, shap_values)
+        ShapTool.save_results(shap_values, args.outputdir)
+
+    @staticmethod
+    def run_incremental(args) -> None:
+        """
+        Explain only the rows appended to the data since the last incremental run with the same model and
+        configuration, and save the results to the output directory. The sufficient statistics of the explained
+        rows are kept in STATE_FILENAME next to the results: the number of rows, the sums of their absolute SHAP
+        values per feature and a fingerprint of the model, the configuration and the rows. The background of the
+        first run is kept in BACKGROUND_FILENAME, so the values of earlier rows stay valid. The attributions of
+        the new rows are appended to those of the earlier rows.
+
+        All rows are explained again when the model or the configuration changed, when one of the earlier rows
+        changed or was removed, or when the state, the background or the attributions are missing.
+        :param args: the command line arguments
+        :return: None
+        """
+        state_path = Path(args.outputdir, ShapTool.STATE_FILENAME)
+        background_path = Path(args.outputdir, ShapTool.BACKGROUND_FILENAME)
+        config = {
+            "results_version": ShapTool.RESULTS_VERSION,
+            **ShapCacheTool.versions(),
+            "model": CacheTool.fingerprint([args.model], {}),
+            "explainer": args.explainer,
+            "background_method": args.background_method,
+            "background_size": args.background_size,
+            "seed": args.seed,
+            "compact": args.compact,
+            "dtypes": args.dtypes,
+            "attributions": not args.no_attributions,
+        }
+        # compare the configuration as it is read back from the state
+        config = json.loads(json.dumps(config))
+        state = None
+        if state_path.is_file():
+            with open(state_path) as f:
+                state = json.load(f)
+
+        model = ModelLoader.load(args.model, mmap=args.mmap_model)
+
+        def load_data() -> DataFrame | Iterable[DataFrame]:
+            return DataLoader.load(
+                args.data,
+                args.chunksize,
+                getattr(model, "feature_names_in_", None),
+                compact=args.compact,
+                dtypes=dict(args.dtypes) if args.dtypes else None,
+            )
+
+        shap_tool = ShapTool(
+            model,
+            load_data(),
+            args.background_method,
+            args.background_size,
+            seed=args.seed,
+            workers=args.workers,
+            explainer=args.explainer,
+            model_path=args.model,
+        )
+        digest = hashlib.sha256()
+        new_chunks = None
+        if state is None:
+            logging.info(f"no state in {state_path}, explaining all rows")
+        elif state["config"] != config:
+            logging.info("the model or the configuration changed since the last run, explaining all rows")
+        elif not background_path.is_file():
+            logging.info(f"the background {background_path} is missing, explaining all rows")
+        elif not args.no_attributions and AttributionStore.rows(args.outputdir) != state["rows"]:
+            logging.info(f"the attributions in {args.outputdir} do not match the state, explaining all rows")
+        else:
+            new_chunks = ShapTool._skip_rows(shap_tool._data, state["rows"], state["rows_fingerprint"], digest)
+            if new_chunks is None:
+                logging.info(f"the first {state['rows']} rows changed since the last run, explaining all rows")
+
+        attributions_dir = None if args.no_attributions else args.outputdir
+        if new_chunks is not None:
+            shap_tool.background = joblib.load(background_path)
+            shap_values = shap_tool.get_results(
+                ShapTool._hash_rows(new_chunks, digest), attributions_dir, previous=state["statistics"]
+            )
+            explained = shap_values["rows"] - state["rows"]
+        else:
+            digest = hashlib.sha256()
+            # streamed data was read while the rows were compared, so it is read again
+            data = shap_tool._data if state is None or isinstance(shap_tool._data, DataFrame) else load_data()
+            shap_tool = ShapTool(
+                model,
+                ShapTool._hash_rows(data, digest),
+                args.background_method,
+                args.background_size,
+                seed=args.seed,
+                workers=args.workers,
+                explainer=args.explainer,
+                model_path=args.model,
+            )
+            shap_values = shap_tool.get_results(attributions_dir=attributions_dir)
+            joblib.dump(shap_tool.background, background_path)
+            explained = shap_values["rows"]
+        shap_values["incremental"] = {"explained": explained, "reused": shap_values["rows"] - explained}
+        ShapTool.save_results(shap_values, args.outputdir)
+
+        # the state is written last, so results that were not saved completely are never taken as a starting point
+        state = {
+            "config": config,
+            "rows": shap_values["rows"],
+            "rows_fingerprint": digest.hexdigest(),
+            "statistics": shap_tool.statistics,
+        }
+        tmp_path = state_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        tmp_path.replace(state_path)
+        logging.info(f"explained {explained} new rows and reused {shap_values['rows'] - explained} earlier rows")
+
+    @staticmethod
+    def _skip_rows(
+        data: DataFrame | Iterable[DataFrame], rows: int, fingerprint: str, digest
+    ) -> Iterator[DataFrame] | None:
+        """
+        Skip the rows explained by an earlier run, if they did not change.
+        :param data: the data
+        :param rows: the number of rows explained by the earlier run
+        :param fingerprint: the fingerprint of the rows explained by the earlier run
+        :param digest: the hash the skipped rows are added to
+        :return: the chunks of the rows after the skipped rows, None if the skipped rows changed
+        """
+        chunks = iter([data]) if isinstance(data, DataFrame) else iter(data)
+        remaining = rows
+        rest = None
+        for chunk in chunks:
+            skipped = chunk.iloc[:remaining]
+            ShapTool._update_digest(digest, skipped)
+            remaining -= len(skipped)
+            if remaining == 0:
+                rest = chunk.iloc[len(skipped) :]
+                break
+        if remaining > 0 or digest.hexdigest() != fingerprint:
+            return None
+        return itertools.chain([rest], chunks)
+
+    @staticmethod
+    def _hash_rows(chunks: DataFrame | Iterable[DataFrame], digest) -> Iterator[DataFrame]:
+        """
+        Pass the chunks of data on while their rows are added to a hash.
+        :param chunks: the data
+        :param digest: the hash
+        :return: the chunks
+        """
+        for chunk in [chunks] if isinstance(chunks, DataFrame) else chunks:
+            ShapTool._update_digest(digest, chunk)
+            yield chunk
+
+    @staticmethod
+    def _update_digest(digest, rows: DataFrame) -> None:
+        # hash the values as the model sees them, so the dtypes a chunk of a CSV file gets do not matter
+        try:
+            values = np.ascontiguousarray(rows.to_numpy(dtype=np.float64))
+        except (TypeError, ValueError):
+            values = pd.util.hash_pandas_object(rows, index=False).to_numpy()
+        digest.update(values.tobytes())
+
+    @staticmethod
+    def save_results(shap_data: dict, output_dir) -> None:
+        ShapCacheTool.save_results(shap_data, output_dir)
+
+    @InstrumentationTool.span("shap.background")
+    def get_background(self, data: DataFrame) -> DataFrame:
+        """
+        Summarize the data into the background set used by the masker of the explainer. The cost of
+        sampling based explainers grows with the size of the background, so a small representative
+        summary is usually much faster than the full data.
+        :param data: the data to summarize
+        :return: the background data
+        """
+        if self._background_method == ShapTool.BackgroundMethods.FULL or len(data) <= self._background_size:
+            return data
+
+        match self._background_method:
+            case ShapTool.BackgroundMethods.RANDOM:
+                background = data.sample(n=self._background_size, random_state=self._seed)
+            case ShapTool.BackgroundMethods.STRATIFIED:
+                # stratify on the predictions of the model, so every predicted class keeps its share
+                rng = np.random.default_rng(self._seed)
+                strata = ShapTool.prediction_strata(self._model.predict(data), self._background_size)
+                indices = list(strata.groupby(strata).indices.values())
+                sizes = ShapTool.allocate(np.array([len(stratum) for stratum in indices]), self._background_size)
+                positions = [rng.choice(stratum, size=size, replace=False) for stratum, size in zip(indices, sizes)]
+                background = data.iloc[np.sort(np.concatenate(positions))]
+            case ShapTool.BackgroundMethods.KMEANS:
+                kmeans = KMeans(n_clusters=self._background_size, random_state=self._seed, n_init="auto").fit(data)
+                background = DataFrame(kmeans.cluster_centers_, columns=data.columns)
+            case _:
+                raise TypeError(
+                    f"Background method {self._background_method} is not supported,"
+                    f" supported methods are {ShapTool.BackgroundMethods}"
+                )
+        return background
+
+    @staticmethod
+    def prediction_strata(predictions, background_size: int) -> pd.Series:
+        """
+        Group rows on the predictions of a model. Continuous predictions, like those of a regressor, or more
+        classes than rows in the background are binned into STRATIFIED_BINS quantiles of the predictions.
+        :param predictions: the prediction of every row
+        :param background_size: the number of rows in the background
+        :return: the stratum of every row
+        """
+        strata = pd.Series(np.asarray(predictions))
+        if strata.nunique() > background_size:
+            if not pd.api.types.is_numeric_dtype(strata):
+                strata = pd.Series(pd.factorize(strata, sort=True)[0])
+            # ranks are unique, so the bins have the same size even when many rows have the same prediction
+            bins = min(ShapTool.STRATIFIED_BINS, background_size)
+            strata = pd.Series(pd.qcut(strata.rank(method="first"), q=bins, labels=False))
+        return strata
+
+    @staticmethod
+    def allocate(sizes: np.ndarray, total: int) -> np.ndarray:
+        """
+        Split a number of rows over strata in proportion to their sizes, every stratum gets at least one row.
+        :param sizes: the number of rows of every stratum
+        :param total: the number of rows to split, at least the number of strata and at most the sum of the sizes
+        :return: the number of rows of every stratum, they add up to total
+        """
+        # one row per stratum, the rest in proportion to the other rows, the rows that do not divide evenly go to
+        # the strata with the largest remainders
+        quotas = (sizes - 1) * (total - len(sizes)) / max(1, (sizes - 1).sum())
+        allocation = np.floor(quotas).astype(int)
+        remainders = np.argsort(allocation - quotas, kind="stable")[: total - len(sizes) - allocation.sum()]
+        allocation[remainders] += 1
+        return allocation + 1
+
+    @staticmethod
+    def select_explainer(model) -> Explainers:
+        """
+        Select the fastest explainer for the family of the model. Linear models and tree ensembles have
+        exact algorithms, other models fall back to the sampling based permutation explainer.
+        :param model: the model to explain
+        :return: the type of explainer
+        """
+        if type(model).__module__.startswith("sklearn.linear_model") and hasattr(model, "coef_"):
+            return ShapTool.Explainers.LINEAR
+        if isinstance(model, ShapTool.TREE_MODELS):
+            return ShapTool.Explainers.TREE
+        return ShapTool.Explainers.PERMUTATION
+
+    @staticmethod
+    @InstrumentationTool.span("shap.explainer")
+    def build_explainer(model, background: DataFrame, explainer: Explainers):
+        """
+        Build the explainer for a model, masking features with the given background.
+        :param model: the model to explain
+        :param background: the background data, every row of it is used
+        :param explainer: the type of explainer to build, auto selects it from the model
+        :return: the explainer
+        """
+        # pass an explicit masker, otherwise shap draws its own random sample of at most 100 rows from the background
+        masker = shap.maskers.Independent(background, max_samples=len(background))
+
+        if explainer == ShapTool.Explainers.AUTO:
+            explainer = ShapTool.select_explainer(model)
 
-    def save_results(self, shap_data: dict, output_dir):
-        Path(output_dir).mkdir(parents=True, exist_ok=True)
-        file_basename = "shap"
-        output_filepath = Path(output_dir, file_basename).with_suffix(".yaml")
-        with open(output_filepath, "w") as file:
-            yaml.safe_dump(shap_data, file, sort_keys=False)
-        logging.info(f"saved shap results to {output_filepath}")
+        match explainer:
+            case ShapTool.Explainers.LINEAR:
+                return shap.LinearExplainer(model, masker)
+            case ShapTool.Explainers.TREE:
+                return shap.TreeExplainer(model, masker)
+            case ShapTool.Explainers.PERMUTATION:
+                # the permutation explainer needs a callable, explain the probabilities for classifiers
+                predict = model.predict_proba if hasattr(model, "predict_proba") else model.predict
+                return shap.PermutationExplainer(predict, masker)
+            case _:
+                raise TypeError(f"Explainer {explainer} is not supported, supported types are {ShapTool.Explainers}")
 
-    def get_results(self) -> dict[str, Any]:
+    @staticmethod
+    def explain_shard(
+        explainer, shard: DataFrame, seed: int, keep_rows: bool = False, max_evals: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray | None, np.ndarray | None]:
         """
-        Get the results from running the SHAP explain on the model and data
+        Explain a shard of rows and return the sum of the absolute SHAP values per feature.
+        :param explainer: the explainer to use
+        :param shard: the rows to explain
+        :param seed: the seed of the shard
+        :param keep_rows: if True, the SHAP values and base values of the rows are returned as well
+        :param max_evals: the evaluations of the model per row of a permutation explainer, defaults to that of shap
+        :return: a tuple of the sums of the absolute SHAP values and the SHAP values and base values of the rows,
+        None unless keep_rows is True
+        """
+        # sampling based explainers draw from the global numpy random state, seeding it per shard makes the
+        # outcome independent of the process that explains the shard. Threads explaining at the same time, like
+        # the jobs of the serve action, would share the state, so they take turns
+        random_state_lock = _random_state_lock if isinstance(explainer, shap.PermutationExplainer) else nullcontext()
+        with random_state_lock:
+            np.random.seed(seed)
+            explanation = explainer(shard) if max_evals is None else explainer(shard, max_evals=max_evals)
+        absolute_shap_sums = np.abs(explanation.values).sum(0)
+        # models with more than one output, like the class probabilities of a classifier, get the mean over the outputs
+        if absolute_shap_sums.ndim > 1:
+            absolute_shap_sums = absolute_shap_sums.mean(axis=1)
+        if not keep_rows:
+            return absolute_shap_sums, None, None
+        # the rows are converted to the dtype of the attribution files before they are sent back from a worker
+        return (
+            absolute_shap_sums,
+            explanation.values.astype(AttributionStore.DTYPE),
+            np.asarray(explanation.base_values, dtype=AttributionStore.DTYPE),
+        )
+
+    def get_results(
+        self,
+        data: DataFrame | Iterable[DataFrame] | None = None,
+        attributions_dir: Path | None = None,
+        previous: dict[str, Any] | None = None,
+    ) -> dict[str, Any]:
+        """
+        Get the results from running the SHAP explain on the model and data. When the data is an
+        iterable of chunks, the chunks are explained one by one and folded into running sums, so only a
+        single chunk is in memory at any time. The background is then summarized from the first chunk.
+
+        Every chunk is split in shards, see shard_size, which are summed in order. With more than one worker the
+        shards are explained in a process pool, the shards of the next chunks are read while the workers explain
+        the shards of earlier chunks. The result is the same for any number of workers.
+
+        The background and explainer are built once, so other data can be explained against the same
+        background by passing it, which is much faster than building a new tool.
+        :param data: the data to explain, defaults to the data of the tool
+        :param attributions_dir: if given, the SHAP values and base values of every row are appended to the
+        files of an AttributionStore in this directory while the shards are explained, and the results index them
+        :param previous: the statistics of rows explained earlier against the same background, the rows of the
+        data are added to them and their attributions are appended to those in attributions_dir
 
         Returns:
             Dict: The results to be returned for display
         """
+        start = time.perf_counter()
+        if data is None:
+            data = self._data
+        elif self._background is None and not isinstance(self._data, DataFrame):
+            raise TypeError("The background can only be summarized from a DataFrame when other data is explained")
+        chunks = iter([data]) if isinstance(data, DataFrame) else iter(data)
+        first_chunk = next(chunks)
+        if self._background is None:
+            self._background = self.get_background(first_chunk if data is self._data else self._data)
+        background = self._background
+        explainer_type = self._explainer
+        if explainer_type == ShapTool.Explainers.AUTO:
+            explainer_type = ShapTool.select_explainer(self._model)
+        logging.info(f"using the {explainer_type} explainer for model {type(self._model).__name__}")
+        explain, executor = self._start_explain(explainer_type)
 
-        # TODO add support for more types of explainers
-        explainer = shap.Explainer(self._model, self._data)
-        shap_values = explainer(self._data)
-        mean_absolute_shap_values = shap_values.timestamp_to_datetimeabs.mean(0).values
+        absolute_shap_sums = np.zeros(len(first_chunk.columns))
+        rows = 0
+        shard_index = 0
+        if previous is not None:
+            absolute_shap_sums += previous["absolute_shap_sums"]
+            rows = previous["rows"]
+            shard_index = previous["shards"]
+        attribution_store = None
+        if attributions_dir is not None:
+            attribution_store = AttributionStore(
+                attributions_dir, list(first_chunk.columns), append=previous is not None
+            )
+
+        def read_shards() -> Iterator[DataFrame]:
+            nonlocal rows
+            for chunk in itertools.chain([first_chunk], chunks):
+                shard_size = ShapTool.shard_size(len(chunk))
+                yield from (chunk.iloc[i : i + shard_size] for i in range(0, len(chunk), shard_size))
+                rows += len(chunk)
+                logging.debug(f"read chunk of {len(chunk)} rows, {rows} rows in total")
+
+        with InstrumentationTool.span("shap.evaluate", workers=self._workers) as evaluate_span:
+            try:
+                seeds = itertools.count(self._seed + shard_index)
+                keep_rows = itertools.repeat(attribution_store is not None)
+                # the shards come back in order, so the rows of the attributions are in the order of the data
+                for shard_sums, shard_values, shard_base_values in explain(read_shards(), seeds, keep_rows):
+                    absolute_shap_sums += shard_sums
+                    if attribution_store is not None:
+                        attribution_store.append(shard_values, shard_base_values)
+                    shard_index += 1
+                attributions = attribution_store.close() if attribution_store is not None else None
+            except BaseException:
+                if attribution_store is not None:
+                    attribution_store.abort()
+                raise
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            evaluate_span["rows"] = rows
+        self.statistics = {"rows": rows, "absolute_shap_sums": absolute_shap_sums.tolist(), "shards": shard_index}
+        mean_absolute_shap_values = absolute_shap_sums / rows
+        logging.info(
+            f"explained {rows} rows with {self._workers} worker(s) against a {self._background_method} background of"
+            f" {len(background)} rows in {time.perf_counter() - start:.3f} seconds"
+        )
 
         results = [
             {
                 "name": name,
-                "value": str(value),
+                "value": float(value),
             }
-            for name, value in zip(shap_values.feature_names, mean_absolute_shap_values)
+            for name, value in zip(first_chunk.columns, mean_absolute_shap_values)
         ]
 
         out = dict(
             {
                 "type": "SHAP",
                 "name": "Mean Absolute Shap Values",
+                "explainer": str(explainer_type),
+                "background": {
+                    "method": str(self._background_method),
+                    "size": len(background),
+                },
+                "rows": rows,
                 "results": results,
             }
         )
+        if attributions is not None:
+            out["attributions"] = attributions
 
         return out
+
+    def get_approximate_results(
+        self, time_budget: float | None = None, tolerance: float | None = None
+    ) -> dict[str, Any]:
+        """
+        Get the results from explaining a random sample of the rows that grows until the ranking of the
+        features is stable or the time budget runs out. The rows are explained in rounds, the first round
+        explains APPROXIMATE_FIRST_ROUND rows and every later round twice as many, limited to the rows that
+        fit in the rest of the budget at the speed of the earlier rounds. The permutation explainer uses
+        APPROXIMATE_PERMUTATIONS permutations per row.
+
+        After every round a confidence interval is computed for the mean absolute SHAP value of every feature.
+        The ranking is stable when every two features next to each other in the ranking have intervals that do
+        not overlap, or that together span at most tolerance times the largest mean absolute SHAP value, so
+        their order does not matter. The half widths of the intervals are the error of the results.
+        :param time_budget: the seconds the explanation may take, the first round is always explained and a
+        round of one row is explained as long as there is time left, so the budget can be exceeded by that
+        :param tolerance: the error relative to the largest mean absolute SHAP value that is good enough
+        :return: the results, with the error of every value and how the approximation stopped
+        :raises: TypeError: If the data of the tool is streamed.
+        """
+        start = time.perf_counter()
+        if not isinstance(self._data, DataFrame):
+            raise TypeError("An approximation samples from all rows, the data can not be streamed")
+        data = self._data
+        if self._background is None:
+            self._background = self.get_background(data)
+        explainer_type = self._explainer
+        if explainer_type == ShapTool.Explainers.AUTO:
+            explainer_type = ShapTool.select_explainer(self._model)
+        max_evals = None
+        if explainer_type == ShapTool.Explainers.PERMUTATION:
+            # every permutation evaluates the model twice per feature, forwards and backwards
+            max_evals = ShapTool.APPROXIMATE_PERMUTATIONS * (2 * len(data.columns) + 1)
+        logging.info(
+            f"approximating with the {explainer_type} explainer for model {type(self._model).__name__}, with a"
+            f" time budget of {time_budget} seconds and a tolerance of {tolerance}"
+        )
+        explain, executor = self._start_explain(explainer_type)
+
+        order = np.random.default_rng(self._seed).permutation(len(data))
+        sums = np.zeros(len(data.columns))
+        squares = np.zeros(len(data.columns))
+        means, errors = np.zeros(len(data.columns)), np.full(len(data.columns), np.inf)
+        rows = 0
+        round_size = ShapTool.APPROXIMATE_FIRST_ROUND
+        seconds_per_row = None
+        stopped = "all_rows"
+        with InstrumentationTool.span("shap.evaluate", workers=self._workers, approximate=True) as evaluate_span:
+            try:
+                while rows < len(data):
+                    if time_budget is not None and seconds_per_row is not None:
+                        remaining = start + time_budget - time.perf_counter()
+                        if remaining <= 0:
+                            stopped = "time_budget"
+                            break
+                        # at least one row, the speed measured in the first round includes the warm up of the
+                        # explainer, so it can be much faster afterwards
+                        round_size = max(1, min(round_size, int(remaining / seconds_per_row)))
+                    round_start = time.perf_counter()
+                    positions = order[rows : rows + round_size]
+                    # split the round over the workers
+                    shard_size = min(ShapTool.SHARD_SIZE, -(-len(positions) // self._workers))
+                    shards = [data.iloc[positions[i : i + shard_size]] for i in range(0, len(positions), shard_size)]
+                    seeds = range(self._seed + rows, self._seed + rows + len(shards))
+                    keep_rows = itertools.repeat(True, len(shards))
+                    for _, shard_values, _ in explain(shards, seeds, keep_rows, itertools.repeat(max_evals)):
+                        absolute_shap_values = np.abs(shard_values, dtype=np.float64)
+                        if absolute_shap_values.ndim > 2:
+                            absolute_shap_values = absolute_shap_values.mean(axis=2)
+                        sums += absolute_shap_values.sum(0)
+                        squares += np.square(absolute_shap_values).sum(0)
+                    rows += len(positions)
+                    seconds_per_row = (time.perf_counter() - round_start) / len(positions)
+                    means, errors = ShapTool.confidence_intervals(sums, squares, rows, len(data))
+                    logging.debug(f"explained {rows} rows, the largest error is {errors.max()}")
+                    if (
+                        tolerance is not None
+                        and rows >= ShapTool.APPROXIMATE_MIN_ROWS
+                        and ShapTool.ranking_is_stable(means, errors, tolerance)
+                    ):
+                        stopped = "converged"
+                        break
+                    if time_budget is not None and time.perf_counter() - start >= time_budget:
+                        stopped = "time_budget"
+                        break
+                    round_size *= 2
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            evaluate_span["rows"] = rows
+        seconds = time.perf_counter() - start
+        logging.info(
+            f"approximated with {rows} of {len(data)} rows in {seconds:.3f} seconds, stopped by {stopped},"
+            f" the largest error is {errors.max()}"
+        )
+
+        return {
+            "type": "SHAP",
+            "name": "Mean Absolute Shap Values",
+            "explainer": str(explainer_type),
+            "background": {
+                "method": str(self._background_method),
+                "size": len(self._background),
+            },
+            "rows": rows,
+            "results": [
+                {"name": name, "value": float(value), "error": float(error)}
+                for name, value, error in zip(data.columns, means, errors)
+            ],
+            "approximation": {
+                "stopped": stopped,
+                "population": len(data),
+                "confidence": ShapTool.CONFIDENCE,
+                "tolerance": tolerance,
+                "time_budget": time_budget,
+                "seconds": round(seconds, 3),
+                "permutations": ShapTool.APPROXIMATE_PERMUTATIONS if max_evals is not None else None,
+            },
+        }
+
+    @staticmethod
+    def confidence_intervals(
+        sums: np.ndarray, squares: np.ndarray, rows: int, population: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Compute the means of a sample of values per feature and the half widths of their confidence intervals.
+        The intervals shrink to zero as the sample grows to the population, because the rows are sampled
+        without replacement.
+        :param sums: the sums of the values per feature
+        :param squares: the sums of the squares of the values per feature
+        :param rows: the rows in the sample
+        :param population: the rows to sample from
+        :return: a tuple of the means and the half widths
+        """
+        means = sums / rows
+        if rows < 2:
+            return means, np.full(len(means), np.inf)
+        variances = np.maximum(squares - rows * np.square(means), 0) / (rows - 1)
+        finite_population_correction = (population - rows) / (population - 1) if population > 1 else 0
+        return means, ShapTool.CONFIDENCE_Z * np.sqrt(variances / rows * finite_population_correction)
+
+    @staticmethod
+    def ranking_is_stable(means: np.ndarray, errors: np.ndarray, tolerance: float) -> bool:
+        """
+        :param means: the mean absolute SHAP value per feature
+        :param errors: the half widths of the confidence intervals of the means
+        :param tolerance: the error relative to the largest mean that is good enough
+        :return: True if every two features next to each other in the ranking are ordered by their intervals,
+        or are tied within the tolerance
+        """
+        margin = tolerance * means.max()
+        ranking = np.argsort(-means)
+        lower, upper = means - errors, means + errors
+        for higher, lower_ranked in itertools.pairwise(ranking):
+            ordered = lower[higher] > upper[lower_ranked]
+            tied = max(upper[higher], upper[lower_ranked]) - min(lower[higher], lower[lower_ranked]) <= margin
+            if not ordered and not tied:
+                return False
+        return True
+
+    @staticmethod
+    def shard_size(rows: int) -> int:
+        """
+        :param rows: the rows of a chunk
+        :return: the rows of the shards the chunk is split in
+        """
+        return max(1, min(ShapTool.SHARD_SIZE, -(-rows // ShapTool.SHARDS_PER_CHUNK)))
+
+    def _start_explain(self, explainer_type: Explainers) -> tuple[Callable, ProcessPoolExecutor | None]:
+        """
+        Get a function that explains shards like map, in a process pool with more than one worker. The pool gets
+        twice as many shards as it has workers ahead of the results, so the shards are read lazily.
+        :param explainer_type: the type of explainer
+        :return: a tuple of the function, which takes the arguments of explain_shard after the explainer as
+        iterables, and the process pool, which must be shut down, or None
+        """
+        if self._workers > 1:
+            # the background is sent once to every worker, which builds its own explainer. A model with a path is
+            # loaded by the workers with memory mapping, other models are sent as well
+            executor = ProcessPoolExecutor(
+                max_workers=self._workers,
+                **InstrumentationTool.worker_initializer(
+                    _init_worker,
+                    (
+                        self._model if self._model_path is None else None,
+                        self._background,
+                        explainer_type,
+                        self._model_path,
+                    ),
+                ),
+            )
+            return functools.partial(_map_ahead, executor, 2 * self._workers, _explain_shard), executor
+        if self._explainer_instance is None:
+            self._explainer_instance = ShapTool.build_explainer(self._model, self._background, explainer_type)
+        return functools.partial(map, functools.partial(ShapTool.explain_shard, self._explainer_instance)), None
+
+
+def _map_ahead(executor: ProcessPoolExecutor, ahead: int, function: Callable, *iterables) -> Iterator:
+    """
+    Like the map of the executor, but the iterables are only read as far as ahead calls before the results.
+    :param executor: the executor
+    :param ahead: the number of calls that are submitted before their results are taken
+    :param function: the function to call
+    :param iterables: the arguments of the calls
+    :return: the results of the calls, in order
+    """
+    pending = deque()
+    for arguments in zip(*iterables):
+        pending.append(executor.submit(function, *arguments))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# guards the global numpy random state of sampling based explainers, see explain_shard
+_random_state_lock = threading.Lock()
+
+# the explainer of a worker process, built once by _init_worker when the process starts
+_worker_explainer = None
+
+
+def _init_worker(
+    model,
+    background: DataFrame,
+    explainer: ShapTool.Explainers,
+    model_path: str | None = None,
+) -> None:
+    global _worker_explainer
+    if model_path is not None:
+        # the arrays of a model saved uncompressed are memory mapped, so the workers share their pages
+        model = ModelLoader.load(model_path, mmap=True)
+    _worker_explainer = ShapTool.build_explainer(model, background, explainer)
+
+
+def _explain_shard(
+    shard: DataFrame, seed: int, keep_rows: bool = False, max_evals: int | None = None
+) -> tuple[np.ndarray, np.ndarray | None, np.ndarray | None]:
+    return ShapTool.explain_shard(_worker_explainer, shard, seed, keep_rows, max_evals)
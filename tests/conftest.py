@@ -0,0 +1,62 @@
+from argparse import Namespace
+from collections.abc import Callable
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from amt_core.tools.arg_parser import ArgParser
+
+
+@pytest.fixture(scope="session")
+def data() -> pd.DataFrame:
+    """
+    :return: synthetic data of which the features matter in the order of their columns
+    """
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(rng.normal(size=(400, 4)), columns=["income", "loan_amount", "age", "prior_count"])
+
+
+@pytest.fixture(scope="session")
+def model(data: pd.DataFrame) -> LogisticRegression:
+    target = data @ np.array([3.0, 2.0, 1.0, 0.0]) > 0
+    return LogisticRegression().fit(data, target)
+
+
+@pytest.fixture
+def model_path(tmp_path: Path, model: LogisticRegression) -> Path:
+    path = Path(tmp_path, "model.sav")
+    joblib.dump(model, path)
+    return path
+
+
+@pytest.fixture
+def data_path(tmp_path: Path, data: pd.DataFrame) -> Path:
+    path = Path(tmp_path, "data.csv")
+    data.to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def shap_args(tmp_path: Path, model_path: Path, data_path: Path) -> Callable[..., Namespace]:
+    """
+    :return: a function that parses the arguments of the shap action for the model and the data, with an output
+    directory and a cache in tmp_path and the options given to it
+    """
+
+    def parse(*options: str) -> Namespace:
+        return ArgParser(
+            [
+                "--action=shap",
+                f"--model={model_path}",
+                f"--data={data_path}",
+                f"--outputdir={Path(tmp_path, 'out')}",
+                f"--cachedir={Path(tmp_path, 'cache')}",
+                *options,
+            ]
+        ).get_args()
+
+    return parse
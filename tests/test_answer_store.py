@@ -0,0 +1,72 @@
+import os
+from pathlib import Path
+
+import pytest
+import yaml
+
+from amt_core.tools.answer_store import AnswerStore
+from amt_core.tools.assessment_tool import QuestionnaireTool
+
+ANSWERS_SCHEMA_PATH = Path(Path(__file__).parents[1], "schemas", "answers.json")
+
+
+@pytest.fixture
+def answer_store(tmp_path: Path):
+    with AnswerStore(Path(tmp_path, AnswerStore.FILENAME)) as answer_store:
+        yield answer_store
+
+
+def edit(path: Path, content: str) -> None:
+    """
+    Change a file and move its modification time, which can otherwise stay the same within the resolution of
+    the file system.
+    """
+    mtime = path.stat().st_mtime_ns
+    path.write_text(content)
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+
+def load_changed(output_dir: Path, answer_store: AnswerStore) -> dict:
+    return QuestionnaireTool.load_filled_questionnaires(
+        output_dir, output_dir, ANSWERS_SCHEMA_PATH, answer_store.is_changed
+    )
+
+
+def test_answers_are_kept_when_the_store_is_opened_again(tmp_path: Path) -> None:
+    with AnswerStore(Path(tmp_path, AnswerStore.FILENAME)) as answer_store:
+        answer_store.put("iama", "second", ["a", "b"], position=1)
+        answer_store.put("iama", "first", "no", position=0)
+        answer_store.put("iama", "first", "yes", position=0)
+
+    with AnswerStore(Path(tmp_path, AnswerStore.FILENAME)) as answer_store:
+        assert answer_store.get("iama", "first") == "yes"
+        assert answer_store.get("iama", "third") is None
+        assert answer_store.get_answers("iama") == {"first": "yes", "second": ["a", "b"]}
+        assert answer_store.questionnaires() == ["iama"]
+
+
+def test_exported_files_are_not_imported_again_until_they_are_edited(tmp_path: Path, answer_store: AnswerStore) -> None:
+    answer_store.put("iama", "question", "answer")
+    (exported,) = answer_store.export(tmp_path)
+
+    assert yaml.safe_load(exported.read_text()) == [{"question": "question", "answer": "answer"}]
+    # the database of the store is skipped and the exported file holds the stored answers already
+    assert load_changed(tmp_path, answer_store) == {}
+
+    edit(exported, exported.read_text())
+    assert not answer_store.is_changed(exported)
+
+    edit(exported, yaml.safe_dump([{"question": "question", "answer": "edited"}]))
+    assert load_changed(tmp_path, answer_store) == {"iama": {"question": "edited"}}
+
+
+def test_imported_files_are_recorded(tmp_path: Path, answer_store: AnswerStore) -> None:
+    path = Path(tmp_path, "general_info.yaml")
+    path.write_text(yaml.safe_dump([{"question": "name", "answer": "model"}]))
+    assert answer_store.is_changed(path)
+
+    answer_store.import_answers(load_changed(tmp_path, answer_store), [path])
+
+    assert answer_store.get("general_info", "name") == "model"
+    assert not answer_store.is_changed(path)
+    assert load_changed(tmp_path, answer_store) == {}
@@ -0,0 +1,83 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+import yaml
+
+from amt_core.tools.attribution_store import AttributionStore
+from amt_core.tools.shap_tool import ShapTool
+
+FEATURE_NAMES = ["income", "age"]
+
+
+def write(output_dir: Path, *shards: np.ndarray, append: bool = False) -> Path:
+    """
+    Store the shards of values with their row sums as base values and write the summary that indexes them.
+    :return: the path of the summary
+    """
+    with AttributionStore(output_dir, FEATURE_NAMES, append=append) as store:
+        for shard in shards:
+            store.append(shard, shard.sum(axis=1))
+    summary_path = Path(output_dir, "shap.yaml")
+    summary_path.write_text(yaml.safe_dump({"attributions": store.close()}))
+    return summary_path
+
+
+def test_shards_are_read_back_as_one_matrix(tmp_path: Path) -> None:
+    rng = np.random.default_rng(0)
+    shards = [rng.normal(size=(rows, 2, 3)) for rows in (5, 0, 7)]
+
+    summary_path = write(tmp_path, *shards)
+
+    values, base_values, feature_names = AttributionStore.load(summary_path)
+    assert isinstance(values, np.memmap)
+    assert values.shape == (12, 2, 3) and base_values.shape == (12, 3)
+    np.testing.assert_allclose(values, np.concatenate(shards), rtol=1e-6)
+    np.testing.assert_allclose(base_values, np.concatenate(shards).sum(axis=1), rtol=1e-5)
+    assert feature_names == FEATURE_NAMES
+    assert AttributionStore.rows(tmp_path) == 12
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_an_aborted_store_keeps_the_earlier_files(tmp_path: Path) -> None:
+    write(tmp_path, np.ones((3, 2)))
+
+    with pytest.raises(RuntimeError), AttributionStore(tmp_path, FEATURE_NAMES) as store:
+        store.append(np.zeros((5, 2)), 0.0)
+        raise RuntimeError
+
+    assert AttributionStore.rows(tmp_path) == 3
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_rows_are_appended_in_place(tmp_path: Path) -> None:
+    write(tmp_path, np.ones((3, 2)))
+    with pytest.raises(RuntimeError), AttributionStore(tmp_path, FEATURE_NAMES, append=True) as store:
+        store.append(np.zeros((5, 2)), 0.0)
+        raise RuntimeError
+    assert AttributionStore.rows(tmp_path) == 3
+
+    summary_path = write(tmp_path, np.full((2, 2), 2.0), append=True)
+
+    values, base_values, _ = AttributionStore.load(summary_path, mmap=False)
+    np.testing.assert_array_equal(values, [[1, 1]] * 3 + [[2, 2]] * 2)
+    np.testing.assert_array_equal(base_values, [2] * 3 + [4] * 2)
+
+
+def test_rows_of_another_shape_are_rejected(tmp_path: Path) -> None:
+    with AttributionStore(tmp_path, FEATURE_NAMES) as store:
+        store.append(np.ones((3, 2)), 0.0)
+        with pytest.raises(ValueError):
+            store.append(np.ones((3, 2, 2)), 0.0)
+    with pytest.raises(ValueError):
+        AttributionStore(Path(tmp_path, "missing"), FEATURE_NAMES, append=True)
+
+
+def test_the_shap_action_indexes_its_attributions(shap_args, data) -> None:
+    args = shap_args()
+    ShapTool.run_shap(args)
+
+    values, base_values, feature_names = AttributionStore.load(Path(args.outputdir, "shap.yaml"))
+
+    assert values.shape[:2] == (len(data), data.shape[1]) and len(base_values) == len(data)
+    assert feature_names == list(data.columns)
@@ -0,0 +1,69 @@
+import os
+from pathlib import Path
+
+import pytest
+import yaml
+
+from amt_core.tools.arg_parser import ArgParser
+from amt_core.tools.batch_tool import BatchTool
+
+
+class _Crash:
+    """
+    Kills the worker process that unpickles it.
+    """
+
+    def __reduce__(self):
+        return os._exit, (1,)
+
+
+def run_batch(manifest_path: Path, output_dir: Path, concurrency: int = 1) -> list[dict]:
+    args = ArgParser(
+        ["--action=batch", f"--manifest={manifest_path}", f"--outputdir={output_dir}", f"--concurrency={concurrency}"]
+    ).get_args()
+    BatchTool.run_batch(args)
+    with open(Path(output_dir, BatchTool.SUMMARY_FILENAME)) as f:
+        return yaml.safe_load(f)
+
+
+def test_failing_entries_do_not_stop_the_batch(tmp_path: Path, model_path: Path, data_path: Path) -> None:
+    manifest_path = Path(tmp_path, "manifests", "manifest.yaml")
+    manifest_path.parent.mkdir()
+    entries = [
+        # relative paths are resolved against the directory of the manifest
+        {"model": f"../{model_path.name}", "data": f"../{data_path.name}", "no_cache": True},
+        "not a mapping",
+        {"model": f"../{model_path.name}"},
+        {"model": f"../{model_path.name}", "data": f"../{data_path.name}", "unknown": 1},
+        {"model": "../missing.sav", "data": f"../{data_path.name}", "no_cache": True},
+    ]
+    manifest_path.write_text(yaml.safe_dump(entries))
+
+    summary = run_batch(manifest_path, Path(tmp_path, "out"))
+
+    assert [entry["status"] for entry in summary] == ["success"] + ["failure"] * 4
+    assert Path(summary[0]["outputdir"], "shap.yaml").is_file()
+    assert summary[1]["model"] is None
+    assert "TypeError" in summary[2]["error"]
+    assert "unknown" in summary[3]["error"]
+    assert "FileNotFoundError" in summary[4]["error"]
+
+
+def test_a_crashed_worker_fails_its_entry(
+    tmp_path: Path, model_path: Path, data_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    entries = [{"model": str(model_path), "data": str(data_path), "seed": _Crash()}]
+    monkeypatch.setattr(BatchTool, "load_manifest", staticmethod(lambda manifest_path: entries))
+
+    summary = run_batch(Path(tmp_path, "manifest.yaml"), Path(tmp_path, "out"), concurrency=2)
+
+    assert summary[0]["status"] == "failure"
+    assert summary[0]["error"].startswith("BrokenProcessPool")
+
+
+def test_a_manifest_without_entries_is_rejected(tmp_path: Path) -> None:
+    manifest_path = Path(tmp_path, "manifest.yaml")
+    manifest_path.write_text(yaml.safe_dump({"models": []}))
+
+    with pytest.raises(TypeError):
+        BatchTool.load_manifest(manifest_path)
@@ -0,0 +1,90 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from amt_core.tools.arg_parser import ArgParser
+from amt_core.tools.benchmark_tool import BenchmarkTool
+from amt_core.tools.report_tool import ReportTool
+
+
+@pytest.fixture
+def history_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    :return: the path of the history, in a working directory with the cards and the templates
+    """
+    repository = Path(__file__).parents[1]
+    shutil.copytree(Path(repository, "ui"), Path(tmp_path, "ui"))
+    shutil.copytree(Path(repository, "cards"), Path(tmp_path, "cards"))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ReportTool, "_environment", None)
+    return Path(tmp_path, "benchmarks", "history.jsonl")
+
+
+def run_benchmark(history_path: Path, *options: str) -> None:
+    args = ArgParser(
+        [
+            "--action=benchmark",
+            "--rows",
+            "50",
+            "--features",
+            "4",
+            "--models",
+            "linear",
+            "--formats",
+            ".csv",
+            ".npy",
+            "--card-sizes",
+            "1",
+            "--repeat=1",
+            f"--history={history_path}",
+            *options,
+        ]
+    ).get_args()
+    BenchmarkTool.run_benchmark(args)
+
+
+def test_runs_are_appended_to_the_history(history_path: Path, capsys: pytest.CaptureFixture) -> None:
+    run_benchmark(history_path)
+    run_benchmark(history_path)
+
+    first, second = BenchmarkTool.load_history(history_path)
+    assert [result["name"] for result in second["results"]] == [
+        "data.load",
+        "data.load",
+        "model.load",
+        "shap.get_results",
+        "shap.save_results",
+        "report.load",
+        "report.render",
+    ]
+    assert second["versions"]["numpy"] is not None
+    assert f"compared with run {first['run']}" in capsys.readouterr().out
+
+
+def test_a_regression_fails_the_run_when_asked(history_path: Path) -> None:
+    run_benchmark(history_path)
+
+    # with a negative threshold every benchmark regressed
+    with pytest.raises(SystemExit):
+        run_benchmark(history_path, "--threshold=-1", "--fail-on-regression")
+    assert len(BenchmarkTool.load_history(history_path)) == 2
+
+
+def test_only_matching_benchmarks_are_compared() -> None:
+    previous = [
+        {"name": "data.load", "params": {"rows": 10}, "min_s": 1.0, "median_s": 1.0},
+        {"name": "data.load", "params": {"rows": 20}, "min_s": 1.0, "median_s": 1.0},
+    ]
+    results = [
+        {"name": "data.load", "params": {"rows": 10}, "min_s": 1.2, "median_s": 1.2},
+        {"name": "data.load", "params": {"rows": 20}, "min_s": 1.05, "median_s": 1.05},
+        {"name": "data.load", "params": {"rows": 30}, "min_s": 9.0, "median_s": 9.0},
+    ]
+
+    regressions = BenchmarkTool.compare(results, previous, threshold=0.1)
+
+    assert [(result["params"], round(ratio, 2)) for result, ratio in regressions] == [({"rows": 10}, 1.2)]
+    table = BenchmarkTool.table(results, {"run": "a", "timestamp": "t", "results": previous}, threshold=0.1)
+    assert "+20% !" in table and "+5%" in table
+    assert BenchmarkTool.load_history(Path("missing.jsonl")) == []
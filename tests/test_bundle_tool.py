@@ -0,0 +1,86 @@
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+
+from amt_core.tools.bundle_tool import BundleTool
+
+
+@pytest.fixture
+def report_path(tmp_path: Path) -> Path:
+    """
+    :return: a report with a stylesheet, a classic script and a module script that starts a worker
+    """
+    report_dir = Path(tmp_path, "report")
+    Path(report_dir, "js").mkdir(parents=True)
+    Path(report_dir, "style.css").write_text(
+        "/* the rules of the report */\n"
+        ".used { color: red; }\n"
+        ".unused { color: blue; }\n"
+        ".classic-set { color: green; }\n"
+        ".module-set { color: white; }\n"
+        "@media print { .unused { display: none; } .used { display: block; } }\n"
+    )
+    Path(report_dir, "classic.js").write_text("document.body.classList.add('classic-set');\n")
+    Path(report_dir, "js", "app.mjs").write_text(
+        "const worker = new Worker(new URL('./worker.mjs', import.meta.url), { type: 'module' });\n"
+        "worker.onmessage = () => document.body.classList.add('module-set');\n"
+    )
+    Path(report_dir, "js", "worker.mjs").write_text("postMessage('ready');\n")
+    path = Path(report_dir, "report.html")
+    path.write_text(
+        "<!DOCTYPE html>\n<html>\n<head>\n"
+        '<link rel="stylesheet" href="style.css">\n'
+        '<script src="classic.js"></script>\n'
+        '<script type="module" src="js/app.mjs"></script>\n'
+        '</head>\n<body><div class="used">report</div></body>\n</html>\n'
+    )
+    return path
+
+
+def test_a_report_is_bundled_with_the_rules_it_uses(report_path: Path, tmp_path: Path) -> None:
+    entry_path = BundleTool.run_bundle(report_path, Path(tmp_path, "bundle"))
+
+    html = entry_path.read_text()
+    assert ".used{color:red}" in html and "@media print{.used{display:block}}" in html
+    assert ".unused" not in html
+    # classes that only scripts set are kept
+    assert ".classic-set{color:green}" in html
+    assert ".module-set{color:white}" in html
+    assert 'rel="stylesheet"' not in html
+
+
+def test_module_scripts_are_bundled_with_their_workers(report_path: Path, tmp_path: Path) -> None:
+    output_dir = Path(tmp_path, "bundle")
+    BundleTool.run_bundle(report_path, output_dir)
+
+    with open(Path(output_dir, BundleTool.MANIFEST_FILENAME)) as f:
+        files = json.load(f)["files"]
+    app = next(name for name in files if name.startswith("assets/app.") and name.endswith(".mjs"))
+    worker = next(name for name in files if name.startswith("assets/worker.") and name.endswith(".mjs"))
+    assert f'new URL("./{Path(worker).name}", import.meta.url)' in Path(output_dir, app).read_text()
+    assert app in Path(output_dir, BundleTool.ENTRY_FILENAME).read_text()
+
+
+def test_an_earlier_bundle_is_replaced(report_path: Path, tmp_path: Path) -> None:
+    output_dir = Path(tmp_path, "bundle")
+    BundleTool.run_bundle(report_path, output_dir)
+    Path(report_path.parent, "classic.js").write_text("document.body.classList.add('classic-set', 'changed');\n")
+    BundleTool.run_bundle(report_path, output_dir)
+
+    with open(Path(output_dir, BundleTool.MANIFEST_FILENAME)) as f:
+        files = json.load(f)["files"]
+    assert sorted(str(path.relative_to(output_dir)) for path in output_dir.rglob("*.js")) == [
+        name for name in files if name.endswith(".js")
+    ]
+    entry_path = Path(output_dir, BundleTool.ENTRY_FILENAME)
+    assert gzip.decompress(entry_path.with_name(entry_path.name + ".gz").read_bytes()) == entry_path.read_bytes()
+
+
+def test_css_is_minified_without_changing_strings() -> None:
+    assert (
+        BundleTool.minify_css("a  >  b,\n c", ' content : "a ; b" ;  color : red ; ')
+        == 'a>b,c{content:"a ; b";color:red}'
+    )
+    assert BundleTool.minify_css("@import url(x.css)", None) == "@import url(x.css);"
@@ -0,0 +1,72 @@
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+from sklearn.linear_model import LogisticRegression
+
+from amt_core.tools.arg_parser import ArgParser
+from amt_core.tools.compare_tool import CompareTool
+from amt_core.tools.shap_tool import ShapTool
+
+
+def run_compare(model_paths: list[Path], data_path: Path, output_dir: Path, concurrency: int = 1) -> dict:
+    args = ArgParser(
+        [
+            "--action=compare",
+            "--model",
+            *map(str, model_paths),
+            f"--data={data_path}",
+            f"--outputdir={output_dir}",
+            f"--concurrency={concurrency}",
+        ]
+    ).get_args()
+    CompareTool.run_compare(args)
+    with open(Path(output_dir, CompareTool.FILENAME)) as f:
+        return yaml.safe_load(f)
+
+
+@pytest.mark.parametrize("concurrency", [1, 2])
+def test_models_are_compared_on_the_same_data(
+    tmp_path: Path, model, model_path: Path, data: pd.DataFrame, data_path: Path, concurrency: int
+) -> None:
+    # a model of two of the features, the other features are not loaded for it
+    features = ["age", "income"]
+    subset_path = Path(tmp_path, "subset.sav")
+    joblib.dump(LogisticRegression().fit(data[features], data["age"] > 0), subset_path)
+    missing_path = Path(tmp_path, "missing.sav")
+
+    comparison = run_compare([model_path, subset_path, missing_path], data_path, Path(tmp_path, "out"), concurrency)
+
+    assert [model["name"] for model in comparison["models"]] == ["model", "subset", "missing"]
+    assert [model["status"] for model in comparison["models"]] == ["success", "success", "failure"]
+    assert comparison["models"][2]["error"].startswith("FileNotFoundError")
+    assert comparison["background"]["shared"]
+    importances = {result["name"]: result["importances"] for result in comparison["results"]}
+    assert list(importances) == list(data.columns)
+    assert importances["loan_amount"][1:] == [None, None]
+    assert importances["age"][1] > importances["income"][1]
+    expected = ShapTool(model, data).get_results()
+    assert [importances[result["name"]][0] for result in expected["results"]] == pytest.approx(
+        [result["value"] for result in expected["results"]]
+    )
+
+
+def test_models_are_named_after_their_files() -> None:
+    assert CompareTool.model_names(["a/model.sav", "b/model.onnx", "c/other.sav"]) == ["a/model", "b/model", "other"]
+    with pytest.raises(TypeError):
+        CompareTool.model_names(["a/model.sav", "a/model.sav"])
+
+
+def test_a_failing_model_keeps_its_column(tmp_path: Path, model_path: Path, data_path: Path) -> None:
+    # a model that was fitted on other features can not explain the data
+    other_path = Path(tmp_path, "other.sav")
+    other = pd.DataFrame(np.zeros((10, 1)), columns=["unknown"])
+    joblib.dump(LogisticRegression().fit(other, [0, 1] * 5), other_path)
+
+    comparison = run_compare([model_path, other_path], data_path, Path(tmp_path, "out"))
+
+    assert [model["status"] for model in comparison["models"]] == ["success", "failure"]
+    assert all(len(result["importances"]) == 2 for result in comparison["results"])
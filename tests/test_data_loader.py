@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+
+from amt_core.loaders.data_loader import DataLoader
+
+
+def test_a_csv_file_is_read_in_chunks_of_the_columns(data: pd.DataFrame, data_path: Path) -> None:
+    chunks = DataLoader.load(str(data_path), 150, ["age", "income"])
+
+    assert not isinstance(chunks, DataFrame)
+    chunks = list(chunks)
+    assert [len(chunk) for chunk in chunks] == [150, 150, 100]
+    assert all(list(chunk.columns) == ["age", "income"] for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks), data[["age", "income"]], check_exact=False)
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".feather", ".arrow"])
+def test_columnar_files_are_loaded_with_the_columns(tmp_path: Path, data: pd.DataFrame, suffix: str) -> None:
+    pytest.importorskip("pyarrow")
+    path = Path(tmp_path, f"data{suffix}")
+    data.to_parquet(path) if suffix == ".parquet" else data.to_feather(path)
+
+    loaded = DataLoader.load(str(path), columns=["age", "income"])
+
+    pd.testing.assert_frame_equal(loaded, data[["age", "income"]])
+
+
+def test_a_numpy_file_is_memory_mapped(tmp_path: Path, data: pd.DataFrame) -> None:
+    path = Path(tmp_path, "data.npy")
+    np.save(path, data.to_numpy())
+
+    loaded = DataLoader.load(str(path), columns=list(data.columns))
+
+    base = loaded.to_numpy()
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert base is not None
+    np.testing.assert_array_equal(loaded.to_numpy(), data.to_numpy())
+    with pytest.raises(TypeError):
+        DataLoader.load(str(path), columns=["age"])
+
+
+def test_compact_downcasts_every_column(tmp_path: Path) -> None:
+    data = pd.DataFrame(
+        {
+            "small": [0, 1, 200] * 10,
+            "negative": [-1, 0, 300] * 10,
+            "large": [0, 1, 2**20] * 10,
+            "half": [0.5, 1.25, -2.0] * 10,
+            "precise": [0.1, 0.2, 0.3] * 10,
+            "category": ["a", "b", "c"] * 10,
+            "text": [f"text {i}" for i in range(30)],
+        }
+    )
+    path = Path(tmp_path, "data.csv")
+    data.to_csv(path, index=False)
+
+    compact = DataLoader.load(str(path), compact=True, dtypes={"small": "int64"})
+
+    assert compact.dtypes.astype(str).to_dict() == {
+        # a given dtype overrides the inferred one
+        "small": "int64",
+        "negative": "int16",
+        "large": "uint32",
+        "half": "float32",
+        "precise": "float64",
+        "category": "category",
+        "text": "object",
+    }
+    pd.testing.assert_frame_equal(compact, data, check_dtype=False, check_categorical=False)
+
+
+def test_compact_dtypes_are_inferred_over_all_chunks() -> None:
+    chunks = [pd.DataFrame({"value": [1, 2]}), pd.DataFrame({"value": [70000, None]})]
+
+    assert DataLoader.infer_compact_dtypes(chunks) == {"value": "float32"}
@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import pytest
+import yaml
+
+from amt_core.tools.answer_store import AnswerStore
+from amt_core.tools.arg_parser import ArgParser
+from amt_core.tools.import_tool import ImportTool
+
+
+@pytest.fixture(autouse=True)
+def repository(monkeypatch: pytest.MonkeyPatch) -> Path:
+    repository = Path(__file__).parents[1]
+    # the schemas are relative to the working directory
+    monkeypatch.chdir(repository)
+    return repository
+
+
+def run_import(answers_path: Path, output_dir: Path, workers: int = 1) -> list[dict]:
+    args = ArgParser(
+        ["--action=import", f"--answers={answers_path}", f"--outputdir={output_dir}", f"--workers={workers}"]
+    ).get_args()
+    ImportTool.run_import(args)
+    with open(Path(output_dir, ImportTool.ERRORS_FILENAME)) as f:
+        return yaml.safe_load(f)
+
+
+@pytest.fixture
+def answers_path(tmp_path: Path) -> Path:
+    path = Path(tmp_path, "answers.csv")
+    path.write_text(
+        "system,questionnaire,question,answer\n"
+        "alpha,general_info,Organization:,Acme\n"
+        "alpha,general_info,Model task:,text-generation\n"
+        "alpha,general_info,Relevant metrics,rmse|f1-score\n"
+        "beta,general_info,Model task:,translation\n"
+        "gamma,unknown,Organization:,Acme\n"
+    )
+    return path
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_valid_answer_sets_are_stored_per_system(tmp_path: Path, answers_path: Path, workers: int) -> None:
+    output_dir = Path(tmp_path, "out")
+
+    errors = run_import(answers_path, output_dir, workers)
+
+    with AnswerStore(Path(output_dir, "alpha", AnswerStore.FILENAME)) as answer_store:
+        assert answer_store.get_answers("general_info") == {
+            "Organization:": "Acme",
+            "Model task:": "text-generation",
+            "Relevant metrics": ["rmse", "f1-score"],
+        }
+    assert yaml.safe_load(Path(output_dir, "alpha", "general_info.yaml").read_text())[2] == {
+        "question": "Relevant metrics",
+        "answer": ["rmse", "f1-score"],
+    }
+    assert [error["system"] for error in errors] == ["beta", "gamma"]
+    assert "is not an option" in errors[0]["errors"][0]
+    assert "does not exist" in errors[1]["errors"][0]
+    assert not Path(output_dir, "beta").exists()
+
+
+def test_invalid_answer_sets_are_reported(tmp_path: Path) -> None:
+    answers_path = Path(tmp_path, "answers.yaml")
+    answers = [{"question": "Organization:", "answer": "Acme"}]
+    answers_path.write_text(
+        yaml.safe_dump(
+            [
+                "not an answer set",
+                {"system": "../alpha", "questionnaire": "general_info", "answers": answers},
+                {"system": "alpha", "questionnaire": "general_info", "answers": answers + answers},
+                {"system": "alpha", "questionnaire": "general_info", "answers": [{"question": "Organization:"}]},
+            ]
+        )
+    )
+
+    errors = run_import(answers_path, Path(tmp_path, "out"))
+
+    assert [error["source"] for error in errors] == [f"{answers_path}[{index}]" for index in range(4)]
+    assert "must be a name" in errors[1]["errors"][0]
+    assert "more than once" in errors[2]["errors"][0]
+    assert "'answer' is a required property" in errors[3]["errors"][0]
+
+
+def test_unsupported_answer_files_are_rejected(tmp_path: Path) -> None:
+    path = Path(tmp_path, "answers.txt")
+    path.write_text("answers")
+    with pytest.raises(TypeError):
+        ImportTool.load_answer_sets(path)
+
+    path = Path(tmp_path, "answers.csv")
+    path.write_text("system,question,answer\n")
+    with pytest.raises(TypeError):
+        ImportTool.load_answer_sets(path)
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import joblib
+import pandas as pd
+import pytest
+import yaml
+
+from amt_core.tools.attribution_store import AttributionStore
+from amt_core.tools.shap_tool import ShapTool
+
+
+def run_incremental(args) -> dict:
+    ShapTool.run_shap(args)
+    with open(Path(args.outputdir, "shap.yaml")) as f:
+        return yaml.safe_load(f)
+
+
+def test_only_appended_rows_are_explained(shap_args, model, data: pd.DataFrame, data_path: Path) -> None:
+    args = shap_args("--incremental")
+    data.iloc[:300].to_csv(data_path, index=False)
+    assert run_incremental(args)["incremental"] == {"explained": 300, "reused": 0}
+
+    data.to_csv(data_path, index=False)
+    results = run_incremental(args)
+
+    assert results["incremental"] == {"explained": 100, "reused": 300}
+    assert results["rows"] == AttributionStore.rows(args.outputdir) == len(data)
+    # the rows are explained against the background of the first run
+    shap_tool = ShapTool(model, data)
+    shap_tool.background = joblib.load(Path(args.outputdir, ShapTool.BACKGROUND_FILENAME))
+    expected = shap_tool.get_results()
+    assert [result["value"] for result in results["results"]] == pytest.approx(
+        [result["value"] for result in expected["results"]]
+    )
+
+
+def test_a_changed_row_explains_all_rows(shap_args, data: pd.DataFrame, data_path: Path) -> None:
+    args = shap_args("--incremental")
+    run_incremental(args)
+    changed = data.copy()
+    changed.iloc[10, 0] += 1
+    changed.to_csv(data_path, index=False)
+
+    assert run_incremental(args)["incremental"] == {"explained": len(data), "reused": 0}
+
+
+def test_a_changed_configuration_explains_all_rows(shap_args, data: pd.DataFrame) -> None:
+    run_incremental(shap_args("--incremental"))
+
+    results = run_incremental(shap_args("--incremental", "--seed=1"))
+
+    assert results["incremental"] == {"explained": len(data), "reused": 0}
+
+
+def test_missing_attributions_explain_all_rows(shap_args, data: pd.DataFrame) -> None:
+    args = shap_args("--incremental")
+    run_incremental(args)
+    Path(args.outputdir, "shap_values.npy").unlink()
+
+    assert run_incremental(args)["incremental"] == {"explained": len(data), "reused": 0}
+
+
+def test_incremental_runs_are_not_approximated(shap_args) -> None:
+    with pytest.raises(TypeError):
+        ShapTool.run_shap(shap_args("--incremental", "--tolerance=0.05"))
@@ -0,0 +1,89 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from amt_core.tools.instrumentation_tool import InstrumentationTool
+
+# set in a worker process by its initializer
+_initialized = None
+
+
+def _initialize(value: str) -> None:
+    global _initialized
+    _initialized = value
+
+
+def _work() -> str | None:
+    with InstrumentationTool.span("worker.work"):
+        return _initialized
+
+
+@pytest.fixture(autouse=True)
+def spans_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    # spans are written to logs/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(InstrumentationTool, "_spans_file", None)
+    monkeypatch.setattr(InstrumentationTool, "_run_id", None)
+    monkeypatch.setattr(InstrumentationTool, "_summary", {})
+    yield Path(tmp_path, "logs", InstrumentationTool.SPANS_FILENAME)
+    InstrumentationTool.disable()
+
+
+def read_spans(spans_path: Path) -> list[dict]:
+    with open(spans_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_spans_are_not_recorded_by_default(spans_path: Path) -> None:
+    with InstrumentationTool.span("data.load", rows=10) as record:
+        record["columns"] = 4
+
+    assert record == {"name": "data.load", "rows": 10, "columns": 4}
+    assert not spans_path.parent.exists()
+    assert InstrumentationTool._run_id is None
+    assert InstrumentationTool.worker_initializer()["initargs"] == (None, None, ())
+
+
+def test_enabled_spans_are_written_with_their_parent(spans_path: Path) -> None:
+    InstrumentationTool.enable()
+
+    with InstrumentationTool.span("shap.run"):
+        with InstrumentationTool.span("data.load", rows=10) as record:
+            record["columns"] = 4
+        with pytest.raises(ValueError), InstrumentationTool.span("shap.explain"):
+            raise ValueError
+
+    spans = read_spans(spans_path)
+    assert [span["name"] for span in spans] == ["data.load", "shap.explain", "shap.run"]
+    assert [span["parent"] for span in spans] == ["shap.run", "shap.run", None]
+    assert spans[0]["rows"] == 10 and spans[0]["columns"] == 4
+    assert spans[1]["error"] == "ValueError"
+    assert {span["run"] for span in spans} == {InstrumentationTool.run_id()}
+    assert "shap.run" in InstrumentationTool.summary()
+
+    InstrumentationTool.disable()
+    with InstrumentationTool.span("after.disable"):
+        pass
+    assert len(read_spans(spans_path)) == 3
+
+
+def test_workers_record_their_spans_under_the_run(spans_path: Path) -> None:
+    InstrumentationTool.enable("run")
+
+    with ProcessPoolExecutor(max_workers=1, **InstrumentationTool.worker_initializer(_initialize, ("ready",))) as pool:
+        assert pool.submit(_work).result() == "ready"
+
+    (span,) = read_spans(spans_path)
+    assert span["name"] == "worker.work"
+    assert span["run"] == "run"
+    assert span["pid"] != os.getpid()
+
+
+def test_workers_do_not_record_spans_when_the_run_does_not(spans_path: Path) -> None:
+    with ProcessPoolExecutor(max_workers=1, **InstrumentationTool.worker_initializer(_initialize, ("ready",))) as pool:
+        assert pool.submit(_work).result() == "ready"
+
+    assert not spans_path.exists()
@@ -0,0 +1,66 @@
+import os
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.neighbors import KNeighborsClassifier
+
+from amt_core.loaders.model_loader import ModelLoader
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch: pytest.MonkeyPatch) -> dict:
+    registry = {}
+    monkeypatch.setattr(ModelLoader, "_registry", registry)
+    return registry
+
+
+def test_a_model_is_loaded_once_until_its_file_changes(model_path: Path) -> None:
+    model = ModelLoader.load(str(model_path))
+    assert ModelLoader.load(str(model_path)) is model
+
+    mtime = model_path.stat().st_mtime_ns + 10**9
+    os.utime(model_path, ns=(mtime, mtime))
+    reloaded = ModelLoader.load(str(model_path))
+    assert reloaded is not model
+
+    ModelLoader.unload(str(model_path))
+    assert ModelLoader.load(str(model_path)) is not reloaded
+
+
+def test_the_least_recently_used_model_is_evicted(
+    tmp_path: Path, model_path: Path, model, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(ModelLoader, "MAX_MODELS", 1)
+    other_path = Path(tmp_path, "other.sav")
+    joblib.dump(model, other_path)
+
+    first = ModelLoader.load(str(model_path))
+    ModelLoader.load(str(other_path))
+
+    assert ModelLoader.load(str(model_path)) is not first
+
+
+def test_the_arrays_of_a_model_are_memory_mapped(tmp_path: Path, data: pd.DataFrame) -> None:
+    # a nearest neighbours model keeps its training data as an array
+    neighbours = KNeighborsClassifier().fit(data, data["income"] > 0)
+    path = Path(tmp_path, "neighbours.sav")
+    joblib.dump(neighbours, path)
+
+    mapped = ModelLoader.load(str(path), mmap=True)
+
+    in_memory, memory_mapped = ModelLoader._array_bytes(mapped)
+    assert memory_mapped > in_memory
+    np.testing.assert_array_equal(mapped.predict(data), neighbours.predict(data))
+
+
+def test_unsupported_models_are_rejected(tmp_path: Path) -> None:
+    path = Path(tmp_path, "model.bad")
+    path.write_text("not a model")
+
+    with pytest.raises(TypeError):
+        ModelLoader.load(str(path))
+    with pytest.raises(FileNotFoundError):
+        ModelLoader.load(str(Path(tmp_path, "missing.sav")))
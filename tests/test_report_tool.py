@@ -0,0 +1,168 @@
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import jinja2
+import pytest
+
+from amt_core.tools.report_tool import ReportTool
+
+
+@pytest.fixture(autouse=True)
+def include_cache(monkeypatch: pytest.MonkeyPatch) -> dict:
+    cache = {}
+    monkeypatch.setattr(ReportTool, "_include_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def card_path(tmp_path: Path) -> Path:
+    """
+    :return: a system card that includes a model, which includes its model index
+    """
+    Path(tmp_path, "models").mkdir()
+    Path(tmp_path, "models", "index.yaml").write_text("- name: accuracy\n  value: 0.9\n")
+    # included files are relative to the card, also when they are included by an included file
+    Path(tmp_path, "models", "model.yaml").write_text("name: model\nmodel-index: !include models/index.yaml\n")
+    path = Path(tmp_path, "card.yaml")
+    path.write_text("name: card\nmodels:\n- !include models/model.yaml\n")
+    return path
+
+
+def edit(path: Path, content: str) -> None:
+    """
+    Change a file and move its modification time, which can otherwise stay the same within the resolution of
+    the file system.
+    """
+    mtime = path.stat().st_mtime_ns
+    path.write_text(content)
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+
+def test_included_files_are_parsed_once(card_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    with caplog.at_level(logging.DEBUG):
+        ReportTool(card_path)
+        first = caplog.text.count("parsing included file")
+        caplog.clear()
+        report_tool = ReportTool(card_path)
+
+    assert first == 2
+    assert "parsing included file" not in caplog.text
+    assert report_tool.data["models"][0]["model_index"] == [{"name": "accuracy", "value": 0.9}]
+    # the files included by a cached file are still dependencies of the report
+    assert Path(card_path.parent, "models", "index.yaml") in report_tool.dependencies
+
+
+def test_a_changed_nested_include_is_parsed_again(card_path: Path) -> None:
+    ReportTool(card_path)
+    edit(Path(card_path.parent, "models", "index.yaml"), "- name: accuracy\n  value: 0.8\n")
+
+    assert ReportTool(card_path).data["models"][0]["model_index"] == [{"name": "accuracy", "value": 0.8}]
+
+
+def test_a_touched_include_with_the_same_content_is_not_parsed_again(
+    card_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    ReportTool(card_path)
+    model_path = Path(card_path.parent, "models", "model.yaml")
+    edit(model_path, model_path.read_text())
+
+    with caplog.at_level(logging.DEBUG):
+        ReportTool(card_path)
+
+    assert "parsing included file" not in caplog.text
+
+
+def test_cached_models_are_not_changed(card_path: Path, include_cache: dict) -> None:
+    ReportTool(card_path)
+    model = ReportTool(card_path).data["models"][0]
+
+    cached = next(entry[2] for path, entry in include_cache.items() if path.endswith("model.yaml"))
+    assert "model_index" in model and "model-index" not in model
+    assert "model-index" in cached and "model_index" not in cached
+
+
+@pytest.fixture
+def cards_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    :return: a directory with two cards that include the same model and assessment
+    """
+    repository = Path(__file__).parents[1]
+    # the templates are relative to the working directory
+    monkeypatch.chdir(repository)
+    cards_dir = Path(tmp_path, "cards")
+    shutil.copytree(Path(repository, "cards"), cards_dir)
+    shutil.copy(Path(cards_dir, "system_card.yaml"), Path(cards_dir, "other_card.yaml"))
+    return cards_dir
+
+
+def build(cards_dir: Path, capsys: pytest.CaptureFixture, **options) -> str:
+    ReportTool.build(cards_dir, Path(cards_dir.parent, "reports"), **options)
+    return capsys.readouterr().out.strip()
+
+
+def test_only_reports_with_changed_dependencies_are_rendered(cards_dir: Path, capsys: pytest.CaptureFixture) -> None:
+    assert build(cards_dir, capsys).startswith("Rendered 2 of 2 reports")
+    assert Path(cards_dir.parent, "reports", "other_card.html").is_file()
+    assert build(cards_dir, capsys).startswith("Rendered 0 of 2 reports")
+
+    edit(Path(cards_dir, "other_card.yaml"), Path(cards_dir, "other_card.yaml").read_text() + "\n# edited\n")
+    assert build(cards_dir, capsys).startswith("Rendered 1 of 2 reports")
+
+    model_path = Path(cards_dir, "models", "logres_iris.yaml")
+    edit(model_path, model_path.read_text() + "\n# edited\n")
+    assert build(cards_dir, capsys).startswith("Rendered 2 of 2 reports")
+
+    assert build(cards_dir, capsys, force=True).startswith("Rendered 2 of 2 reports")
+
+
+def test_a_failing_report_is_rendered_again(cards_dir: Path, capsys: pytest.CaptureFixture) -> None:
+    Path(cards_dir, "broken_card.yaml").write_text("name: broken\n")
+    with pytest.raises(KeyError):
+        build(cards_dir, capsys)
+    output = capsys.readouterr().out.strip()
+    assert output.startswith("Rendered 2 of 3 reports") and output.endswith("1 failed")
+
+    with pytest.raises(KeyError):
+        build(cards_dir, capsys)
+    output = capsys.readouterr().out.strip()
+    assert output.startswith("Rendered 0 of 3 reports") and output.endswith("1 failed")
+
+
+@pytest.fixture
+def templates_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    :return: a working directory with the templates, with a new environment for this process
+    """
+    repository = Path(__file__).parents[1]
+    shutil.copytree(Path(repository, "ui"), Path(tmp_path, "ui"))
+    shutil.copytree(Path(repository, "cards"), Path(tmp_path, "cards"))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ReportTool, "_environment", None)
+    return tmp_path
+
+
+def test_a_report_is_rendered_in_the_layout(templates_dir: Path) -> None:
+    output_path = Path(templates_dir, "report.html")
+
+    ReportTool(Path(templates_dir, "cards", "system_card.yaml")).render(output_path)
+
+    report = output_path.read_text()
+    assert report.startswith("<!DOCTYPE html>") and report.rstrip().endswith("</html>")
+    assert "<h1>Zoeken naar mogelijke registraties van vreemdelingen</h1>" in report
+    assert "{%" not in report
+
+
+def test_templates_are_compiled_once(templates_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    ReportTool(Path(templates_dir, "cards", "system_card.yaml")).render(Path(templates_dir, "report.html"))
+    environment = ReportTool._get_environment()
+    assert ReportTool._get_environment() is environment
+    # the compiled templates are cached on disk for the next process
+    assert len(list(Path(templates_dir, ".cache", "jinja").iterdir())) == len(ReportTool.TEMPLATES)
+
+    monkeypatch.setattr(ReportTool, "_environment", None)
+    compiled = []
+    monkeypatch.setattr(jinja2.Environment, "compile", lambda *args, **kwargs: compiled.append(args))
+    ReportTool._get_environment().get_template(ReportTool.TEMPLATES[0])
+    assert compiled == []
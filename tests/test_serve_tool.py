@@ -0,0 +1,117 @@
+import json
+import socket
+import threading
+import urllib.error
+import urllib.request
+from collections.abc import Iterator
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from amt_core.tools.arg_parser import ArgParser
+from amt_core.tools.serve_tool import ServeTool, _RequestHandler
+from amt_core.tools.shap_tool import ShapTool
+
+
+@pytest.fixture
+def serve_tool(tmp_path: Path) -> Iterator[ServeTool]:
+    serve_tool = ServeTool(max_models=1, allowed_dirs=[tmp_path])
+    yield serve_tool
+    serve_tool.shutdown()
+
+
+@pytest.fixture
+def url(serve_tool: ServeTool) -> Iterator[str]:
+    handler = type("Handler", (_RequestHandler,), {"serve_tool": serve_tool})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url: str, request: dict) -> tuple[int, dict]:
+    http_request = urllib.request.Request(f"{url}/explain", data=json.dumps(request).encode(), method="POST")
+    try:
+        with urllib.request.urlopen(http_request) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_data_is_explained_with_a_warm_model(
+    url: str, serve_tool: ServeTool, model, data: pd.DataFrame, model_path: Path, data_path: Path
+) -> None:
+    status, results = post(url, {"model": str(model_path), "data": str(data_path)})
+
+    assert status == 200
+    expected = ShapTool(model, data).get_results()
+    # the data is read back from a CSV file, which can change the last digit of a value
+    assert [result["value"] for result in results["results"]] == pytest.approx(
+        [result["value"] for result in expected["results"]]
+    )
+    assert serve_tool.health()["models"] == [str(model_path)]
+    # the second request reuses the model, its background and its explainer
+    warm_model = serve_tool._get_warm_model({"model": str(model_path), "data": str(data_path)})
+    assert serve_tool._get_warm_model({"model": str(model_path), "data": str(data_path)}) is warm_model
+
+
+def test_rows_are_explained_against_the_background(
+    url: str, data: pd.DataFrame, model_path: Path, data_path: Path
+) -> None:
+    rows = data.iloc[:2].to_dict(orient="records")
+
+    status, results = post(url, {"model": str(model_path), "background": str(data_path), "rows": rows})
+    assert status == 200
+    assert results["rows"] == 2
+
+    status, results = post(url, {"model": str(model_path), "rows": rows})
+    assert status == 400
+    assert results["error"].startswith("TypeError")
+
+
+def test_paths_outside_the_allowed_directories_are_forbidden(url: str, model_path: Path) -> None:
+    status, results = post(url, {"model": str(model_path), "data": "/etc/passwd"})
+
+    assert status == 403
+    assert results["error"].startswith("PermissionError")
+
+
+def test_the_least_recently_used_model_is_evicted(
+    serve_tool: ServeTool, model_path: Path, data_path: Path, data: pd.DataFrame
+) -> None:
+    serve_tool._get_warm_model({"model": str(model_path), "data": str(data_path)})
+    other_path = Path(data_path.parent, "other.csv")
+    data.iloc[:100].to_csv(other_path, index=False)
+    serve_tool._get_warm_model({"model": str(model_path), "data": str(other_path)})
+
+    assert len(serve_tool._warm_models) == 1
+    assert next(iter(serve_tool._warm_models))[2] == other_path
+
+
+def test_a_file_in_place_of_the_socket_is_not_removed(tmp_path: Path) -> None:
+    path = Path(tmp_path, "amt.sock")
+    path.write_text("not a socket")
+    args = ArgParser(["--action=serve", f"--socket={path}"]).get_args()
+
+    with pytest.raises(FileExistsError):
+        ServeTool.run_serve(args)
+    assert path.read_text() == "not a socket"
+
+
+def test_a_socket_left_behind_is_replaced(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = Path(tmp_path, "amt.sock")
+    with socket.socket(socket.AF_UNIX) as stale:
+        stale.bind(str(path))
+    args = ArgParser(["--action=serve", f"--socket={path}"]).get_args()
+
+    def interrupt(self) -> None:
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr("socketserver.BaseServer.serve_forever", interrupt)
+    ServeTool.run_serve(args)
+
+    assert path.is_socket()
@@ -0,0 +1,64 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import joblib
+from sklearn.linear_model import LogisticRegression
+
+from amt_core.tools.shap_cache_tool import ShapCacheTool
+from amt_core.tools.shap_tool import ShapTool
+
+
+def test_results_are_cached(shap_args) -> None:
+    args = shap_args()
+    cache, key, results = ShapCacheTool.lookup(args)
+    assert cache is not None and key is not None and results is None
+
+    ShapTool.run_shap(args, (cache, key, results))
+    _, cached_key, cached = ShapCacheTool.lookup(args)
+
+    assert cached_key == key
+    assert cached is not None
+    assert cached["attributions"]["fingerprint"] == key
+
+
+def test_refresh_recomputes_the_results(shap_args) -> None:
+    ShapTool.run_shap(shap_args())
+    _, key, results = ShapCacheTool.lookup(shap_args("--refresh"))
+
+    assert key == ShapCacheTool.lookup(shap_args())[1]
+    assert results is None
+
+
+def test_results_are_not_found_without_their_attributions(shap_args) -> None:
+    args = shap_args()
+    ShapTool.run_shap(args)
+    Path(args.outputdir, "shap_values.npy").unlink()
+
+    assert ShapCacheTool.lookup(args)[2] is None
+
+
+def test_a_changed_model_misses_the_cache(shap_args, model_path: Path, data) -> None:
+    ShapTool.run_shap(shap_args())
+    joblib.dump(LogisticRegression().fit(data, data["age"] > 0), model_path)
+
+    assert ShapCacheTool.lookup(shap_args())[2] is None
+
+
+def test_results_that_are_not_cached(shap_args) -> None:
+    for options in (["--no-cache"], ["--incremental"], ["--time-budget=1"]):
+        assert ShapCacheTool.lookup(shap_args(*options)) == (None, None, None)
+
+
+def test_lookup_does_not_import_the_libraries_of_the_explanation() -> None:
+    code = (
+        "import sys\n"
+        "from amt_core.tools.arg_parser import ArgParser\n"
+        "from amt_core.tools.shap_cache_tool import ShapCacheTool\n"
+        "ShapCacheTool.versions()\n"
+        "print(sorted({'shap', 'sklearn', 'pandas'} & set(sys.modules)))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=Path(__file__).parents[1], capture_output=True, text=True, check=True
+    )
+    assert output.stdout.strip() == "[]"
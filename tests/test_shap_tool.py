@@ -0,0 +1,180 @@
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression, Ridge
+from sklearn.naive_bayes import GaussianNB
+from sklearn.tree import DecisionTreeClassifier
+
+from amt_core.loaders.data_loader import DataLoader
+from amt_core.tools.shap_tool import ShapTool, _map_ahead
+
+
+def values(results: dict) -> list[float]:
+    return [result["value"] for result in results["results"]]
+
+
+def test_results_do_not_depend_on_the_workers(model, data: pd.DataFrame) -> None:
+    serial = ShapTool(model, data, "random", 50, workers=1).get_results()
+    parallel = ShapTool(model, data, "random", 50, workers=2).get_results()
+
+    assert parallel["rows"] == serial["rows"] == len(data)
+    assert values(parallel) == values(serial)
+
+
+def test_results_do_not_depend_on_the_chunks(model, data: pd.DataFrame) -> None:
+    shap_tool = ShapTool(model, data, "random", 50)
+    whole = shap_tool.get_results()
+    # the chunks are explained against the same background, they are split in other shards
+    chunked = shap_tool.get_results(data.iloc[i : i + 150] for i in range(0, len(data), 150))
+
+    assert chunked["rows"] == len(data)
+    assert values(chunked) == pytest.approx(values(whole))
+
+
+@pytest.mark.parametrize(("rows", "shard_size"), [(1, 1), (16, 1), (100, 7), (10**6, ShapTool.SHARD_SIZE)])
+def test_shard_size_spreads_small_chunks_over_the_workers(rows: int, shard_size: int) -> None:
+    assert ShapTool.shard_size(rows) == shard_size
+
+
+def test_map_ahead_reads_the_arguments_lazily_and_in_order() -> None:
+    read = itertools.count()
+
+    def arguments():
+        for argument in range(100):
+            next(read)
+            yield argument
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = _map_ahead(executor, 4, lambda x: x * x, arguments())
+        assert next(results) == 0
+        assert next(read) <= 5
+        assert list(results) == [x * x for x in range(1, 100)]
+
+
+def test_confidence_intervals_shrink_to_zero_for_all_rows() -> None:
+    sums, squares = np.array([2.0, 4.0]), np.array([3.0, 10.0])
+
+    means, errors = ShapTool.confidence_intervals(sums, squares, 2, 100)
+    assert means.tolist() == [1.0, 2.0]
+    assert np.all(errors > 0)
+    assert ShapTool.confidence_intervals(sums, squares, 2, 2)[1].tolist() == [0.0, 0.0]
+    assert np.all(np.isinf(ShapTool.confidence_intervals(sums, squares, 1, 100)[1]))
+
+
+@pytest.mark.parametrize(
+    ("means", "errors", "stable"),
+    [
+        # the intervals do not overlap
+        ([3.0, 1.0, 0.5], [0.1, 0.1, 0.1], True),
+        # the second and third feature overlap by more than the tolerance
+        ([3.0, 1.0, 0.5], [0.1, 0.4, 0.4], False),
+        # the second and third feature overlap, but their order does not matter within the tolerance
+        ([3.0, 1.0, 0.95], [0.1, 0.02, 0.02], True),
+    ],
+)
+def test_ranking_is_stable(means: list[float], errors: list[float], stable: bool) -> None:
+    assert ShapTool.ranking_is_stable(np.array(means), np.array(errors), tolerance=0.05) == stable
+
+
+def test_approximation_stops_when_the_ranking_is_stable(model, data: pd.DataFrame) -> None:
+    results = ShapTool(model, data, "random", 50).get_approximate_results(tolerance=0.05)
+
+    assert results["approximation"]["stopped"] == "converged"
+    assert ShapTool.APPROXIMATE_MIN_ROWS <= results["rows"] < len(data)
+    # the features matter in the order of their columns
+    assert [result["name"] for result in sorted(results["results"], key=lambda r: -r["value"])] == list(data.columns)
+
+
+def test_approximation_stops_when_the_time_budget_runs_out(model, data: pd.DataFrame) -> None:
+    results = ShapTool(model, data, "random", 50).get_approximate_results(time_budget=0)
+
+    assert results["approximation"]["stopped"] == "time_budget"
+    assert results["rows"] == ShapTool.APPROXIMATE_FIRST_ROUND
+
+
+def test_approximation_of_all_rows_is_exact(model, data: pd.DataFrame) -> None:
+    shap_tool = ShapTool(model, data, "random", 50)
+    approximate = shap_tool.get_approximate_results()
+
+    assert approximate["approximation"]["stopped"] == "all_rows"
+    assert values(approximate) == pytest.approx(values(shap_tool.get_results()))
+    assert [result["error"] for result in approximate["results"]] == [0.0] * len(data.columns)
+
+
+def test_streamed_data_can_not_be_approximated(model, data: pd.DataFrame) -> None:
+    with pytest.raises(TypeError):
+        ShapTool(model, iter([data])).get_approximate_results(tolerance=0.05)
+
+
+@pytest.mark.parametrize(("method", "size"), [("full", 400), ("random", 50), ("stratified", 50), ("kmeans", 50)])
+def test_background_methods_summarize_the_data(model, data: pd.DataFrame, method: str, size: int) -> None:
+    background = ShapTool(model, data, method, 50).get_background(data)
+
+    assert len(background) == size
+    assert list(background.columns) == list(data.columns)
+
+
+def test_every_row_of_the_background_is_used(model, data: pd.DataFrame) -> None:
+    explainer = ShapTool.build_explainer(model, data, ShapTool.Explainers.PERMUTATION)
+
+    assert len(explainer.masker.data) == len(data)
+
+
+def test_stratified_background_keeps_the_share_of_every_class(model, data: pd.DataFrame) -> None:
+    background = ShapTool(model, data, "stratified", 50).get_background(data)
+
+    assert model.predict(background).mean() == pytest.approx(model.predict(data).mean(), abs=1 / 50)
+
+
+def test_continuous_predictions_are_binned() -> None:
+    strata = ShapTool.prediction_strata(np.linspace(0, 1, 1000), 50)
+
+    assert strata.value_counts().tolist() == [100] * ShapTool.STRATIFIED_BINS
+
+
+@pytest.mark.parametrize(("sizes", "total"), [([900, 90, 10], 50), ([1, 1, 1], 3), ([5, 5], 7), ([1000, 1], 10)])
+def test_allocate_splits_the_total_over_the_strata(sizes: list[int], total: int) -> None:
+    allocation = ShapTool.allocate(np.array(sizes), total)
+
+    assert allocation.sum() == total
+    assert np.all(allocation >= 1) and np.all(allocation <= sizes)
+
+
+def test_streamed_data_is_explained_chunk_by_chunk(model, data: pd.DataFrame, data_path) -> None:
+    streamed_tool = ShapTool(model, DataLoader.load(str(data_path), 150), "random", 50)
+    streamed = streamed_tool.get_results()
+    # the background of streamed data is summarized from the first chunk
+    shap_tool = ShapTool(model, data)
+    shap_tool.background = streamed_tool.background
+
+    assert len(streamed_tool.background) == 50
+    assert streamed["rows"] == len(data)
+    assert values(streamed) == pytest.approx(values(shap_tool.get_results()))
+
+
+@pytest.mark.parametrize(
+    ("estimator", "explainer"),
+    [
+        (LogisticRegression(), ShapTool.Explainers.LINEAR),
+        (Ridge(), ShapTool.Explainers.LINEAR),
+        (DecisionTreeClassifier(max_depth=3), ShapTool.Explainers.TREE),
+        (RandomForestClassifier(n_estimators=5, max_depth=3), ShapTool.Explainers.TREE),
+        (GradientBoostingRegressor(n_estimators=5), ShapTool.Explainers.TREE),
+        (GaussianNB(), ShapTool.Explainers.PERMUTATION),
+    ],
+)
+def test_the_fastest_explainer_is_selected_for_the_model(data: pd.DataFrame, estimator, explainer) -> None:
+    target = data["income"] > 0 if hasattr(estimator, "predict_proba") else data["income"]
+    model = estimator.fit(data, target)
+
+    assert ShapTool.select_explainer(model) == explainer
+    # the permutation explainer is compiled on first use, which takes long, so only the exact explainers explain
+    if explainer != ShapTool.Explainers.PERMUTATION:
+        results = ShapTool(model, data.iloc[:40], "random", 10).get_results()
+        assert results["explainer"] == explainer
+        # the income decides the target
+        assert max(results["results"], key=lambda result: result["value"])["name"] == "income"
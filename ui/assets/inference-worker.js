@@ -0,0 +1,212 @@
+/**
+ * Web Worker running the ONNX model of a report, so scoring many rows does not block the page.
+ * The worker creates one InferenceSession from the model bytes it gets once and reuses it for every request.
+ */
+
+const ORT_VERSION = "1.16.3";
+const ORT_PATH = new URL(`./vendor/onnxruntime-web-${ORT_VERSION}/`, import.meta.url);
+const INPUT_NAME = "float_input";
+const OUTPUT_PROBABILITIES_FIELD = "probabilities";
+const OUTPUT_CLASS_FIELD = "label";
+// the number of rows scored per tensor
+const CHUNK_ROWS = 256;
+
+let ort;
+let session;
+
+self.onmessage = async (event) => {
+    const {id, type} = event.data;
+    try {
+        switch (type) {
+            case "init":
+                await createSession(event.data.modelBytes);
+                self.postMessage({id, type: "done"});
+                break;
+            case "rows":
+                self.postMessage({id, type: "done", ...await scoreChunk(event.data.rows, event.data.features)});
+                break;
+            case "csv":
+                self.postMessage({id, type: "done", ...await scoreCsv(id, event.data.file, event.data.features)});
+                break;
+            default:
+                throw new Error(`Unknown request ${type}`);
+        }
+    } catch (e) {
+        self.postMessage({id, type: "error", message: `${e}`});
+    }
+};
+
+async function createSession(modelBytes) {
+    if (session) {
+        return;
+    }
+    ort = await importRuntime();
+    // threads need a cross origin isolated page, which a static host does not give us
+    ort.env.wasm.numThreads = 1;
+    session = await ort.InferenceSession.create(new Uint8Array(modelBytes));
+}
+
+/**
+ * Import the ONNX runtime vendored with the report, its wasm files are loaded from the same folder.
+ */
+async function importRuntime() {
+    let runtime;
+    try {
+        runtime = await import(new URL("ort.min.js", ORT_PATH).href);
+    } catch (e) {
+        throw new Error(`the ONNX runtime ${ORT_VERSION} is not vendored in ${ORT_PATH}, see the README there: ${e}`);
+    }
+    runtime.env.wasm.wasmPaths = ORT_PATH.href;
+    return runtime;
+}
+
+/**
+ * Score rows with one tensor.
+ * @param rows the rows, every row is an array of feature values
+ * @param features the number of features
+ */
+async function scoreChunk(rows, features) {
+    const values = new Float32Array(rows.length * features);
+    rows.forEach((row, index) => values.set(row, index * features));
+    return scoreTensor(values, rows.length, features);
+}
+
+async function scoreTensor(values, rows, features) {
+    const tensor = new ort.Tensor("float32", values, [rows, features]);
+    const results = await session.run({[INPUT_NAME]: tensor});
+    return {
+        labels: Array.from(results[OUTPUT_CLASS_FIELD].data, String),
+        probabilities: Array.from(results[OUTPUT_PROBABILITIES_FIELD].data),
+        rows: rows,
+    };
+}
+
+/**
+ * Score every row of a CSV file. The file is streamed and the rows are scored in chunks of CHUNK_ROWS, so
+ * only one chunk of values is in memory at a time. If the first line is a header with all features, the
+ * columns are taken by name, otherwise the columns must be the features in order.
+ * @param id the id of the request, for progress messages
+ * @param file the CSV file
+ * @param featureNames the names of the features the model expects, in order
+ */
+async function scoreCsv(id, file, featureNames) {
+    const features = featureNames.length;
+    let columns = null;
+    let values = new Float32Array(CHUNK_ROWS * features);
+    let chunkRows = 0;
+    let scored = 0;
+    const output = ["row,label"];
+    const counts = {};
+
+    const flush = async () => {
+        if (chunkRows === 0) {
+            return;
+        }
+        const result = await scoreTensor(values.subarray(0, chunkRows * features), chunkRows, features);
+        const classes = result.probabilities.length / chunkRows;
+        for (let row = 0; row < chunkRows; row++) {
+            const label = result.labels[row];
+            counts[label] = (counts[label] || 0) + 1;
+            const probabilities = result.probabilities.slice(row * classes, (row + 1) * classes);
+            output.push([scored + row, label, ...probabilities.map((p) => p.toFixed(4))].join(","));
+        }
+        if (scored === 0) {
+            output[0] += Array.from({length: classes}, (_, index) => `,probability_${index}`).join("");
+        }
+        scored += chunkRows;
+        chunkRows = 0;
+        // a new buffer, the session may still hold on to the previous one
+        values = new Float32Array(CHUNK_ROWS * features);
+        self.postMessage({id, type: "progress", rows: scored});
+    };
+
+    for await (const record of records(file)) {
+        const cells = record.map((cell) => cell.trim());
+        if (columns === null) {
+            columns = featureNames.map((name) => cells.indexOf(name));
+            if (columns.every((column) => column >= 0)) {
+                continue;
+            }
+            if (cells.length !== features) {
+                throw new Error(`CSV has ${cells.length} columns, the model expects the ${features} features ${featureNames}`);
+            }
+            columns = featureNames.map((_, index) => index);
+            if (cells.some((cell) => isNaN(parseFloat(cell)))) {
+                // a header with other names, the columns are taken in order
+                continue;
+            }
+        }
+        const offset = chunkRows * features;
+        columns.forEach((column, index) => values[offset + index] = parseFloat(cells[column]));
+        chunkRows++;
+        if (chunkRows === CHUNK_ROWS) {
+            await flush();
+        }
+    }
+    await flush();
+
+    return {rows: scored, counts: counts, csv: new Blob([output.join("\n") + "\n"], {type: "text/csv"})};
+}
+
+/**
+ * The non-empty records of a CSV file, read as a stream. Fields may be quoted, a quoted field can hold
+ * commas, line breaks and quotes escaped by doubling them.
+ * @param file the CSV file
+ */
+async function* records(file) {
+    const reader = file.stream().pipeThrough(new TextDecoderStream()).getReader();
+    let record = [];
+    let field = "";
+    // whether the parser is inside a quoted field, and whether the last character of it was a quote
+    let quoted = false;
+    let quote = false;
+    const isEmpty = () => record.length === 1 && record[0].trim() === "";
+    while (true) {
+        const {value, done} = await reader.read();
+        if (done) {
+            break;
+        }
+        for (const char of value) {
+            if (quoted) {
+                if (quote) {
+                    quote = false;
+                    if (char === '"') {
+                        field += char;
+                        continue;
+                    }
+                    quoted = false;
+                } else {
+                    if (char === '"') {
+                        quote = true;
+                    } else {
+                        field += char;
+                    }
+                    continue;
+                }
+            }
+            if (char === '"' && field.trim() === "") {
+                quoted = true;
+                field = "";
+            } else if (char === ",") {
+                record.push(field);
+                field = "";
+            } else if (char === "\n") {
+                record.push(field);
+                if (!isEmpty()) {
+                    yield record;
+                }
+                record = [];
+                field = "";
+            } else if (char !== "\r") {
+                field += char;
+            }
+        }
+    }
+    if (quoted && !quote) {
+        throw new Error("CSV ends in a quoted field");
+    }
+    record.push(field);
+    if (!isEmpty()) {
+        yield record;
+    }
+}
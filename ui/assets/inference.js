@@ -1,54 +1,186 @@
-import * as ort from "https://cdn.jsdelivr.net/npm/onnxruntime-web/dist/esm/ort.min.js";
-
-ort.env.wasm.wasmPaths = "https://cdn.jsdelivr.net/npm/onnxruntime-web/dist/";
+// the name of the browser cache holding the bytes of the models of reports
+const MODEL_CACHE = "amt-models";
 
 let probabilityDistribution;
+let worker;
+let sessionReady;
+let requestId = 0;
+const pending = new Map();
+
+/**
+ * Send a request to the inference worker.
+ * @param request the request
+ * @param transfer the objects to transfer to the worker instead of copying them
+ * @param onProgress called with every progress message of the request
+ */
+function request(request, transfer = [], onProgress = () => {}) {
+    if (!worker) {
+        // the worker holds the one InferenceSession of the page
+        worker = new Worker(new URL("./inference-worker.js", import.meta.url), {type: "module"});
+        worker.onmessage = (event) => {
+            const {id, type} = event.data;
+            const handlers = pending.get(id);
+            if (type === "progress") {
+                handlers.onProgress(event.data);
+                return;
+            }
+            pending.delete(id);
+            if (type === "error") {
+                handlers.reject(new Error(event.data.message));
+            } else {
+                handlers.resolve(event.data);
+            }
+        };
+    }
+    const id = ++requestId;
+    return new Promise((resolve, reject) => {
+        pending.set(id, {resolve, reject, onProgress});
+        worker.postMessage({id, ...request}, transfer);
+    });
+}
 
-async function main() {
-    try {
-        const runButton = document.getElementById('runInference');
-        runButton.addEventListener('click', async () => {
-            const outputProbabilitiesField = "probabilities";
-            const outputClassField = "label";
-            const inputName = "float_input";
-
-            const modelName = document.getElementById('modelurl').getAttribute("href");
-            const session = await ort.InferenceSession.create(modelName);
-            const outputContainer = document.getElementById('outputContainer');
-            const outputLabel = document.getElementById('label');
-
-            const inputValues = [];
-            var inputs = document.querySelectorAll('input[id^="input."]');
-            inputs.forEach(function (input) {
-                inputValues.push(parseFloat(input.value));
+/**
+ * Create the InferenceSession of the page once, later calls wait for the same session.
+ * @param modelUrl the URL of the ONNX model
+ */
+function ensureSession(modelUrl) {
+    if (location.protocol === "file:") {
+        // browsers do not start module workers from files, so the report has to be served
+        return Promise.reject(new Error("the model can only be run in a report served over HTTP(S)"));
+    }
+    if (!sessionReady) {
+        sessionReady = loadModelBytes(modelUrl)
+            .then((modelBytes) => request({type: "init", modelBytes}, [modelBytes]))
+            .catch((e) => {
+                // try again on the next request
+                sessionReady = undefined;
+                throw e;
             });
+    }
+    return sessionReady;
+}
+
+/**
+ * Get the bytes of a model from the Cache API, or from IndexedDB where the Cache API is not available,
+ * for example on pages served over plain HTTP from another host than localhost. A model is only downloaded
+ * if it is in neither.
+ * @param modelUrl the URL of the ONNX model
+ */
+async function loadModelBytes(modelUrl) {
+    const url = new URL(modelUrl, document.baseURI).href;
+    if ("caches" in self) {
+        try {
+            const cache = await caches.open(MODEL_CACHE);
+            let response = await cache.match(url);
+            if (!response) {
+                response = await fetchModel(url);
+                await cache.put(url, response.clone());
+            }
+            return await response.arrayBuffer();
+        } catch (e) {
+            console.warn("Cache API is not available, using IndexedDB:", e);
+        }
+    }
+    const db = await openModelDatabase();
+    const cached = await idbRequest(db.transaction(MODEL_CACHE).objectStore(MODEL_CACHE).get(url));
+    if (cached) {
+        return cached;
+    }
+    const modelBytes = await (await fetchModel(url)).arrayBuffer();
+    await idbRequest(db.transaction(MODEL_CACHE, "readwrite").objectStore(MODEL_CACHE).put(modelBytes, url));
+    return modelBytes;
+}
+
+async function fetchModel(url) {
+    const response = await fetch(url);
+    if (!response.ok) {
+        throw new Error(`Failed to download model ${url}: ${response.status}`);
+    }
+    return response;
+}
+
+function openModelDatabase() {
+    const open = indexedDB.open(MODEL_CACHE, 1);
+    open.onupgradeneeded = () => open.result.createObjectStore(MODEL_CACHE);
+    return idbRequest(open);
+}
+
+function idbRequest(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function featureInputs() {
+    return Array.from(document.querySelectorAll('input[id^="input."]'));
+}
+
+function showError(e) {
+    const errorElement = document.getElementById('error');
+    errorElement.textContent = `Failed to inference model: ${e}`;
+    console.error('Failed to inference model:', e);
+}
+
+function main() {
+    const runButton = document.getElementById('runInference');
+    if (!runButton) {
+        return;
+    }
+    const modelUrl = document.getElementById('modelurl').getAttribute("href");
+
+    runButton.addEventListener('click', async () => {
+        try {
+            const inputValues = featureInputs().map((input) => parseFloat(input.value));
+            await ensureSession(modelUrl);
+            const result = await request({type: "rows", rows: [inputValues], features: inputValues.length});
 
-            const inputTensorShape = [1, inputValues.length]; // Adjusting tensor shape
-            const tensor = new ort.Tensor('float32', inputValues, inputTensorShape); // Adjusting tensor shape
-            const feeds = {
-                [inputName]: tensor
-            };
-            const results = await session.run(feeds);
-            const data = results[outputProbabilitiesField].data;
             document.getElementById("inferenceResultsContainer").style.display = "block";
-            outputContainer.innerHTML = '';
+            document.getElementById('outputContainer').innerHTML = '';
             let graphData = [];
             let graphLabels = [];
-            data.forEach((probability, index) => {
+            result.probabilities.forEach((probability, index) => {
                 graphLabels.push("Class " + index);
                 graphData.push(probability.toFixed(2));
             });
+            document.getElementById('label').textContent = "Class " + result.labels[0];
+            renderGraph(graphData, graphLabels);
+        } catch (e) {
+            showError(e);
+        }
+    });
 
-            if (outputClassField) {
-                outputLabel.textContent = "Class " + results[outputClassField].data;
+    const batchButton = document.getElementById('runBatchInference');
+    batchButton.addEventListener('click', async () => {
+        const file = document.getElementById('batchFile').files[0];
+        if (!file) {
+            showError("choose a CSV file first");
+            return;
+        }
+        const status = document.getElementById('batchStatus');
+        try {
+            batchButton.disabled = true;
+            await ensureSession(modelUrl);
+            // the features are named after the input fields, input.<feature name>
+            const features = featureInputs().map((input) => input.id.substring("input.".length));
+            const result = await request({type: "csv", file, features}, [], (progress) => {
+                status.textContent = `Scored ${progress.rows} rows`;
+            });
+            const counts = Object.entries(result.counts).map(([label, count]) => `class ${label}: ${count}`);
+            status.textContent = `Scored ${result.rows} rows (${counts.join(", ")})`;
+            const download = document.getElementById('batchDownload');
+            if (download.href) {
+                URL.revokeObjectURL(download.href);
             }
-            renderGraph(graphData, graphLabels);
-        });
-    } catch (e) {
-        const errorElement = document.getElementById('error');
-        errorElement.textContent = `Failed to inference model: ${e}`;
-        console.error('Failed to inference model:', e);
-    }
+            download.href = URL.createObjectURL(result.csv);
+            download.download = file.name.replace(/\.csv$/i, "") + "_scores.csv";
+            download.style.display = "inline";
+        } catch (e) {
+            showError(e);
+        } finally {
+            batchButton.disabled = false;
+        }
+    });
 }
 
 main();